@@ -50,5 +50,6 @@ from .core.compilable import Build
 from .params import Parameter as Param
 from .params import ParamList
 from .params import DataHolder
+from .params import SparseDataHolder
 from .params import Minibatch
 from .params import Parameterized
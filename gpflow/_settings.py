@@ -84,6 +84,15 @@ class _SettingsManager(object):
     def int_type(self):
         return self.dtypes.int_type
 
+    @property
+    def kernel_float_type(self):
+        """
+        Float type of kernel evaluations, `float_type` unless a lower precision
+        is set for the mixed precision mode. The mode is meant for the
+        throughput of kernel evaluations, it does not reduce memory use.
+        """
+        return self.dtypes.get('kernel_float_type', self.float_type)
+
 
 class _MutableNamedTuple(OrderedDict):
     """
@@ -15,6 +15,7 @@
 
 import tensorflow as tf
 
+from . import misc
 from . import settings
 from .decors import name_scope
 from .features import InducingPoints
@@ -56,48 +57,67 @@ def conditional(Xnew, X, kern, f, *, full_cov=False, q_sqrt=None, white=False):
     :return: two element tuple with conditional mean and variance.
     """
     num_data = tf.shape(X)[0]  # M
-    Kmm = kern.K(X) + tf.eye(num_data, dtype=settings.float_type) * settings.numerics.jitter_level
-    Kmn = kern.K(X, Xnew)
+    Kmm = misc.upcast(kern.K(X)) + tf.eye(num_data, dtype=settings.float_type) * settings.numerics.jitter_level
+    Kmn = misc.upcast(kern.K(X, Xnew))
     if full_cov:
-        Knn = kern.K(Xnew)
+        Knn = misc.upcast(kern.K(Xnew))
     else:
-        Knn = kern.Kdiag(Xnew)
+        Knn = misc.upcast(kern.Kdiag(Xnew))
     return base_conditional(Kmn, Kmm, Knn, f, full_cov=full_cov, q_sqrt=q_sqrt, white=white)
 
 
 @name_scope()
 def feature_conditional(Xnew, feat, kern, f, *, full_cov=False, q_sqrt=None, white=False):
-    Kmm = feat.Kuu(kern, jitter=settings.numerics.jitter_level)
-    Kmn = feat.Kuf(kern, Xnew)
+    # The Cholesky factor is cached while the kernel and the features are fixed.
+    Lm = misc.precompute(lambda: tf.cholesky(feat.Kuu(kern, jitter=settings.numerics.jitter_level)))
+    Kmn = misc.upcast(feat.Kuf(kern, Xnew))
     if full_cov:
-        Knn = kern.K(Xnew)
+        Knn = misc.upcast(kern.K(Xnew))
     else:
-        Knn = kern.Kdiag(Xnew)
-    return base_conditional(Kmn, Kmm, Knn, f, full_cov=full_cov, q_sqrt=q_sqrt, white=white)
+        Knn = misc.upcast(kern.Kdiag(Xnew))
+    return _cholesky_conditional(Kmn, Lm, Knn, f, full_cov=full_cov, q_sqrt=q_sqrt, white=white)
 
 
 @name_scope()
 def base_conditional(Kmn, Kmm, Knn, f, *, full_cov=False, q_sqrt=None, white=False):
     # compute kernel stuff
-    num_func = tf.shape(f)[1]  # K
     Lm = tf.cholesky(Kmm)
+    return _cholesky_conditional(Kmn, Lm, Knn, f, full_cov=full_cov, q_sqrt=q_sqrt, white=white)
 
+
+def _cholesky_conditional(Kmn, Lm, Knn, f, *, full_cov=False, q_sqrt=None, white=False):
+    """
+    Same as `base_conditional`, given the Cholesky factor `Lm` of `Kmm`.
+    """
     # Compute the projection matrix A
     A = tf.matrix_triangular_solve(Lm, Kmn, lower=True)
 
     # compute the covariance due to the conditioning
     if full_cov:
         fvar = Knn - tf.matmul(A, A, transpose_a=True)
-        shape = tf.stack([num_func, 1, 1])
     else:
         fvar = Knn - tf.reduce_sum(tf.square(A), 0)
-        shape = tf.stack([num_func, 1])
-    fvar = tf.tile(tf.expand_dims(fvar, 0), shape)  # K x N x N or K x N
 
     # another backsubstitution in the unwhitened case
     if not white:
         A = tf.matrix_triangular_solve(tf.transpose(Lm), A, lower=False)
 
+    return _project_conditional(A, fvar, f, full_cov=full_cov, q_sqrt=q_sqrt)
+
+
+def _project_conditional(A, fvar, f, *, full_cov=False, q_sqrt=None):
+    """
+    Completes a conditional given the projection `A`, size M x N, which maps
+    `f` to the conditional mean, and the variance `fvar` due to conditioning,
+    size N x N or N. The variance is shared between the K columns of `f`.
+    """
+    num_func = tf.shape(f)[1]  # K
+    if full_cov:
+        shape = tf.stack([num_func, 1, 1])
+    else:
+        shape = tf.stack([num_func, 1])
+    fvar = tf.tile(tf.expand_dims(fvar, 0), shape)  # K x N x N or K x N
+
     # construct the conditional mean
     fmean = tf.matmul(A, f, transpose_a=True)
 
@@ -122,11 +142,16 @@ def base_conditional(Kmn, Kmm, Knn, f, *, full_cov=False, q_sqrt=None, white=Fal
 
 @name_scope()
 def uncertain_conditional(Xnew_mu, Xnew_var, feat, kern, q_mu, q_sqrt, *,
-                          full_cov_output=False, full_cov=False, white=False):
+                          full_cov_output=False, full_cov=False, white=False, chunk_size=None):
     """
     Calculates the conditional for uncertain inputs Xnew, p(Xnew) = N(Xnew_mu, Xnew_var).
     See ``conditional`` documentation for further reference.
 
+    The N x M x M kernel expectations <Kuf Kfu> are computed in chunks of
+    ``chunk_size`` inputs, and are never solved against ``Luu``: the traces
+    they enter are taken against M x M matrices precomputed once. The memory
+    used is O(chunk_size M^2).
+
     :param Xnew_mu: mean of the inputs, size N x Din
     :param Xnew_var: covariance matrix of the inputs, size N x Din x Din
     :param feat: gpflow.InducingFeature object, only InducingPoints is supported
@@ -136,18 +161,14 @@ def uncertain_conditional(Xnew_mu, Xnew_var, feat, kern, q_mu, q_sqrt, *,
     :param full_cov_output: boolean wheter to compute covariance between output dimension.
                             Influences the shape of return value ``fvar``. Default is False
     :param white: boolean whether to use whitened representation. Default is False.
+    :param chunk_size: number of inputs per chunk, by default
+                       ``settings.numerics.ekern_chunk_size``.
 
     :return fmean, fvar: mean and covariance of the conditional, size ``fmean`` is N x Dout,
             size ``fvar`` depends on ``full_cov_output``: if True ``f_var`` is N x Dout x Dout,
             if False then ``f_var`` is N x Dout
     """
 
-    # TODO: Tensorflow 1.3 doesn't support broadcasting in``tf.matmul`` and
-    # ``tf.matrix_triangular_solve``. This is reported in issue 216.
-    # As a temporary workaround, we are using ``tf.einsum`` for the matrix
-    # multiplications and tiling in the triangular solves.
-    # The code that should be used once the bug is resolved is added in comments.
-
     if not isinstance(feat, InducingPoints):
         raise NotImplementedError
 
@@ -157,46 +178,54 @@ def uncertain_conditional(Xnew_mu, Xnew_var, feat, kern, q_mu, q_sqrt, *,
         # This is not implemented as this feature is only used for plotting purposes.
         raise NotImplementedError
 
+    chunk_size = chunk_size or settings.numerics.ekern_chunk_size
     num_data = tf.shape(Xnew_mu)[0]  # number of new inputs (N)
+    num_ind = tf.shape(q_mu)[0]  # number of inducing points (M)
     num_func = tf.shape(q_mu)[1]  # output dimension (D)
 
-    q_sqrt_r = tf.matrix_band_part(tf.transpose(q_sqrt, (2, 0, 1)), -1, 0)  # D x M x M
-
-    eKuf = tf.transpose(feat.eKfu(kern, Xnew_mu, Xnew_var))  # M x N
     Kuu = feat.Kuu(kern, jitter=settings.numerics.jitter_level)  # M x M
     Luu = tf.cholesky(Kuu)  # M x M
 
-    if not white:
-        q_mu = tf.matrix_triangular_solve(Luu, q_mu, lower=True)
-        Luu_tiled = tf.tile(Luu[None, :, :], [num_func, 1, 1])  # remove line once issue 216 is fixed
-        q_sqrt_r = tf.matrix_triangular_solve(Luu_tiled, q_sqrt_r, lower=True)
+    # The columns of all D square roots side by side, M x DM, so that the
+    # triangular solves need no tiling of Luu.
+    q_sqrt_r = tf.matrix_band_part(tf.transpose(q_sqrt, (2, 0, 1)), -1, 0)  # D x M x M
+    q_sqrt_r = tf.reshape(tf.transpose(q_sqrt_r, (1, 0, 2)), (num_ind, -1))  # M x DM
+
+    # Kuu^{-1} q_mu and Kuu^{-1} q_sqrt, or Luu^{-T} q_mu and Luu^{-T} q_sqrt when whitened
+    if white:
+        alpha = tf.matrix_triangular_solve(Luu, q_mu, lower=True, adjoint=True)  # M x D
+        beta = tf.matrix_triangular_solve(Luu, q_sqrt_r, lower=True, adjoint=True)  # M x DM
+    else:
+        alpha = tf.cholesky_solve(Luu, q_mu)  # M x D
+        beta = tf.cholesky_solve(Luu, q_sqrt_r)  # M x DM
+    beta = tf.transpose(tf.reshape(beta, (num_ind, num_func, num_ind)), (1, 0, 2))  # D x M x M
 
-    Li_eKuf = tf.matrix_triangular_solve(Luu, eKuf, lower=True)  # M x N
-    fmean = tf.matmul(Li_eKuf, q_mu, transpose_a=True)
+    # tr(<Kuf Kfu> C_d) is the part of the variance depending on the covariance of q(u)
+    Kuu_inv = tf.cholesky_solve(Luu, tf.eye(num_ind, dtype=settings.float_type))  # M x M
+    C = tf.matmul(beta, beta, transpose_b=True) - Kuu_inv[None, :, :]  # D x M x M
+    C = tf.transpose(tf.reshape(C, (num_func, -1)))  # MM x D
 
+    fmean = tf.matmul(feat.eKfu(kern, Xnew_mu, Xnew_var), alpha)  # N x D
     eKff = kern.eKdiag(Xnew_mu, Xnew_var)  # N
-    eKuffu = feat.eKufKfu(kern, Xnew_mu, Xnew_var)  # N x M x M
-    Luu_tiled = tf.tile(Luu[None, :, :], [num_data, 1, 1])  # remove this line, once issue 216 is fixed
-    Li_eKuffu_Lit = tf.matrix_triangular_solve(Luu_tiled, tf.matrix_transpose(eKuffu), lower=True)
-    Li_eKuffu_Lit = tf.matrix_triangular_solve(Luu_tiled, tf.matrix_transpose(Li_eKuffu_Lit), lower=True)  # N x M x M
-
-    cov = tf.matmul(q_sqrt_r, q_sqrt_r, transpose_b=True)  # D x M x M
-
-    if full_cov_output:
-        fvar = (
-            tf.matrix_diag(tf.tile((eKff - tf.trace(Li_eKuffu_Lit))[:, None], [1, num_func])) +
-            tf.matrix_diag(tf.einsum("nij,dji->nd", Li_eKuffu_Lit, cov)) +
-            # tf.matrix_diag(tf.trace(tf.matmul(Li_eKuffu_Lit, cov))) +
-            tf.einsum("ig,nij,jh->ngh", q_mu, Li_eKuffu_Lit, q_mu) -
-            # tf.matmul(q_mu, tf.matmul(Li_eKuffu_Lit, q_mu), transpose_a=True) -
-            tf.matmul(fmean[:, :, None], fmean[:, :, None], transpose_b=True)
-        )
-    else:
-        fvar = (
-            (eKff - tf.trace(Li_eKuffu_Lit))[:, None] +
-            tf.einsum("nij,dji->nd", Li_eKuffu_Lit, cov) +
-            tf.einsum("ig,nij,jg->ng", q_mu, Li_eKuffu_Lit, q_mu) -
-            fmean ** 2
-        )
 
-    return fmean, fvar
+    def body(start, fvars):
+        end = start + chunk_size
+        eKuffu = feat.eKufKfu(kern, Xnew_mu[start:end], Xnew_var[start:end])  # C x M x M
+        var = tf.matmul(tf.reshape(eKuffu, (-1, num_ind ** 2)), C) + eKff[start:end, None]  # C x D
+        eKuffu_alpha = tf.reshape(tf.matmul(tf.reshape(eKuffu, (-1, num_ind)), alpha),
+                                  (-1, num_ind, num_func))  # C x M x D
+        mean = fmean[start:end]
+        if full_cov_output:
+            fvar = (
+                tf.matrix_diag(var) +
+                tf.einsum("ig,nih->ngh", alpha, eKuffu_alpha) -
+                tf.matmul(mean[:, :, None], mean[:, :, None], transpose_b=True)
+            )
+        else:
+            fvar = var + tf.reduce_sum(alpha[None, :, :] * eKuffu_alpha, 1) - mean ** 2
+        return end, fvars.write(start // chunk_size, fvar)
+
+    fvars = tf.TensorArray(settings.float_type, size=0, dynamic_size=True, infer_shape=False)
+    _, fvars = tf.while_loop(lambda start, _: start < num_data, body, [tf.constant(0), fvars],
+                             parallel_iterations=1, swap_memory=True)
+    return fmean, fvars.concat()
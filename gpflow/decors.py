@@ -17,6 +17,7 @@ import contextlib
 
 import tensorflow as tf
 
+from . import misc
 from .core.errors import GPflowError
 from .core.compilable import Build
 from .core.compilable import AutoBuildStatus
@@ -151,7 +152,7 @@ def autoflow(*af_args, **af_kwargs):
             with session.graph.as_default(), tf.name_scope(scope_name):
                 if not store:
                     _setup_storage(store, *af_args, **af_kwargs)
-                    _build_method(method, obj, store)
+                    _build_method(method, obj, store, session)
                 return _session_run(session, obj, store, *args, **kwargs)
         return runnable
     return autoflow_wrapper
@@ -193,5 +194,9 @@ def _session_run(session, obj, store, *args, **kwargs):
     return session.run(store['result'], **kwargs)
 
 
-def _build_method(method, obj, store):
-    store['result'] = method(obj, *store['arguments'])
+def _build_method(method, obj, store, session):
+    existing = set(misc.get_precomputations(graph=session.graph))
+    with misc.build_cache_scope():
+        store['result'] = method(obj, *store['arguments'])
+    precomputations = misc.get_precomputations(graph=session.graph)
+    misc.initialize_precomputations([p for p in precomputations if p not in existing], session)
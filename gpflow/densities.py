@@ -30,7 +30,8 @@ def lognormal(x, mu, var):
 
 
 def bernoulli(p, y):
-    return tf.log(tf.where(tf.equal(y, 1), p, 1-p))
+    y_is_one = tf.cast(tf.equal(y, 1), p.dtype)
+    return tf.log(y_is_one * p + (1 - y_is_one) * (1 - p))
 
 
 def poisson(lamb, y):
@@ -1,13 +1,14 @@
 from functools import reduce
+from math import lgamma
 import warnings
+import numpy as np
 import tensorflow as tf
 
-from numpy import pi as nppi
-
+from . import misc
 from . import settings
 from . import kernels
 
-from .quadrature import mvhermgauss
+from .quadrature import GaussHermite
 from .decors import params_as_tensors
 
 
@@ -18,7 +19,7 @@ class RBF(kernels.RBF):
         :param X:
         :return: N
         """
-        return self.Kdiag(X)
+        return misc.upcast(self.Kdiag(X))
 
     @params_as_tensors
     def eKxz(self, Z, Xmu, Xcov):
@@ -138,7 +139,7 @@ class RBF(kernels.RBF):
         D = tf.shape(Xmu)[1]
         lengthscales = self.lengthscales if self.ARD else tf.zeros((D,), dtype=settings.float_type) + self.lengthscales
 
-        Kmms = tf.sqrt(self.K(Z, presliced=True)) / self.variance ** 0.5
+        Kmms = tf.sqrt(misc.upcast(self.K(Z, presliced=True))) / self.variance ** 0.5
         scalemat = tf.expand_dims(tf.eye(D, dtype=settings.float_type), 0) + 2 * Xcov * tf.reshape(lengthscales ** -2.0, [1, 1, -1])  # NxDxD
         det = tf.matrix_determinant(scalemat)
 
@@ -218,6 +219,170 @@ class Linear(kernels.Linear):
         return self.variance ** 2.0 * tf.matmul(tf.matmul(eZ, mom2), eZ, transpose_b=True)
 
 
+class _MaternMixture(object):
+    """
+    Kernel expectations of the Matern kernels for diagonal covariances. The
+    Matern kernel with smoothness nu is a Gamma scale mixture of squared
+    exponentials,
+
+        k(r) = <exp(-r^2 / (2 t))>_{t ~ Gamma(nu, rate=nu)},
+
+    where r is the distance scaled by the lengthscales. The mixture is
+    evaluated with the trapezoidal rule over log t at `num_mixture_points`
+    points, so that the expectations reduce to weighted sums of the
+    closed-form Gaussian integrals of the RBF kernel. With the default of 30
+    points the mixture is within 1e-7 of the Matern32 and 1e-8 of the
+    Matern52 kernel (relative to the variance). Full covariances fall back
+    to quadrature.
+    """
+
+    def __init__(self, *args, num_mixture_points=30, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.num_mixture_points = num_mixture_points
+
+    def eKdiag(self, X, Xcov=None):
+        return misc.upcast(self.Kdiag(X))
+
+    @params_as_tensors
+    def eKxz(self, Z, Xmu, Xcov):
+        if Xcov.get_shape().ndims != 2:
+            return super().eKxz(Z, Xmu, Xcov)
+        Z, Xmu = self._slice(Z, Xmu)
+        Xvar, _ = self._slice(Xcov, None)
+        precisions = self._precisions(Xmu)
+        nodes, weights = _gamma_mixture(self.nu, self.num_mixture_points)
+        eKxz = [w * _diag_gauss_eKxz(Z, Xmu, Xvar, precisions / t) for t, w in zip(nodes, weights)]
+        return self.variance * reduce(tf.add, eKxz)
+
+    @params_as_tensors
+    def eKzxKxz(self, Z, Xmu, Xcov):
+        """
+        The pairs of mixture points are accumulated one at a time, so that
+        only a single NxMxM term is held at once.
+        """
+        if Xcov.get_shape().ndims != 2:
+            return super().eKzxKxz(Z, Xmu, Xcov)
+        Z, Xmu = self._slice(Z, Xmu)
+        Xvar, _ = self._slice(Xcov, None)
+        N, M = tf.shape(Xmu)[0], tf.shape(Z)[0]
+        precisions = self._precisions(Xmu)
+        nodes, weights = _gamma_mixture(self.nu, self.num_mixture_points)
+        # The term of (t_j, t_i) is the transpose of the term of (t_i, t_j),
+        # only the upper triangle of the pairs is evaluated.
+        first, second = np.triu_indices(len(nodes))
+        pair_weights = np.where(first < second, 1., 0.5) * weights[first] * weights[second]
+        first_nodes = tf.constant(nodes[first], dtype=settings.float_type)
+        second_nodes = tf.constant(nodes[second], dtype=settings.float_type)
+        pair_weights = tf.constant(pair_weights, dtype=settings.float_type)
+
+        def body(pair, half):
+            term = _diag_gauss_eKzxKxz(Z, Xmu, Xvar, precisions / first_nodes[pair],
+                                       precisions / second_nodes[pair])
+            return pair + 1, half + pair_weights[pair] * term
+
+        init = [tf.constant(0), tf.zeros(tf.stack([N, M, M]), dtype=settings.float_type)]
+        _, half = tf.while_loop(lambda pair, _: pair < len(first), body, init,
+                                parallel_iterations=1, swap_memory=True)
+        return self.variance ** 2.0 * (half + tf.transpose(half, [0, 2, 1]))
+
+    def _precisions(self, Xmu):
+        D = tf.shape(Xmu)[1]
+        return tf.zeros((D,), dtype=settings.float_type) + self.lengthscales ** -2.0
+
+
+class Matern32(_MaternMixture, kernels.Matern32):
+    nu = 1.5
+
+
+class Matern52(_MaternMixture, kernels.Matern52):
+    nu = 2.5
+
+
+class Periodic(kernels.Periodic):
+    """
+    Kernel expectations of the periodic kernel for diagonal covariances. Per
+    input dimension, the kernel is expanded into the Fourier series
+
+        exp(c cos(w (x - z))) = sum_k e_k I_k(c) cos(k w (x - z)),
+
+    with c = 1 / (4 lengthscales^2), w = 2 pi / period and the modified
+    Bessel functions I_k, whose terms have closed-form Gaussian expectations.
+    The series is truncated after `num_fourier_terms` terms, K. The
+    truncation error is below 1e-7 per input dimension (relative to the
+    variance) for lengthscales of at least 4 / K, i.e. 0.1 for the default
+    of 40 terms. The lengthscales can change during optimisation, K has to
+    be raised for shorter lengthscales. Full covariances fall back to
+    quadrature.
+    """
+
+    def __init__(self, *args, num_fourier_terms=40, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.num_fourier_terms = num_fourier_terms
+
+    def eKdiag(self, X, Xcov=None):
+        return misc.upcast(self.Kdiag(X))
+
+    @params_as_tensors
+    def eKxz(self, Z, Xmu, Xcov):
+        if Xcov.get_shape().ndims != 2:
+            return super().eKxz(Z, Xmu, Xcov)
+        Z, Xmu = self._slice(Z, Xmu)
+        Xvar, _ = self._slice(Xcov, None)
+        c = 0.25 / tf.square(self.lengthscales)
+        coeffs = _fourier_orders_weights(self.num_fourier_terms) * _bessel_ive(c, self.num_fourier_terms)  # K
+        cos_mu, sin_mu = self._damped_harmonics(Xmu, Xvar)  # DxNxK
+        freqs = self._frequencies()
+        Zt = tf.expand_dims(tf.transpose(Z), 2) * freqs  # DxMxK
+        factors = tf.matmul(cos_mu * coeffs, tf.cos(Zt), transpose_b=True) + \
+                  tf.matmul(sin_mu * coeffs, tf.sin(Zt), transpose_b=True)  # DxNxM
+        return self.variance * tf.reduce_prod(factors, 0)
+
+    @params_as_tensors
+    def eKzxKxz(self, Z, Xmu, Xcov):
+        if Xcov.get_shape().ndims != 2:
+            return super().eKzxKxz(Z, Xmu, Xcov)
+        Z, Xmu = self._slice(Z, Xmu)
+        Xvar, _ = self._slice(Xcov, None)
+        M = tf.shape(Z)[0]
+        N = tf.shape(Xmu)[0]
+        K = self.num_fourier_terms
+        c = 0.25 / tf.square(self.lengthscales)
+        omega = 2. * np.pi / self.period
+
+        # The product of two kernel evaluations is a single term of the same
+        # form centred at the midpoint of the two inducing inputs.
+        Zt = tf.transpose(Z)  # DxM
+        Zdiff = tf.expand_dims(Zt, 2) - tf.expand_dims(Zt, 1)  # DxMxM
+        Zbar = 0.5 * (tf.expand_dims(Zt, 2) + tf.expand_dims(Zt, 1))  # DxMxM
+        cz = 2. * c * tf.cos(0.5 * omega * Zdiff)  # DxMxM
+        # I_k(-x) = (-1)^k I_k(x)
+        negative = tf.expand_dims(tf.cast(cz < 0., settings.float_type), 3)  # DxMxMx1
+        parity = (-1.) ** np.arange(K, dtype=settings.float_type)  # K
+        sign = 1. + negative * (parity - 1.)  # DxMxMxK
+        coeffs = _fourier_orders_weights(K) * sign * _bessel_ive(cz, K) * \
+                 tf.expand_dims(tf.exp(tf.abs(cz) - 2. * c), 3)  # DxMxMxK
+        coeffs = tf.reshape(coeffs, tf.stack([-1, M * M, K]))  # Dx(M*M)xK
+        Zbart = tf.reshape(Zbar, tf.stack([-1, M * M, 1])) * self._frequencies()  # Dx(M*M)xK
+
+        cos_mu, sin_mu = self._damped_harmonics(Xmu, Xvar)  # DxNxK
+        factors = tf.matmul(cos_mu, coeffs * tf.cos(Zbart), transpose_b=True) + \
+                  tf.matmul(sin_mu, coeffs * tf.sin(Zbart), transpose_b=True)  # Dx Nx(M*M)
+        return self.variance ** 2.0 * tf.reshape(tf.reduce_prod(factors, 0), tf.stack([N, M, M]))
+
+    def _frequencies(self):
+        orders = np.arange(self.num_fourier_terms, dtype=settings.float_type)
+        return 2. * np.pi * orders / self.period  # K
+
+    def _damped_harmonics(self, Xmu, Xvar):
+        """
+        :return: <cos(k w x)> and <sin(k w x)> for all k, both DxNxK.
+        """
+        freqs = self._frequencies()
+        Xt = tf.expand_dims(tf.transpose(Xmu), 2) * freqs  # DxNxK
+        damp = tf.exp(-0.5 * tf.expand_dims(tf.transpose(Xvar), 2) * tf.square(freqs))  # DxNxK
+        return tf.cos(Xt) * damp, tf.sin(Xt) * damp
+
+
 class Sum(kernels.Sum):
     """
     Sum
@@ -317,32 +482,44 @@ class Sum(kernels.Sum):
         warnings.warn("gpflow.ekernels.Sum: Using numerical quadrature for kernel expectation cross terms.")
         Xmu, Z = self._slice(Xmu, Z)
         Xcov = self._slice_cov(Xcov)
-        N, M, HpowD = tf.shape(Xmu)[0], tf.shape(Z)[0], self.num_gauss_hermite_points ** self.input_dim
-        xn, wn = mvhermgauss(self.num_gauss_hermite_points, self.input_dim)
+        rule = GaussHermite(self.num_gauss_hermite_points) if self.quadrature_rule is None else self.quadrature_rule
+        P = len(rule.points_and_weights(self.input_dim)[1])
+        xn, wn = rule.constants(self.input_dim)
+        N, M = tf.shape(Xmu)[0], tf.shape(Z)[0]
 
         # transform points based on Gaussian parameters
         cholXcov = tf.cholesky(Xcov)  # NxDxD
-        Xt = tf.matmul(cholXcov, tf.tile(xn[None, :, :], (N, 1, 1)), transpose_b=True)  # NxDxH**D
+        Xt = tf.matmul(cholXcov, tf.tile(xn[None, :, :], (N, 1, 1)), transpose_b=True)  # NxDxP
 
-        X = 2.0 ** 0.5 * Xt + tf.expand_dims(Xmu, 2)  # NxDxH**D
-        Xr = tf.reshape(tf.transpose(X, [2, 0, 1]), (-1, self.input_dim))  # (H**D*N)xD
+        X = Xt + tf.expand_dims(Xmu, 2)  # NxDxP
+        Xr = tf.reshape(tf.transpose(X, [2, 0, 1]), (-1, self.input_dim))  # (P*N)xD
 
         cKa, cKb = [tf.reshape(
-            k.K(tf.reshape(Xr, (-1, self.input_dim)), Z, presliced=False),
-            (HpowD, N, M)
+            misc.upcast(k.K(tf.reshape(Xr, (-1, self.input_dim)), Z, presliced=False)),
+            (P, N, M)
         ) - k.eKxz(Z, Xmu, Xcov)[None, :, :] for k in (Ka, Kb)]  # Centred Kxz
         eKa, eKb = Ka.eKxz(Z, Xmu, Xcov), Kb.eKxz(Z, Xmu, Xcov)
 
-        wr = wn * nppi ** (-self.input_dim * 0.5)
-        cc = tf.reduce_sum(cKa[:, :, None, :] * cKb[:, :, :, None] * wr[:, None, None, None], 0)
+        cc = tf.reduce_sum(cKa[:, :, None, :] * cKb[:, :, :, None] * wn[:, None, None, None], 0)
         cm = eKa[:, None, :] * eKb[:, :, None]
         return cc + tf.transpose(cc, [0, 2, 1]) + cm + tf.transpose(cm, [0, 2, 1])
 
 
 class Product(kernels.Product):
+    """
+    Product
+    Kernel expectations are the products of the expectations of the factors
+    when these act on separate dimensions. Products of RBF kernels over shared
+    dimensions are a single RBF kernel, whose expectations are computed in
+    closed form for diagonal covariances. Other products fall back to
+    quadrature.
+    """
+
     def eKdiag(self, Xmu, Xcov):
         if not self.on_separate_dimensions:
-            raise NotImplementedError("Product currently needs to be defined on separate dimensions.")  # pragma: no cover
+            if self._is_rbf_product(Xcov):
+                return misc.upcast(self.Kdiag(Xmu))
+            return super().eKdiag(Xmu, Xcov)
         with tf.control_dependencies([
             tf.assert_equal(tf.rank(Xcov), 2,
                             message="Product currently only supports diagonal Xcov.", name="assert_Xcov_diag"),
@@ -351,7 +528,9 @@ class Product(kernels.Product):
 
     def eKxz(self, Z, Xmu, Xcov):
         if not self.on_separate_dimensions:
-            raise NotImplementedError("Product currently needs to be defined on separate dimensions.")  # pragma: no cover
+            if self._is_rbf_product(Xcov):
+                return self._rbf_product_eKxz(Z, Xmu, Xcov)
+            return super().eKxz(Z, Xmu, Xcov)
         with tf.control_dependencies([
             tf.assert_equal(tf.rank(Xcov), 2,
                             message="Product currently only supports diagonal Xcov.", name="assert_Xcov_diag"),
@@ -360,13 +539,140 @@ class Product(kernels.Product):
 
     def eKzxKxz(self, Z, Xmu, Xcov):
         if not self.on_separate_dimensions:
-            raise NotImplementedError("Product currently needs to be defined on separate dimensions.")  # pragma: no cover
+            if self._is_rbf_product(Xcov):
+                return self._rbf_product_eKzxKxz(Z, Xmu, Xcov)
+            return super().eKzxKxz(Z, Xmu, Xcov)
         with tf.control_dependencies([
             tf.assert_equal(tf.rank(Xcov), 2,
                             message="Product currently only supports diagonal Xcov.", name="assert_Xcov_diag"),
         ]):
             return reduce(tf.multiply, [k.eKzxKxz(Z, Xmu, Xcov) for k in self.kern_list])
 
+    def _is_rbf_product(self, Xcov):
+        return Xcov.get_shape().ndims == 2 and all(isinstance(k, kernels.RBF) for k in self.kern_list)
+
+    @params_as_tensors
+    def _rbf_product_eKxz(self, Z, Xmu, Xcov):
+        variance, precisions, dims = self._merge_rbf()
+        Z, Xmu, Xvar = [_gather_columns(X, dims) for X in (Z, Xmu, Xcov)]
+        return variance * _diag_gauss_eKxz(Z, Xmu, Xvar, precisions)
+
+    @params_as_tensors
+    def _rbf_product_eKzxKxz(self, Z, Xmu, Xcov):
+        variance, precisions, dims = self._merge_rbf()
+        Z, Xmu, Xvar = [_gather_columns(X, dims) for X in (Z, Xmu, Xcov)]
+        return variance ** 2.0 * _diag_gauss_eKzxKxz(Z, Xmu, Xvar, precisions, precisions)
+
+    def _merge_rbf(self):
+        """
+        The product of RBF kernels is an RBF kernel on the union of their
+        active dimensions, whose inverse squared lengthscales are the sums of
+        the inverse squared lengthscales of the factors.
+        :return: variance, inverse squared lengthscales and the active dimensions.
+        """
+        factor_dims = [np.arange(self.input_dim)[k.active_dims]
+                       if isinstance(k.active_dims, slice) else np.asarray(k.active_dims)
+                       for k in self.kern_list]
+        dims = np.unique(np.concatenate(factor_dims))
+        precisions = []
+        for k, kdims in zip(self.kern_list, factor_dims):
+            assign = np.asarray(kdims[:, None] == dims[None, :], dtype=settings.float_type)
+            kprecisions = tf.zeros((len(kdims),), dtype=settings.float_type) + k.lengthscales ** -2.0
+            precisions.append(tf.reduce_sum(tf.expand_dims(kprecisions, 1) * assign, 0))
+        variance = reduce(tf.multiply, [k.variance for k in self.kern_list])
+        return variance, reduce(tf.add, precisions), dims
+
+
+def _diag_gauss_eKxz(Z, Xmu, Xvar, precisions):
+    """
+    Computes <exp(-0.5 sum_d a_d (x_d - z_d)^2)>_q(x) for diagonal q(x).
+    :param Z: MxD
+    :param Xmu: X mean (NxD)
+    :param Xvar: X variances (NxD)
+    :param precisions: a (D)
+    :return: NxM
+    """
+    scaled = 1. + precisions * Xvar  # NxD
+    dist = tf.square(tf.expand_dims(Xmu, 1) - tf.expand_dims(Z, 0))  # NxMxD
+    exponent = tf.reduce_sum(precisions * dist / tf.expand_dims(scaled, 1), 2)  # NxM
+    return tf.exp(-0.5 * exponent) * tf.expand_dims(tf.reduce_prod(scaled, 1) ** -0.5, 1)
+
+
+def _diag_gauss_eKzxKxz(Z, Xmu, Xvar, precisions1, precisions2):
+    """
+    Computes <exp(-0.5 sum_d a1_d (x_d - z_d)^2) exp(-0.5 sum_d a2_d (x_d - z'_d)^2)>_q(x)
+    for diagonal q(x). The squared distances to the weighted midpoints of the
+    inducing inputs are expanded into matrix products, so that no NxMxMxD
+    tensor is formed.
+    :param Z: MxD
+    :param Xmu: X mean (NxD)
+    :param Xvar: X variances (NxD)
+    :param precisions1: a1 (D)
+    :param precisions2: a2 (D)
+    :return: NxMxM
+    """
+    N, M = tf.shape(Xmu)[0], tf.shape(Z)[0]
+    precisions = precisions1 + precisions2  # D
+    scaled = 1. + precisions * Xvar  # NxD
+    Z1, Z2 = tf.expand_dims(Z, 1), tf.expand_dims(Z, 0)  # Mx1xD, 1xMxD
+    Zbar = tf.reshape((precisions1 * Z1 + precisions2 * Z2) / precisions, tf.stack([M * M, -1]))  # (M*M)xD
+    zdist = tf.reduce_sum(precisions1 * precisions2 / precisions * tf.square(Z1 - Z2), 2)  # MxM
+    A = precisions / scaled  # NxD
+    mdist = tf.reduce_sum(A * tf.square(Xmu), 1, keep_dims=True) \
+            - 2. * tf.matmul(A * Xmu, Zbar, transpose_b=True) \
+            + tf.matmul(A, tf.square(Zbar), transpose_b=True)  # Nx(M*M)
+    mdist = tf.reshape(tf.maximum(mdist, 0.), tf.stack([N, M, M]))
+    exponent = tf.expand_dims(zdist, 0) + mdist  # NxMxM
+    return tf.exp(-0.5 * exponent) * tf.reshape(tf.reduce_prod(scaled, 1) ** -0.5, [-1, 1, 1])
+
+
+def _gather_columns(X, dims):
+    return tf.transpose(tf.gather(tf.transpose(X), dims))
+
+
+def _gamma_mixture(shape, num_points):
+    """
+    Points and weights for expectations over t ~ Gamma(shape, rate=shape),
+    given by the trapezoidal rule over u = log t. The integrand decays
+    exponentially towards small t and doubly exponentially towards large t,
+    the range and step are chosen to balance the truncation errors at both
+    ends against the discretisation error, exp(-8 / step).
+    """
+    step = 1.
+    for _ in range(50):
+        bound = 8. / (shape * step)
+        step = (bound + np.log(bound)) / (num_points - 1)
+    u = np.linspace(-8. / (shape * step), np.log(8. / (shape * step)), num_points)
+    log_weights = shape * np.log(shape) + shape * u - shape * np.exp(u) - lgamma(shape)
+    weights = np.exp(log_weights)
+    return np.exp(u), weights / np.sum(weights)
+
+
+def _fourier_orders_weights(num_orders):
+    return np.array([1.] + [2.] * (num_orders - 1), dtype=settings.float_type)
+
+
+def _bessel_ive(x, num_orders, num_terms=None):
+    """
+    Exponentially scaled modified Bessel functions of the first kind,
+    exp(-|x|) I_k(|x|) for k = 0, ..., num_orders - 1, evaluated by their
+    power series in the log domain. By default the series is long enough for
+    |x| up to num_orders^2 / 32, the largest argument of the Periodic kernel
+    expectations within their validity range.
+    :return: x.shape + [num_orders]
+    """
+    num_terms = num_terms or max(100, 50 + num_orders ** 2 // 32)
+    k = np.arange(num_orders)[:, None]
+    m = np.arange(num_terms)[None, :]
+    powers = (2 * m + k).astype(settings.float_type)
+    log_factorials = np.array([[lgamma(mi + 1) + lgamma(mi + ki + 1)
+                                for mi in range(num_terms)]
+                               for ki in range(num_orders)], dtype=settings.float_type)
+    abs_x = tf.abs(x)[..., None, None]
+    log_half_x = tf.log(tf.maximum(0.5 * abs_x, np.finfo(settings.float_type).tiny))
+    log_terms = powers * log_half_x - log_factorials - abs_x
+    return tf.reduce_sum(tf.exp(log_terms), -1)
+
 
 Add = kernels.make_deprecated_class("Add", Sum)
 Prod = kernels.make_deprecated_class("Prod", Product)
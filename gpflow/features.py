@@ -18,8 +18,8 @@ from functools import singledispatch
 import numpy as np
 import tensorflow as tf
 
-from . import conditionals, transforms, kernels, decors, settings
-from .params import Parameter, Parameterized
+from . import conditionals, transforms, kernels, decors, settings, misc
+from .params import Parameter, Parameterized, ParamList
 
 
 class InducingFeature(Parameterized):
@@ -68,7 +68,7 @@ class InducingPoints(InducingFeature):
 
     @decors.params_as_tensors
     def Kuu(self, kern, jitter=0.0):
-        Kzz = kern.K(self.Z)
+        Kzz = misc.upcast(kern.K(self.Z))
         Kzz += jitter * tf.eye(len(self), dtype=settings.dtypes.float_type)
         return Kzz
 
@@ -85,6 +85,10 @@ class InducingPoints(InducingFeature):
     def eKufKfu(self, kern, Xmu, Xcov):
         return kern.eKzxKxz(self.Z, Xmu, Xcov)
 
+    @decors.params_as_tensors
+    def eKufKfu_sum(self, kern, Xmu, Xcov):
+        return kern.eKzxKxz_sum(self.Z, Xmu, Xcov)
+
 class Multiscale(InducingPoints):
     """
     Multi-scale inducing features
@@ -149,6 +153,270 @@ class Multiscale(InducingPoints):
                 "Multiscale features not implemented for `%s`." % str(type(kern)))
 
 
+class KroneckerInducingPoints(InducingFeature):
+    """
+    Inducing points on the Cartesian grid Z_1 x Z_2 x ... x Z_D, for kernels
+    that factorise over the input dimensions: `RBF`, and `Product` kernels of
+    one-dimensional kernels on distinct dimensions. Kuu is then the Kronecker
+    product of the D kernel matrices of the grid axes, so that it can be
+    factorised and solved in O(sum_d m_d^3 + M sum_d m_d) instead of O(M^3)
+    for M = prod_d m_d inducing points. See
+
+    ::
+
+      @inproceedings{wilson2015kernel,
+        title={Kernel interpolation for scalable structured Gaussian processes (KISS-GP)},
+        author={Wilson, Andrew and Nickisch, Hannes},
+        booktitle={International Conference on Machine Learning},
+        pages={1775--1784},
+        year={2015}
+      }
+
+    The inducing points are ordered with the last grid axis varying fastest.
+    """
+
+    def __init__(self, Z_list):
+        """
+        :param Z_list: list with the grid locations along each input
+            dimension, of sizes m_d or m_d x 1.
+        """
+        super().__init__()
+        self.Z_list = ParamList([np.reshape(Z, (-1, 1)) for Z in Z_list])
+
+    @property
+    def grid_shape(self):
+        return [int(Z.shape[0]) for Z in self.Z_list.params]
+
+    def __len__(self):
+        return int(np.prod(self.grid_shape))
+
+    def _factorise(self, kern):
+        """
+        Returns a function per grid axis, which evaluates the kernel factor of
+        that axis on single columns, and a function which slices the columns
+        of the inputs corresponding to the grid axes.
+        """
+        D = len(self.grid_shape)
+        if isinstance(kern, kernels.RBF):
+            if kern.input_dim != D:
+                raise ValueError("The kernel must have one input dimension per grid axis.")
+
+            def rbf_factor(d):
+                def K(A, B):
+                    with decors.params_as_tensors_for(kern):
+                        lengthscales = kern.lengthscales * tf.ones(D, dtype=settings.float_type)
+                        variance = kern.variance
+                    Kd = tf.exp(-0.5 * tf.square((A - tf.transpose(B)) / lengthscales[d]))
+                    return variance * Kd if d == 0 else Kd
+                return K
+
+            def columns(X):
+                X, _ = kern._slice(X, None)
+                return [X[:, d:d + 1] for d in range(D)]
+
+            return [rbf_factor(d) for d in range(D)], columns
+
+        if isinstance(kern, kernels.Product):
+            axis_kernels = [None] * D
+            for k in kern.kern_list:
+                dims = np.arange(D)[k.active_dims]
+                if k.input_dim != 1 or len(dims) != 1 or axis_kernels[dims[0]] is not None:
+                    raise ValueError("The product must have one kernel per grid axis.")
+                axis_kernels[dims[0]] = k
+            if any(k is None for k in axis_kernels):
+                raise ValueError("The product must have one kernel per grid axis.")
+
+            def columns(X):
+                return [X[:, d:d + 1] for d in range(D)]
+
+            factors = [lambda A, B, k=k: misc.upcast(k.K(A, B, presliced=True)) for k in axis_kernels]
+            return factors, columns
+
+        raise NotImplementedError(
+            "Kronecker inducing points not implemented for `%s`." % str(type(kern)))
+
+    @decors.params_as_tensors
+    def Kuu_factors(self, kern, jitter=0.0):
+        """
+        Returns the kernel matrices of the grid axes, size m_d x m_d each. The
+        jitter is added to every factor.
+        """
+        factors, _ = self._factorise(kern)
+        Z_list = [self.Z_list[d] for d in range(len(factors))]
+        return [K(Z, Z) + jitter * tf.eye(tf.shape(Z)[0], dtype=settings.float_type)
+                for K, Z in zip(factors, Z_list)]
+
+    @decors.params_as_tensors
+    def Kuf_factors(self, kern, Xnew):
+        """
+        Returns the covariances between the grid axes and the corresponding
+        columns of Xnew, size m_d x N each.
+        """
+        factors, columns = self._factorise(kern)
+        Z_list = [self.Z_list[d] for d in range(len(factors))]
+        return [K(Z, X) for K, Z, X in zip(factors, Z_list, columns(Xnew))]
+
+    def Kuu(self, kern, jitter=0.0):
+        return misc.kron(self.Kuu_factors(kern, jitter=jitter))
+
+    def Kuf(self, kern, Xnew):
+        return misc.khatri_rao(self.Kuf_factors(kern, Xnew))
+
+
+class FourierFeatures1D(InducingFeature):
+    """
+    Variational Fourier features on the interval [a, b] for the
+    one-dimensional Matern 1/2, 3/2 and 5/2 kernels. Originally proposed in
+
+    ::
+
+      @article{hensman2017variational,
+        title={Variational Fourier features for Gaussian processes},
+        author={Hensman, James and Durrande, Nicolas and Solin, Arno},
+        journal={Journal of Machine Learning Research},
+        volume={18},
+        number={151},
+        pages={1--52},
+        year={2018}
+      }
+
+    The features are the projections of the process onto cos(w_m (x - a)),
+    m = 0, ..., M-1, and sin(w_m (x - a)), m = 1, ..., M-1, with frequencies
+    w_m = 2 pi m / (b - a), under the reproducing kernel Hilbert space inner
+    product of the kernel on [a, b]. Kuf is closed-form trigonometry inside
+    the interval and decays exponentially outside it, and Kuu is block
+    diagonal, each block a diagonal plus a matrix of rank at most two. The
+    features are not complete at the boundaries of the interval, so [a, b]
+    should extend somewhat beyond the data.
+    """
+
+    def __init__(self, a, b, M):
+        """
+        :param a: lower bound of the interval.
+        :param b: upper bound of the interval.
+        :param M: number of frequencies, giving 2M - 1 features.
+        """
+        super().__init__()
+        if not b > a:
+            raise ValueError("The interval bounds must satisfy `a < b`.")
+        if M < 1:
+            raise ValueError("At least one frequency is required.")
+        self.a = float(a)
+        self.b = float(b)
+        self.M = int(M)
+
+    def __len__(self):
+        return 2 * self.M - 1
+
+    @property
+    def frequencies(self):
+        return 2. * np.pi * np.arange(self.M, dtype=settings.float_type) / (self.b - self.a)
+
+    def _kernel_order(self, kern):
+        if kern.input_dim != 1:
+            raise ValueError("Fourier features require a kernel with `input_dim` 1.")
+        for order, kern_class in enumerate((kernels.Matern12, kernels.Matern32, kernels.Matern52)):
+            if isinstance(kern, kern_class):
+                return order
+        raise NotImplementedError(
+            "Fourier features not implemented for `%s`." % str(type(kern)))
+
+    def _spectral_factors(self, kern):
+        """
+        Returns the diagonal d, size 2M-1, and the low rank factor V, size
+        2M-1 x R, of Kuu = diag(d) + V V^T.
+        """
+        order = self._kernel_order(kern)
+        with decors.params_as_tensors_for(kern):
+            lengthscale = tf.reshape(kern.lengthscales, [])
+            variance = kern.variance
+        omega = self.frequencies
+        omega_sin = omega[1:]
+        lam = np.sqrt(2. * order + 1.) / lengthscale
+        sigma = tf.sqrt(variance)
+        # the spectral density of the kernel is variance * c / (lam^2 + w^2)^(order + 1)
+        c = [2., 4., 16. / 3.][order] * lam ** (2 * order + 1)
+        scale = np.where(omega == 0., 1., 2.)
+        d_cos = (self.b - self.a) * (lam ** 2 + omega ** 2) ** (order + 1) / (c * variance * scale)
+        d_sin = (self.b - self.a) * (lam ** 2 + omega_sin ** 2) ** (order + 1) / (c * variance * 2.)
+
+        ones = tf.ones((self.M, 1), dtype=settings.float_type)
+        if order == 0:
+            V_cos = ones / sigma
+            V_sin = tf.zeros((self.M - 1, 0), dtype=settings.float_type)
+        elif order == 1:
+            V_cos = ones / sigma
+            V_sin = tf.reshape(omega_sin / (lam * sigma), (-1, 1))
+        else:
+            v = (3. * omega ** 2 / lam ** 2 - 1.) / (np.sqrt(8.) * sigma)
+            V_cos = tf.concat([tf.reshape(v, (-1, 1)), ones / sigma], 1)
+            V_sin = tf.reshape(np.sqrt(3.) * omega_sin / (lam * sigma), (-1, 1))
+
+        d = tf.concat([d_cos, d_sin], 0)
+        V = tf.concat([tf.pad(V_cos, [[0, 0], [0, tf.shape(V_sin)[1]]]),
+                       tf.pad(V_sin, [[0, 0], [tf.shape(V_cos)[1], 0]])], 0)
+        return d, V
+
+    def Kuu(self, kern, jitter=0.0):
+        d, V = self.Kuu_diag_low_rank(kern, jitter=jitter)
+        return tf.matrix_diag(d) + tf.matmul(V, V, transpose_b=True)
+
+    def Kuu_diag_low_rank(self, kern, jitter=0.0):
+        """
+        Returns the diagonal d, size 2M-1, and the low rank factor V,
+        size 2M-1 x R with R at most 3, of Kuu = diag(d) + V V^T.
+        """
+        d, V = self._spectral_factors(kern)
+        return d + jitter, V
+
+    def Kuu_solve(self, kern, B, jitter=0.0):
+        """
+        Computes Kuu^{-1} B with the Woodbury identity in O(M) operations per
+        column of B.
+        """
+        d, V = self.Kuu_diag_low_rank(kern, jitter=jitter)
+        d = tf.expand_dims(d, 1)
+        DiV = V / d
+        DiB = B / d
+        R = tf.shape(V)[1]
+        capacitance = tf.eye(R, dtype=settings.float_type) + tf.matmul(V, DiV, transpose_a=True)
+        L = tf.cholesky(capacitance)
+        return DiB - tf.matmul(DiV, tf.cholesky_solve(L, tf.matmul(V, DiB, transpose_a=True)))
+
+    def Kuf(self, kern, Xnew):
+        order = self._kernel_order(kern)
+        with decors.params_as_tensors_for(kern):
+            Xnew, _ = kern._slice(Xnew, None)
+            lam = np.sqrt(2. * order + 1.) / tf.reshape(kern.lengthscales, [])
+        omega = self.frequencies[:, None]
+        omega_sin = omega[1:]
+        x = tf.reshape(Xnew, (1, -1))
+        Kuf_cos = tf.cos(omega * (x - self.a))
+        Kuf_sin = tf.sin(omega_sin * (x - self.a))
+
+        # outside the interval the features decay with the distance to the nearest bound
+        left = tf.maximum(self.a - x, 0.)
+        right = tf.maximum(x - self.b, 0.)
+        dist = left + right
+        sign = tf.sign(right) - tf.sign(left)
+        outside = tf.cast(tf.greater(dist, 0.), settings.float_type)
+        decay = tf.exp(-lam * dist)
+        if order == 0:
+            edge_cos = decay + tf.zeros_like(Kuf_cos)
+            edge_sin = tf.zeros_like(Kuf_sin)
+        elif order == 1:
+            edge_cos = (1. + lam * dist) * decay + tf.zeros_like(Kuf_cos)
+            edge_sin = sign * dist * decay * omega_sin
+        else:
+            edge_cos = decay * (1. + lam * dist + tf.square(lam * dist) / 2.
+                                - tf.square(omega * dist) / 2.)
+            edge_sin = sign * (dist + lam * tf.square(dist)) * decay * omega_sin
+
+        Kuf_cos = (1. - outside) * Kuf_cos + outside * edge_cos
+        Kuf_sin = (1. - outside) * Kuf_sin + outside * edge_sin
+        return tf.concat([Kuf_cos, Kuf_sin], 0)
+
+
 @singledispatch
 def conditional(feat, kern, Xnew, f, *, full_cov=False, q_sqrt=None, white=False):
     """
@@ -173,6 +441,58 @@ def default_feature_conditional(feat, kern, Xnew, f, *, full_cov=False, q_sqrt=N
                                             white=white)
 
 
+@conditional.register(KroneckerInducingPoints)
+def kronecker_feature_conditional(feat, kern, Xnew, f, *, full_cov=False, q_sqrt=None, white=False):
+    """
+    Factorises Kuu one grid axis at a time. Next to the usual forms, q_sqrt
+    may be given as a list of Kronecker factors of size m_d x m_d x K, in
+    which case the covariance of q(u) is never formed either.
+    """
+    Lms = [tf.cholesky(Kuu) for Kuu in feat.Kuu_factors(kern, jitter=settings.numerics.jitter_level)]
+    Kmn = feat.Kuf(kern, Xnew)
+    A = misc.kron_triangular_solve(Lms, Kmn, lower=True)
+    if full_cov:
+        fvar = misc.upcast(kern.K(Xnew)) - tf.matmul(A, A, transpose_a=True)
+    else:
+        fvar = misc.upcast(kern.Kdiag(Xnew)) - tf.reduce_sum(tf.square(A), 0)
+    if not white:
+        A = misc.kron_triangular_solve(Lms, A, lower=True, adjoint=True)
+
+    if not isinstance(q_sqrt, (list, tuple)):
+        return conditionals._project_conditional(A, fvar, f, full_cov=full_cov, q_sqrt=q_sqrt)
+
+    fmean, fvar = conditionals._project_conditional(A, fvar, f, full_cov=full_cov)
+    num_func = tf.shape(f)[1]  # K
+    Lqs = [tf.matrix_band_part(tf.transpose(Lq, (2, 0, 1)), -1, 0) for Lq in q_sqrt]  # K x m_d x m_d
+    A_tiled = tf.tile(tf.expand_dims(A, 0), tf.stack([num_func, 1, 1]))
+    LTA = misc.kron_matmul([tf.matrix_transpose(Lq) for Lq in Lqs], A_tiled)  # K x M x N
+    if full_cov:
+        fvar = fvar + tf.transpose(tf.matmul(LTA, LTA, transpose_a=True), (1, 2, 0))  # N x N x K
+    else:
+        fvar = fvar + tf.transpose(tf.reduce_sum(tf.square(LTA), 1))  # N x K
+    return fmean, fvar
+
+
+@conditional.register(FourierFeatures1D)
+def fourier_feature_conditional(feat, kern, Xnew, f, *, full_cov=False, q_sqrt=None, white=False):
+    """
+    Exploits the diagonal plus low rank structure of Kuu for the Fourier
+    features, so that no M x M matrix is factorised. The whitened
+    representation needs the Cholesky factor of Kuu and uses the default
+    code path.
+    """
+    if white:
+        return default_feature_conditional(feat, kern, Xnew, f, full_cov=full_cov,
+                                           q_sqrt=q_sqrt, white=white)
+    Kmn = feat.Kuf(kern, Xnew)
+    A = feat.Kuu_solve(kern, Kmn, jitter=settings.numerics.jitter_level)
+    if full_cov:
+        fvar = misc.upcast(kern.K(Xnew)) - tf.matmul(Kmn, A, transpose_a=True)
+    else:
+        fvar = misc.upcast(kern.Kdiag(Xnew)) - tf.reduce_sum(Kmn * A, 0)
+    return conditionals._project_conditional(A, fvar, f, full_cov=full_cov, q_sqrt=q_sqrt)
+
+
 def inducingpoint_wrapper(feat, Z):
     """
     Models which used to take only Z can now pass `feat` and `Z` to this method. This method will
@@ -16,11 +16,13 @@
 
 from __future__ import print_function, absolute_import
 from functools import reduce
+import functools
 import warnings
 
 import tensorflow as tf
 import numpy as np
 
+from . import misc
 from . import transforms
 from . import settings
 
@@ -29,6 +31,37 @@ from .decors import params_as_tensors, autoflow
 from .quadrature import mvnquad
 
 
+def kernel_precision(method):
+    """
+    Evaluates a kernel method in `settings.kernel_float_type`, which is lower
+    than `settings.float_type` in the mixed precision mode: the float inputs
+    and the parameters of the kernel are cast to it, and so is the result.
+    Consumers of kernel matrices cast them back with `misc.upcast` before
+    factorizing them.
+
+    The mode only speeds up the kernel evaluations themselves. It does not
+    save memory: the upcast kernel matrix lives next to the low precision
+    one, and data holders keep their `float_type` storage.
+    """
+    @functools.wraps(method)
+    def runnable(self, *args, **kwargs):
+        if settings.kernel_float_type == settings.float_type:
+            return method(self, *args, **kwargs)
+        args = [_kernel_float(arg) for arg in args]
+        kwargs = {key: _kernel_float(value) for key, value in kwargs.items()}
+        # The parameters are replaced by their casts for the duration of the
+        # call. Parameters already replaced by an enclosing call are skipped.
+        params = {name: value for name, value in vars(self).items() if isinstance(value, Parameter)}
+        try:
+            for name, param in params.items():
+                object.__setattr__(self, name, _kernel_float(param.constrained_tensor))
+            return method(self, *args, **kwargs)
+        finally:
+            for name, param in params.items():
+                object.__setattr__(self, name, param)
+    return runnable
+
+
 class Kernel(Parameterized):
     """
     The basic kernel class. Handles input_dim and active dims, and provides a
@@ -62,6 +95,8 @@ class Kernel(Parameterized):
             assert len(active_dims) == input_dim
 
         self.num_gauss_hermite_points = 20
+        # `quadrature.QuadratureRule` replacing the Gauss-Hermite grid in kernel expectations
+        self.quadrature_rule = None
 
     @autoflow((settings.float_type, [None, None]),
               (settings.float_type, [None, None]))
@@ -105,6 +140,12 @@ class Kernel(Parameterized):
     def compute_eKzxKxz(self, Z, Xmu, Xcov):
         return self.eKzxKxz(Z, Xmu, Xcov)
 
+    @autoflow((settings.float_type, [None, None]),
+              (settings.float_type, [None, None]),
+              (settings.float_type,))
+    def compute_eKzxKxz_sum(self, Z, Xmu, Xcov):
+        return self.eKzxKxz_sum(Z, Xmu, Xcov)
+
     def eKdiag(self, Xmu, Xcov):
         """
         Computes <K_xx>_q(x).
@@ -115,9 +156,10 @@ class Kernel(Parameterized):
         self._check_quadrature()
         Xmu, _ = self._slice(Xmu, None)
         Xcov = self._slice_cov(Xcov)
-        return mvnquad(lambda x: self.Kdiag(x, presliced=True),
+        return mvnquad(lambda x: misc.upcast(self.Kdiag(x, presliced=True)),
                        Xmu, Xcov,
-                       self.num_gauss_hermite_points, self.input_dim)  # N
+                       self.num_gauss_hermite_points, self.input_dim,
+                       rule=self.quadrature_rule)  # N
 
     def eKxz(self, Z, Xmu, Xcov):
         """
@@ -131,8 +173,9 @@ class Kernel(Parameterized):
         Xmu, Z = self._slice(Xmu, Z)
         Xcov = self._slice_cov(Xcov)
         M = tf.shape(Z)[0]
-        return mvnquad(lambda x: self.K(x, Z, presliced=True), Xmu, Xcov, self.num_gauss_hermite_points,
-                       self.input_dim, Dout=(M,))  # (H**DxNxD, H**D)
+        return mvnquad(lambda x: misc.upcast(self.K(x, Z, presliced=True)), Xmu, Xcov,
+                       self.num_gauss_hermite_points,
+                       self.input_dim, Dout=(M,), rule=self.quadrature_rule)  # (H**DxNxD, H**D)
 
     def exKxz_pairwise(self, Z, Xmu, Xcov):
         """
@@ -166,10 +209,10 @@ class Kernel(Parameterized):
         fXcovt = tf.concat((Xcov[0, :-1, :, :], Xcov[1, :-1, :, :]), 2)  # NxDx2D
         fXcovb = tf.concat((tf.transpose(Xcov[1, :-1, :, :], (0, 2, 1)), Xcov[0, 1:, :, :]), 2)
         fXcov = tf.concat((fXcovt, fXcovb), 1)
-        return mvnquad(lambda x: tf.expand_dims(self.K(x[:, :D], Z), 2) *
+        return mvnquad(lambda x: tf.expand_dims(misc.upcast(self.K(x[:, :D], Z)), 2) *
                                  tf.expand_dims(x[:, D:], 1),
                        fXmu, fXcov, self.num_gauss_hermite_points,
-                       2 * D, Dout=(M, D))
+                       2 * D, Dout=(M, D), rule=self.quadrature_rule)
 
     def exKxz(self, Z, Xmu, Xcov):
         """
@@ -197,10 +240,10 @@ class Kernel(Parameterized):
             Xmu = tf.identity(Xmu)
 
         def integrand(x):
-            return tf.expand_dims(self.K(x, Z), 2) * tf.expand_dims(x, 1)
+            return tf.expand_dims(misc.upcast(self.K(x, Z)), 2) * tf.expand_dims(x, 1)
 
         num_points = self.num_gauss_hermite_points
-        return mvnquad(integrand, Xmu, Xcov, num_points, D, Dout=(M, D))
+        return mvnquad(integrand, Xmu, Xcov, num_points, D, Dout=(M, D), rule=self.quadrature_rule)
 
     def eKzxKxz(self, Z, Xmu, Xcov):
         """
@@ -216,12 +259,42 @@ class Kernel(Parameterized):
         M = tf.shape(Z)[0]
 
         def KzxKxz(x):
-            Kxz = self.K(x, Z, presliced=True)
+            Kxz = misc.upcast(self.K(x, Z, presliced=True))
             return tf.expand_dims(Kxz, 2) * tf.expand_dims(Kxz, 1)
 
         return mvnquad(KzxKxz,
                        Xmu, Xcov, self.num_gauss_hermite_points,
-                       self.input_dim, Dout=(M, M))
+                       self.input_dim, Dout=(M, M), rule=self.quadrature_rule)
+
+    def eKzxKxz_sum(self, Z, Xmu, Xcov, chunk_size=None):
+        """
+        Computes sum_n <K_zx_n K_x_nz>_q(x_n), accumulating `eKzxKxz` over
+        chunks of data points, so that the NxMxM tensor is never materialised.
+        The chunks are evaluated one at a time. The backward pass still keeps
+        the intermediate tensors of all chunks, O(N M^2) in total, which are
+        only moved to the host memory by swapping.
+        :param Z: Fixed inputs MxD.
+        :param Xmu: X means (NxD).
+        :param Xcov: X covariances (NxDxD or NxD).
+        :param chunk_size: number of data points per chunk, by default
+            `settings.numerics.ekern_chunk_size`.
+        :return: MxM
+        """
+        chunk_size = chunk_size or settings.numerics.ekern_chunk_size
+        N = tf.shape(Xmu)[0]
+        M = tf.shape(Z)[0]
+
+        def body(start, psi2):
+            end = start + chunk_size
+            chunk = self.eKzxKxz(Z, Xmu[start:end], Xcov[start:end])
+            return end, psi2 + tf.reduce_sum(chunk, 0)
+
+        init = [tf.constant(0), tf.zeros(tf.stack([M, M]), dtype=settings.float_type)]
+        shapes = [tf.TensorShape([]), tf.TensorShape([None, None])]
+        _, psi2 = tf.while_loop(lambda start, _: start < N, body, init,
+                                shape_invariants=shapes, parallel_iterations=1,
+                                swap_memory=True)
+        return psi2
 
     def _check_quadrature(self):
         if settings.numerics.ekern_quadrature == "warn":
@@ -233,11 +306,30 @@ class Kernel(Parameterized):
     def _slice(self, X, X2):
         """
         Slice the correct dimensions for use in the kernel, as indicated by
-        `self.active_dims`.
+        `self.active_dims`. The sliced tensors are shared by all kernels with
+        the same active dimensions within a build scope. Sparse inputs are sliced
+        as `tf.SparseTensor`.
         :param X: Input 1 (NxD).
         :param X2: Input 2 (MxD), may be None.
         :return: Sliced X, X2, (Nxself.input_dim).
         """
+        if isinstance(X, tf.SparseTensor) or isinstance(X2, tf.SparseTensor):
+            def slice_input(Z):
+                if isinstance(Z, tf.SparseTensor):
+                    return _slice_sparse(Z, self.active_dims, self.input_dim)
+                return None if Z is None else self._slice(Z, None)[0]
+            return slice_input(X), slice_input(X2)
+
+        cache = _distance_cache_for(X, X2)
+        if isinstance(self.active_dims, slice):
+            dims_key = (self.active_dims.start, self.active_dims.stop, self.active_dims.step)
+        else:
+            dims_key = tuple(self.active_dims)
+        key = ('slice', X, X2, self.input_dim, dims_key)
+        if cache is not None and key in cache:
+            return cache[key]
+
+        X_in, X2_in = X, X2
         if isinstance(self.active_dims, slice):
             X = X[:, self.active_dims]
             if X2 is not None:
@@ -251,6 +343,8 @@ class Kernel(Parameterized):
         with tf.control_dependencies([tf.assert_equal(input_dim_shape, input_dim)]):
             X = tf.identity(X)
 
+        if cache is not None:
+            cache[('slice', X_in, X2_in, self.input_dim, dims_key)] = X, X2
         return X, X2
 
     def _slice_cov(self, cov):
@@ -292,6 +386,7 @@ class Static(Kernel):
         super().__init__(input_dim, active_dims, name=name)
         self.variance = Parameter(variance, transform=transforms.positive)
 
+    @kernel_precision
     @params_as_tensors
     def Kdiag(self, X):
         return tf.fill(tf.stack([tf.shape(X)[0]]), tf.squeeze(self.variance))
@@ -302,6 +397,7 @@ class White(Static):
     The White kernel
     """
 
+    @kernel_precision
     @params_as_tensors
     def K(self, X, X2=None, presliced=False):
         if X2 is None:
@@ -309,7 +405,7 @@ class White(Static):
             return tf.matrix_diag(d)
         else:
             shape = tf.stack([tf.shape(X)[0], tf.shape(X2)[0]])
-            return tf.zeros(shape, settings.float_type)
+            return tf.zeros(shape, settings.kernel_float_type)
 
 
 class Constant(Static):
@@ -317,6 +413,7 @@ class Constant(Static):
     The Constant (aka Bias) kernel
     """
 
+    @kernel_precision
     @params_as_tensors
     def K(self, X, X2=None, presliced=False):
         if X2 is None:
@@ -374,25 +471,22 @@ class Stationary(Kernel):
 
     @params_as_tensors
     def square_dist(self, X, X2):
-        X = X / self.lengthscales
-        Xs = tf.reduce_sum(tf.square(X), axis=1)
-
-        if X2 is None:
-            dist = -2 * tf.matmul(X, X, transpose_b=True)
-            dist += tf.reshape(Xs, (-1, 1))  + tf.reshape(Xs, (1, -1))
-            return dist
-
-        X2 = X2 / self.lengthscales
-        X2s = tf.reduce_sum(tf.square(X2), axis=1)
-        dist = -2 * tf.matmul(X, X2, transpose_b=True)
-        dist += tf.reshape(Xs, (-1, 1)) + tf.reshape(X2s, (1, -1))
-        return dist
-
+        """
+        Returns the squared distances between the rows of X and X2, scaled by
+        the lengthscales. The distances are built once per build scope: with a
+        single lengthscale the unscaled distances are shared by all kernels
+        acting on the same inputs, otherwise the scaled distances are shared
+        by all calls with the same lengthscales.
+        """
+        if self.lengthscales.get_shape().num_elements() == 1:
+            return _square_dist(X, X2, None) / tf.square(self.lengthscales)
+        return _square_dist(X, X2, self.lengthscales)
 
     def euclid_dist(self, X, X2):
         r2 = self.square_dist(X, X2)
         return tf.sqrt(r2 + 1e-12)
 
+    @kernel_precision
     @params_as_tensors
     def Kdiag(self, X, presliced=False):
         return tf.fill(tf.stack([tf.shape(X)[0]]), tf.squeeze(self.variance))
@@ -403,6 +497,7 @@ class RBF(Stationary):
     The radial basis function (RBF) or squared exponential kernel
     """
 
+    @kernel_precision
     @params_as_tensors
     def K(self, X, X2=None, presliced=False):
         if not presliced:
@@ -432,19 +527,28 @@ class Linear(Kernel):
         else:
             self.variance = Parameter(variance, transform=transforms.positive)
 
+    @kernel_precision
     @params_as_tensors
     def K(self, X, X2=None, presliced=False):
         if not presliced:
             X, X2 = self._slice(X, X2)
+        if isinstance(X, tf.SparseTensor):
+            return _sparse_gram(_scale_sparse(X, self.variance), X if X2 is None else X2)
+        if isinstance(X2, tf.SparseTensor):
+            return tf.transpose(_sparse_gram(X2, X * self.variance))
         if X2 is None:
             return tf.matmul(X * self.variance, X, transpose_b=True)
         else:
             return tf.matmul(X * self.variance, X2, transpose_b=True)
 
+    @kernel_precision
     @params_as_tensors
     def Kdiag(self, X, presliced=False):
         if not presliced:
             X, _ = self._slice(X, None)
+        if isinstance(X, tf.SparseTensor):
+            values = _scale_sparse(X, self.variance).values * X.values
+            return tf.unsorted_segment_sum(values, X.indices[:, 0], misc.num_rows(X))
         return tf.reduce_sum(tf.square(X) * self.variance, 1)
 
 
@@ -473,10 +577,12 @@ class Polynomial(Linear):
         self.degree = degree
         self.offset = Parameter(offset, transform=transforms.positive)
 
+    @kernel_precision
     @params_as_tensors
     def K(self, X, X2=None, presliced=False):
         return (Linear.K(self, X, X2, presliced=presliced) + self.offset) ** self.degree
 
+    @kernel_precision
     @params_as_tensors
     def Kdiag(self, X, presliced=False):
         return (Linear.Kdiag(self, X, presliced=presliced) + self.offset) ** self.degree
@@ -487,6 +593,7 @@ class Exponential(Stationary):
     The Exponential kernel
     """
 
+    @kernel_precision
     @params_as_tensors
     def K(self, X, X2=None, presliced=False):
         if not presliced:
@@ -500,6 +607,7 @@ class Matern12(Stationary):
     The Matern 1/2 kernel
     """
 
+    @kernel_precision
     @params_as_tensors
     def K(self, X, X2=None, presliced=False):
         if not presliced:
@@ -513,6 +621,7 @@ class Matern32(Stationary):
     The Matern 3/2 kernel
     """
 
+    @kernel_precision
     @params_as_tensors
     def K(self, X, X2=None, presliced=False):
         if not presliced:
@@ -527,6 +636,7 @@ class Matern52(Stationary):
     The Matern 5/2 kernel
     """
 
+    @kernel_precision
     @params_as_tensors
     def K(self, X, X2=None, presliced=False):
         if not presliced:
@@ -541,6 +651,7 @@ class Cosine(Stationary):
     The Cosine kernel
     """
 
+    @kernel_precision
     @params_as_tensors
     def K(self, X, X2=None, presliced=False):
         if not presliced:
@@ -627,6 +738,7 @@ class ArcCosine(Kernel):
             return 3. * tf.sin(theta) * tf.cos(theta) + \
                    (np.pi - theta) * (1. + 2. * tf.cos(theta) ** 2)
 
+    @kernel_precision
     @params_as_tensors
     def K(self, X, X2=None, presliced=False):
         if not presliced:
@@ -648,13 +760,14 @@ class ArcCosine(Kernel):
                X_denominator[:, None] ** self.order * \
                X2_denominator[None, :] ** self.order
 
+    @kernel_precision
     @params_as_tensors
     def Kdiag(self, X, presliced=False):
         if not presliced:
             X, _ = self._slice(X, None)
 
         X_product = self._weighted_product(X)
-        theta = tf.constant(0., settings.float_type)
+        theta = tf.constant(0., settings.kernel_float_type)
         return self.variance * (1. / np.pi) * self._J(theta) * X_product ** self.order
 
 
@@ -677,10 +790,12 @@ class Periodic(Kernel):
         self.ARD = False
         self.period = Parameter(period, transform=transforms.positive)
 
+    @kernel_precision
     @params_as_tensors
     def Kdiag(self, X, presliced=False):
         return tf.fill(tf.stack([tf.shape(X)[0]]), tf.squeeze(self.variance))
 
+    @kernel_precision
     @params_as_tensors
     def K(self, X, X2=None, presliced=False):
         if not presliced:
@@ -731,6 +846,7 @@ class Coregion(Kernel):
         self.W = Parameter(np.zeros((self.output_dim, self.rank), dtype=settings.float_type))
         self.kappa = Parameter(np.ones(self.output_dim, dtype=settings.float_type), transform=transforms.positive)
 
+    @kernel_precision
     @params_as_tensors
     def K(self, X, X2=None):
         X, X2 = self._slice(X, X2)
@@ -742,6 +858,7 @@ class Coregion(Kernel):
         B = tf.matmul(self.W, self.W, transpose_b=True) + tf.matrix_diag(self.kappa)
         return tf.gather(tf.transpose(tf.gather(B, X2)), X)
 
+    @kernel_precision
     @params_as_tensors
     def Kdiag(self, X):
         X, _ = self._slice(X, None)
@@ -777,6 +894,56 @@ def make_kernel_names(kern_list):
     return names
 
 
+class Additive(Kernel):
+    """
+    The sum of one-dimensional stationary kernels of the same family, one
+    per input dimension,
+
+        k(x, x') = sum_d variance_d * k_d(|x_d - x'_d| / lengthscales_d).
+
+    This is the kernel of `Sum([kernel_class(1, active_dims=[d]) for d in ...])`,
+    but the hyperparameters are stacked into vectors and all components are
+    evaluated by one batched op over the input dimensions, so the size of the
+    graph does not grow with the number of dimensions.
+    """
+
+    def __init__(self, input_dim, kernel_class=RBF, variance=1.0, lengthscales=1.0,
+                 active_dims=None, name=None):
+        """
+        - input_dim is the dimension of the input, and the number of components
+        - kernel_class is RBF, Exponential, Matern12, Matern32 or Matern52
+        - variance and lengthscales are the initial values of the parameters
+          of the components, floats or arrays of length input_dim
+        - active_dims is a list of length input_dim which controls which
+          columns of X are used.
+        """
+        super().__init__(input_dim, active_dims, name=name)
+        if kernel_class not in _additive_profiles:
+            raise ValueError("Additive kernels of `%s` are not supported." % str(kernel_class))
+        self.kernel_class = kernel_class
+        variance = variance * np.ones(input_dim, dtype=settings.float_type)
+        lengthscales = lengthscales * np.ones(input_dim, dtype=settings.float_type)
+        self.variance = Parameter(variance, transform=transforms.positive)
+        self.lengthscales = Parameter(lengthscales, transform=transforms.positive)
+
+    @kernel_precision
+    @params_as_tensors
+    def K(self, X, X2=None, presliced=False):
+        if not presliced:
+            X, X2 = self._slice(X, X2)
+        if X2 is None:
+            X2 = X
+        X = tf.expand_dims(tf.transpose(X / self.lengthscales), 2)  # D x N x 1
+        X2 = tf.expand_dims(tf.transpose(X2 / self.lengthscales), 1)  # D x 1 x M
+        components = _additive_profiles[self.kernel_class](tf.square(X - X2))  # D x N x M
+        return tf.tensordot(self.variance, components, 1)
+
+    @kernel_precision
+    @params_as_tensors
+    def Kdiag(self, X, presliced=False):
+        return tf.fill(tf.stack([tf.shape(X)[0]]), tf.reduce_sum(self.variance))
+
+
 class Combination(Kernel):
     """
     Combine a list of kernels, e.g. by adding or multiplying (see inheriting
@@ -845,6 +1012,163 @@ class Product(Combination):
         return reduce(tf.multiply, [k.Kdiag(X) for k in self.kern_list])
 
 
+def _matern32_profile(r2):
+    r = np.sqrt(3.) * tf.sqrt(r2 + 1e-12)
+    return (1. + r) * tf.exp(-r)
+
+
+def _matern52_profile(r2):
+    r = np.sqrt(5.) * tf.sqrt(r2 + 1e-12)
+    return (1. + r + tf.square(r) / 3.) * tf.exp(-r)
+
+
+# The unit-variance stationary kernels as functions of the scaled squared
+# distance, used by the `Additive` kernel.
+_additive_profiles = {
+    RBF: lambda r2: tf.exp(-r2 / 2),
+    Exponential: lambda r2: tf.exp(-0.5 * tf.sqrt(r2 + 1e-12)),
+    Matern12: lambda r2: tf.exp(-tf.sqrt(r2 + 1e-12)),
+    Matern32: _matern32_profile,
+    Matern52: _matern52_profile,
+}
+
+def _distance_cache_for(*tensors):
+    """
+    Returns the cache of the sliced inputs, scaled inputs and distance
+    matrices of the kernels within the current `misc.build_cache_scope`, or
+    None when results computed from the `tensors` cannot be shared: outside
+    of a build scope, for inputs that are not tensors, and within control
+    flow constructs such as `tf.while_loop`, whose tensors cannot be used
+    outside of them.
+    """
+    if not all(t is None or isinstance(t, (tf.Tensor, tf.Variable)) for t in tensors):
+        return None
+    if misc.in_control_flow():
+        return None
+    return misc.get_build_cache('distances')
+
+
+def _kernel_float(value):
+    """
+    Casts float arrays and tensors to `settings.kernel_float_type`. The cast
+    of a tensor is cached within a build scope, so that kernels evaluated on
+    the same inputs and parameters keep sharing slices and distances.
+    """
+    dtype = settings.kernel_float_type
+    if isinstance(value, np.ndarray) and value.dtype.kind == 'f':
+        return value.astype(dtype)
+    if isinstance(value, tf.SparseTensor):
+        if not value.dtype.is_floating or value.dtype.base_dtype == tf.as_dtype(dtype):
+            return value
+        return tf.SparseTensor(value.indices, tf.cast(value.values, dtype), value.dense_shape)
+    if not misc.is_tensor(value) or not value.dtype.is_floating or \
+            value.dtype.base_dtype == tf.as_dtype(dtype):
+        return value
+    cache = _distance_cache_for(value)
+    key = ('cast', value, dtype)
+    if cache is not None and key in cache:
+        return cache[key]
+    result = tf.cast(value, dtype)
+    if cache is not None:
+        cache[key] = result
+    return result
+
+
+def _slice_sparse(X, active_dims, input_dim):
+    """
+    Selects the columns `active_dims` of the sparse tensor X.
+    """
+    columns = X.indices[:, 1]
+    if isinstance(active_dims, slice):
+        if active_dims.step not in (None, 1):
+            raise NotImplementedError('Sparse inputs cannot be sliced with a step.')
+        start = 0 if active_dims.start is None else active_dims.start
+        stop = X.dense_shape[1] if active_dims.stop is None else active_dims.stop
+        X = tf.sparse_retain(X, tf.logical_and(columns >= start, columns < stop))
+        columns = X.indices[:, 1] - start
+    else:
+        # Position of each column among the active dimensions, -1 if inactive.
+        dims = tf.constant(active_dims, dtype=tf.int64)
+        positions = tf.range(1, input_dim + 1, dtype=tf.int64)
+        table = tf.scatter_nd(tf.expand_dims(dims, 1), positions, X.dense_shape[1:]) - 1
+        X = tf.sparse_retain(X, tf.gather(table, columns) >= 0)
+        columns = tf.gather(table, X.indices[:, 1])
+    indices = tf.stack([X.indices[:, 0], columns], 1)
+    dense_shape = tf.stack([X.dense_shape[0], tf.constant(input_dim, dtype=tf.int64)])
+    return tf.SparseTensor(indices, X.values, dense_shape)
+
+
+def _scale_sparse(X, scale):
+    """
+    Multiplies the columns of the sparse tensor X by a scalar or a vector.
+    """
+    if scale.shape.ndims:
+        scale = tf.gather(scale, X.indices[:, 1])
+    return tf.SparseTensor(X.indices, X.values * scale, X.dense_shape)
+
+
+def _sparse_gram(X, X2):
+    """
+    Returns X X2^T for a sparse tensor X and a dense or sparse tensor X2.
+    A sparse X2 is densified only on the columns holding its entries, and
+    the entries of X in the other columns are dropped.
+    """
+    if not isinstance(X2, tf.SparseTensor):
+        return tf.sparse_tensor_dense_matmul(X, X2, adjoint_b=True)
+    columns, index = tf.unique(X2.indices[:, 1])
+    num_columns = tf.size(columns, out_type=tf.int64)
+    X2 = tf.scatter_nd(tf.stack([tf.cast(index, tf.int64), X2.indices[:, 0]], 1), X2.values,
+                       tf.stack([num_columns, X2.dense_shape[0]]))
+    # Position of each column of X among the columns of X2, -1 if absent.
+    positions = tf.range(1, num_columns + 1, dtype=tf.int64)
+    table = tf.scatter_nd(tf.expand_dims(columns, 1), positions, X.dense_shape[1:]) - 1
+    index = tf.gather(table, X.indices[:, 1])
+    observed = index >= 0
+    indices = tf.boolean_mask(tf.stack([X.indices[:, 0], index], 1), observed)
+    X = tf.SparseTensor(indices, tf.boolean_mask(X.values, observed),
+                        tf.stack([X.dense_shape[0], num_columns]))
+    return tf.sparse_tensor_dense_matmul(X, X2)
+
+
+def _scaled_inputs(X, lengthscales):
+    """
+    Returns X / lengthscales and its squared row norms, cached per build scope.
+    """
+    cache = _distance_cache_for(X, lengthscales)
+    key = ('scaled', X, lengthscales)
+    if cache is not None and key in cache:
+        return cache[key]
+    Xl = X if lengthscales is None else X / lengthscales
+    result = Xl, tf.reduce_sum(tf.square(Xl), axis=1)
+    if cache is not None:
+        cache[key] = result
+    return result
+
+
+def _square_dist(X, X2, lengthscales):
+    """
+    Returns the squared distances between the rows of X / lengthscales and
+    X2 / lengthscales, cached per build scope. The lengthscales may be None.
+    """
+    cache = _distance_cache_for(X, X2, lengthscales)
+    key = ('square_dist', X, X2, lengthscales)
+    if cache is not None and key in cache:
+        return cache[key]
+
+    X, Xs = _scaled_inputs(X, lengthscales)
+    if X2 is None:
+        dist = -2 * tf.matmul(X, X, transpose_b=True)
+        dist += tf.reshape(Xs, (-1, 1)) + tf.reshape(Xs, (1, -1))
+    else:
+        X2, X2s = _scaled_inputs(X2, lengthscales)
+        dist = -2 * tf.matmul(X, X2, transpose_b=True)
+        dist += tf.reshape(Xs, (-1, 1)) + tf.reshape(X2s, (1, -1))
+
+    if cache is not None:
+        cache[key] = dist
+    return dist
+
+
 def make_deprecated_class(oldname, NewClass):
     """
     Returns a class that raises NotImplementedError on instantiation.
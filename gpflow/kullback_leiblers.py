@@ -18,6 +18,7 @@
 import tensorflow as tf
 
 from . import settings
+from . import misc
 from .decors import name_scope
 
 
@@ -49,7 +50,7 @@ def gauss_kl(q_mu, q_sqrt, K=None):
         alpha = q_mu
     else:
         white = False
-        Lp = tf.cholesky(K)
+        Lp = tf.cholesky(misc.upcast(K))
         alpha = tf.matrix_triangular_solve(Lp, q_mu, lower=True)
 
     if q_sqrt.get_shape().ndims == 2:
@@ -103,3 +104,160 @@ def gauss_kl(q_mu, q_sqrt, K=None):
 
     return 0.5 * twoKL
 
+
+@name_scope()
+def gauss_kl_kron(q_mu, q_sqrt, K=None):
+    """
+    Compute the KL divergence KL[q || p] as `gauss_kl` does, for Kronecker
+    structured covariances
+
+          q(x) = N(q_mu, (L_1 L_1^T) ⊗ (L_2 L_2^T) ⊗ ...)
+    and
+          p(x) = N(0, K_1 ⊗ K_2 ⊗ ...).
+
+    The cost is O(sum_d m_d^3 + M sum_d m_d) for M = prod_d m_d, instead of
+    O(M^3).
+
+    q_mu is a matrix (M x N), each column contains a mean.
+
+    q_sqrt is a list of 3D tensors (m_d x m_d x N), the lower triangular
+        factors L_d of the N independent distributions, or a matrix (M x N),
+        the square roots of the diagonals of their covariances.
+
+    K is a list of positive definite matrices (m_d x m_d), the factors of the
+    covariance of p. If K is None, compute the KL divergence to
+    p(x) = N(0, I) instead.
+    """
+    white = K is None
+    diag = not isinstance(q_sqrt, (list, tuple))
+    num_latent = tf.shape(q_mu)[1]
+    M = tf.cast(tf.shape(q_mu)[0], settings.float_type)
+    if not white:
+        Lps = [tf.cholesky(Kd) for Kd in K]
+
+    # Mahalanobis term: μqᵀ Σp⁻¹ μq
+    if white:
+        alpha = q_mu
+    else:
+        alpha = misc.kron_triangular_solve(Lps, q_mu, lower=True)
+    mahalanobis = tf.reduce_sum(tf.square(alpha))
+
+    # Constant term: - N x M
+    constant = - tf.cast(num_latent, settings.float_type) * M
+
+    if diag:
+        # Log-determinant of the covariance of q(x)
+        logdet_qcov = tf.reduce_sum(tf.log(tf.square(q_sqrt)))
+
+        # Trace term: tr(Σp⁻¹ Σq), with the diagonal of Σp⁻¹ the Kronecker
+        # product of the diagonals of the K_d⁻¹
+        if white:
+            trace = tf.reduce_sum(tf.square(q_sqrt))
+        else:
+            Kinv_diags = []
+            for Lp in Lps:
+                I = tf.eye(tf.shape(Lp)[0], dtype=settings.float_type)
+                Lpi = tf.matrix_triangular_solve(Lp, I, lower=True)
+                Kinv_diags.append(tf.reduce_sum(tf.square(Lpi), 0, keep_dims=True))  # 1 x m_d
+            Kinv_diag = tf.reshape(misc.kron(Kinv_diags), (-1, 1))
+            trace = tf.reduce_sum(Kinv_diag * tf.square(q_sqrt))
+    else:
+        Lqs = [tf.matrix_band_part(tf.transpose(Lq, (2, 0, 1)), -1, 0) for Lq in q_sqrt]  # N x m x m
+        sizes = [tf.cast(tf.shape(Lq)[1], settings.float_type) for Lq in Lqs]
+
+        # Log-determinant of the covariance of q(x); each factor is repeated
+        # M / m_d times in the Kronecker product.
+        logdet_qcov = tf.add_n([
+            M / size * tf.reduce_sum(tf.log(tf.square(tf.matrix_diag_part(Lq))))
+            for Lq, size in zip(Lqs, sizes)])
+
+        # Trace term: tr(Σp⁻¹ Σq), the product of the traces of the factors
+        if white:
+            traces = [tf.reduce_sum(tf.square(Lq), [1, 2]) for Lq in Lqs]
+        else:
+            traces = []
+            for Lp, Lq in zip(Lps, Lqs):
+                Lp_tiled = tf.tile(tf.expand_dims(Lp, 0), tf.stack([num_latent, 1, 1]))
+                LpiLq = tf.matrix_triangular_solve(Lp_tiled, Lq, lower=True)
+                traces.append(tf.reduce_sum(tf.square(LpiLq), [1, 2]))
+        trace = tf.reduce_sum(tf.reduce_prod(tf.stack(traces), 0))
+
+    twoKL = mahalanobis + constant - logdet_qcov + trace
+
+    # Log-determinant of the covariance of p(x):
+    if not white:
+        prior_logdet = tf.add_n([
+            M / tf.cast(tf.shape(Lp)[0], settings.float_type) *
+            tf.reduce_sum(tf.log(tf.square(tf.matrix_diag_part(Lp))))
+            for Lp in Lps])
+        twoKL += tf.cast(num_latent, settings.float_type) * prior_logdet
+
+    return 0.5 * twoKL
+
+
+@name_scope()
+def gauss_kl_diag_low_rank(q_mu, q_sqrt, d, V):
+    """
+    Compute the KL divergence KL[q || p] as `gauss_kl` does, for a prior
+    covariance that is a diagonal plus a low rank matrix,
+
+          p(x) = N(0, diag(d) + V V^T).
+
+    The prior covariance is never formed: the Mahalanobis and trace terms use
+    the Woodbury identity and its log-determinant the matrix determinant
+    lemma. The cost is O(M R^2 + N M^2 R) instead of O(M^3).
+
+    q_mu is a matrix (M x N), each column contains a mean.
+
+    q_sqrt can be a 3D tensor (M x M x N) or a matrix (M x N), as in
+        `gauss_kl`.
+
+    d is a positive vector (M), V a matrix (M x R).
+    """
+    num_latent = tf.shape(q_mu)[1]
+    d = tf.expand_dims(d, 1)  # M x 1
+    DiV = V / d  # M x R
+    R = tf.shape(V)[1]
+    capacitance = tf.eye(R, dtype=settings.float_type) + tf.matmul(V, DiV, transpose_a=True)
+    Lc = tf.cholesky(capacitance)  # R x R
+
+    if q_sqrt.get_shape().ndims == 2:
+        diag = True
+        NM = tf.size(q_sqrt)
+        Lq_diag = q_sqrt
+    elif q_sqrt.get_shape().ndims == 3:
+        diag = False
+        NM = tf.reduce_prod(tf.shape(q_sqrt)[1:])
+        Lq = tf.matrix_band_part(tf.transpose(q_sqrt, (2, 0, 1)), -1, 0)  # force lower triangle
+        Lq_diag = tf.matrix_diag_part(Lq)
+    else: # pragma: no cover
+        raise ValueError("Bad dimension for q_sqrt: {}".format(q_sqrt.get_shape().ndims))
+
+    # Mahalanobis term: μqᵀ Σp⁻¹ μq
+    LciVDimu = tf.matrix_triangular_solve(Lc, tf.matmul(DiV, q_mu, transpose_a=True), lower=True)
+    mahalanobis = tf.reduce_sum(tf.square(q_mu) / d) - tf.reduce_sum(tf.square(LciVDimu))
+
+    # Constant term: - N x M
+    constant = - tf.cast(NM, settings.float_type)
+
+    # Log-determinant of the covariance of q(x):
+    logdet_qcov = tf.reduce_sum(tf.log(tf.square(Lq_diag)))
+
+    # Trace term: tr(Σp⁻¹ Σq)
+    if diag:
+        LciVDi = tf.matrix_triangular_solve(Lc, tf.transpose(DiV), lower=True)  # R x M
+        Kinv_diag = 1. / d - tf.expand_dims(tf.reduce_sum(tf.square(LciVDi), 0), 1)  # M x 1
+        trace = tf.reduce_sum(Kinv_diag * tf.square(q_sqrt))
+    else:
+        M = tf.shape(Lq)[1]
+        Lq_stacked = tf.reshape(tf.transpose(Lq, (1, 0, 2)), tf.stack([M, -1]))  # M x NM
+        LciVDiLq = tf.matrix_triangular_solve(Lc, tf.matmul(DiV, Lq_stacked, transpose_a=True), lower=True)
+        trace = tf.reduce_sum(tf.square(Lq_stacked) / d) - tf.reduce_sum(tf.square(LciVDiLq))
+
+    twoKL = mahalanobis + constant - logdet_qcov + trace
+
+    # Log-determinant of the covariance of p(x):
+    prior_logdet = tf.reduce_sum(tf.log(d)) + tf.reduce_sum(tf.log(tf.square(tf.matrix_diag_part(Lc))))
+    twoKL += tf.cast(num_latent, settings.float_type) * prior_logdet
+
+    return 0.5 * twoKL
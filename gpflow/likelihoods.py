@@ -21,6 +21,7 @@ import numpy as np
 
 from . import settings
 from . import densities
+from . import misc
 from . import transforms
 
 from .decors import params_as_tensors
@@ -28,13 +29,37 @@ from .decors import params_as_tensors_for
 from .params import Parameter
 from .params import Parameterized
 from .params import ParamList
-from .quadrature import hermgauss
+from .quadrature import hermgauss_constants
+from .quadrature import genz_keister_constants
+from .quadrature import GENZ_KEISTER_NUM_POINTS
 
 
 class Likelihood(Parameterized):
     def __init__(self, name=None):
         super(Likelihood, self).__init__(name)
         self.num_gauss_hermite_points = 20
+        # When set, the default quadratures use nested rules of increasing
+        # order and refine only the data whose error estimate exceeds this
+        # tolerance, see `_adaptive_quadrature`.
+        self.quadrature_tolerance = None
+        # When set, the default variational expectations are Monte Carlo
+        # estimates from this many reparameterised samples, drawn as set by
+        # `monte_carlo_sampling`: 'iid', 'antithetic' or 'stratified'.
+        self.num_monte_carlo_points = None
+        self.monte_carlo_sampling = 'antithetic'
+        self.monte_carlo_control_variates = False
+
+    def logp(self, F, Y):
+        """
+        The log density log p(Y|F), elementwise.
+
+        F and Y need not have the same shape: the default quadratures pass
+        F as an N x H grid of latent values with the targets Y as N x 1, and
+        the Monte Carlo estimates pass F as S x N x D samples with Y as
+        1 x N x D. Implementations must broadcast Y against F, rather than
+        assume that it is tiled to the shape of F.
+        """
+        raise NotImplementedError
 
     def predict_mean_and_var(self, Fmu, Fvar):
         """
@@ -59,22 +84,12 @@ class Likelihood(Parameterized):
         Here, we implement a default Gauss-Hermite quadrature routine, but some
         likelihoods (e.g. Gaussian) will implement specific cases.
         """
-        gh_x, gh_w = hermgauss(self.num_gauss_hermite_points)
-        gh_w /= np.sqrt(np.pi)
-        gh_w = gh_w.reshape(-1, 1)
-        shape = tf.shape(Fmu)
-        Fmu, Fvar = [tf.reshape(e, (-1, 1)) for e in (Fmu, Fvar)]
-        X = gh_x[None, :] * tf.sqrt(2.0 * Fvar) + Fmu
+        def integrands(grid):
+            mean = grid.conditional_mean()
+            return mean, grid.conditional_variance() + tf.square(mean)
 
-        # here's the quadrature for the mean
-        E_y = tf.reshape(tf.matmul(self.conditional_mean(X), gh_w), shape)
-
-        # here's the quadrature for the variance
-        integrand = self.conditional_variance(X) \
-            + tf.square(self.conditional_mean(X))
-        V_y = tf.reshape(tf.matmul(integrand, gh_w), shape) - tf.square(E_y)
-
-        return E_y, V_y
+        E_y, E_y2 = self._quadrature(integrands, Fmu, Fvar)
+        return E_y, E_y2 - tf.square(E_y)
 
     def predict_density(self, Fmu, Fvar, Y):
         """
@@ -95,17 +110,8 @@ class Likelihood(Parameterized):
         Here, we implement a default Gauss-Hermite quadrature routine, but some
         likelihoods (Gaussian, Poisson) will implement specific cases.
         """
-        gh_x, gh_w = hermgauss(self.num_gauss_hermite_points)
-
-        gh_w = gh_w.reshape(-1, 1) / np.sqrt(np.pi)
-        shape = tf.shape(Fmu)
-        Fmu, Fvar, Y = [tf.reshape(e, (-1, 1)) for e in (Fmu, Fvar, Y)]
-        X = gh_x[None, :] * tf.sqrt(2.0 * Fvar) + Fmu
-
-        Y = tf.tile(Y, [1, self.num_gauss_hermite_points])  # broadcast Y to match X
-
-        logp = self.logp(X, Y)
-        return tf.reshape(tf.log(tf.matmul(tf.exp(logp), gh_w)), shape)
+        p, = self._quadrature(lambda grid, Y: (tf.exp(grid.logp(Y)),), Fmu, Fvar, Y)
+        return tf.log(p)
 
     def variational_expectations(self, Fmu, Fvar, Y):
         """
@@ -125,19 +131,148 @@ class Likelihood(Parameterized):
 
 
         Here, we implement a default Gauss-Hermite quadrature routine, but some
-        likelihoods (Gaussian, Poisson) will implement specific cases.
+        likelihoods (Gaussian, Poisson) will implement specific cases. If
+        `num_monte_carlo_points` is set, the quadrature is replaced by a Monte
+        Carlo estimate, see `_monte_carlo_variational_expectations`.
         """
+        if self.num_monte_carlo_points is not None:
+            return self._monte_carlo_variational_expectations(Fmu, Fvar, Y)
+        ve, = self._quadrature(lambda grid, Y: (grid.logp(Y),), Fmu, Fvar, Y)
+        return ve
 
-        gh_x, gh_w = hermgauss(self.num_gauss_hermite_points)
-        gh_x = gh_x.reshape(1, -1)
-        gh_w = gh_w.reshape(-1, 1) / np.sqrt(np.pi)
-        shape = tf.shape(Fmu)
-        Fmu, Fvar, Y = [tf.reshape(e, (-1, 1)) for e in (Fmu, Fvar, Y)]
-        X = gh_x * tf.sqrt(2.0 * Fvar) + Fmu
-        Y = tf.tile(Y, [1, self.num_gauss_hermite_points])  # broadcast Y to match X
+    def _monte_carlo_samples(self, Fmu, Fvar):
+        """
+        Draws `num_monte_carlo_points` samples of q(f) = N(Fmu, Fvar) with the
+        reparameterisation f = Fmu + sqrt(Fvar) eps.
+
+        :return: the samples and the standard normal draws eps, both of shape
+            S x shape(Fmu).
+        """
+        S = self.num_monte_carlo_points
+        eps = _standard_normal_samples(S, tf.shape(Fmu), self.monte_carlo_sampling)
+        F = tf.expand_dims(Fmu, 0) + tf.expand_dims(tf.sqrt(Fvar), 0) * eps
+        return F, eps
+
+    def _monte_carlo_variational_expectations(self, Fmu, Fvar, Y):
+        """
+        Monte Carlo estimate of the variational expectations. The targets are
+        broadcast against the samples. If `monte_carlo_control_variates` is
+        True, eps and eps^2 - 1, which have zero mean, are used as control
+        variates, with coefficients estimated for every datum from the same
+        samples. This removes the variance of the terms of log p(y|f) up to
+        second order in f, at the price of a bias of O(1/S).
+        """
+        F, eps = self._monte_carlo_samples(Fmu, Fvar)
+        logp = self.logp(F, tf.expand_dims(Y, 0))
+        if not self.monte_carlo_control_variates:
+            return tf.reduce_mean(logp, 0)
+
+        def centred(x):
+            return x - tf.reduce_mean(x, 0, keep_dims=True)
+
+        logp_c = centred(logp)
+        ve = tf.reduce_mean(logp, 0)
+        for h in (eps, tf.square(eps) - 1.):
+            h_c = centred(h)
+            beta = tf.reduce_sum(logp_c * h_c, 0) / tf.reduce_sum(tf.square(h_c), 0)
+            ve -= beta * tf.reduce_mean(h, 0)
+        return ve
+
+    def predict_mean_var_and_density(self, Fmu, Fvar, Y):
+        """
+        Computes `predict_mean_and_var` and `predict_density` together. The
+        default quadratures of both share one Gauss-Hermite grid, so the
+        likelihood is evaluated on it only once.
+        """
+        E_y, V_y = self.predict_mean_and_var(Fmu, Fvar)
+        return E_y, V_y, self.predict_density(Fmu, Fvar, Y)
 
-        logp = self.logp(X, Y)
-        return tf.reshape(tf.matmul(logp, gh_w), shape)
+    def _quadrature(self, integrands, Fmu, Fvar, *args):
+        """
+        Computes the expectations under q(f) = N(Fmu, Fvar) of the integrands.
+        `integrands(grid, *args)` returns a tuple of values on the grid. The
+        Gauss-Hermite rule of `num_gauss_hermite_points` points is used,
+        unless `quadrature_tolerance` is set.
+        """
+        if self.quadrature_tolerance is None:
+            grid = self._quadrature_grid(Fmu, Fvar)
+            return tuple(grid.expectation(v) for v in integrands(grid, *args))
+        return self._adaptive_quadrature(integrands, Fmu, Fvar, *args)
+
+    def _adaptive_quadrature(self, integrands, Fmu, Fvar, *args):
+        """
+        Adaptive version of `_quadrature` with the nested Genz-Keister rules
+        of 1, 3, 9, 19 and 35 points. Every level only adds points to the
+        previous one, and the difference of the two levels estimates the
+        error of the coarser one. The data whose error exceeds
+        `quadrature_tolerance` go on to the next level, which evaluates the
+        likelihood at the added points only. The last level, accepted for
+        all remaining data, is the largest with at most
+        `num_gauss_hermite_points` points.
+
+        Latent values whose variance is small for the likelihood are thus
+        integrated with 3 evaluations, and no datum costs more evaluations
+        than the Gauss-Hermite rule. The first two levels are evaluated for
+        all data, on grids shared like those of `_quadrature_grid`.
+        """
+        if not self.quadrature_tolerance > 0:
+            raise ValueError('The quadrature tolerance must be positive, got {}.'
+                             .format(self.quadrature_tolerance))
+        last = max(level for level, num_points in enumerate(GENZ_KEISTER_NUM_POINTS)
+                   if level <= 1 or num_points <= self.num_gauss_hermite_points)
+
+        def evaluate(level, Fmu, Fvar, *args):
+            return integrands(self._quadrature_grid(Fmu, Fvar, level=level), *args)
+
+        def estimate(values, level):
+            _, weights = genz_keister_constants(level)
+            weights = tf.reshape(weights, (-1, 1))
+            return [tf.reshape(tf.matmul(tf.concat(v, 1), weights), (-1,)) for v in zip(*values)]
+
+        def split(x, refine):
+            return tf.dynamic_partition(x, refine, 2)
+
+        shape = tf.shape(Fmu)
+        index = tf.range(tf.size(Fmu))
+        inputs = [tf.reshape(x, (-1,)) for x in (Fmu, Fvar) + args]
+        values = [evaluate(0, Fmu, Fvar, *args), evaluate(1, Fmu, Fvar, *args)]
+        previous = estimate(values[:1], 0)
+        indices, results = [], []
+        for level in range(1, last + 1):
+            if level > 1:
+                values.append(evaluate(level, *inputs))
+            current = estimate(values, level)
+            if level == last:
+                break
+            error = tf.reduce_max(tf.abs(tf.stack(current) - tf.stack(previous)), 0)
+            refine = tf.cast(error > self.quadrature_tolerance, tf.int32)
+            accepted, index = split(index, refine)
+            indices.append(accepted)
+            results.append([split(e, refine)[0] for e in current])
+            inputs = [split(x, refine)[1] for x in inputs]
+            values = [[split(v, refine)[1] for v in level_values] for level_values in values]
+            previous = [split(e, refine)[1] for e in current]
+        indices.append(index)
+        results.append(current)
+        return tuple(tf.reshape(tf.dynamic_stitch(indices, list(r)), shape) for r in zip(*results))
+
+    def _quadrature_grid(self, Fmu, Fvar, num_points=None, level=None):
+        """
+        Returns the Gauss-Hermite grid of q(f) = N(Fmu, Fvar), or the grid of
+        the points added by `level` of the Genz-Keister rules, shared by the
+        default quadratures of this likelihood for the same Fmu and Fvar
+        tensors within a graph. Grids inside control flow contexts are not
+        shared.
+        """
+        if level is None:
+            num_points = num_points or self.num_gauss_hermite_points
+        if not (isinstance(Fmu, tf.Tensor) and isinstance(Fvar, tf.Tensor)) or misc.in_control_flow():
+            return _QuadratureGrid(self, Fmu, Fvar, num_points, level)
+        grids = misc.get_graph_cache('quadrature_grids')
+        key = (self, Fmu, Fvar, num_points, level)
+        if key not in grids:
+            grids[key] = _QuadratureGrid(self, Fmu, Fvar, num_points, level)
+        return grids[key]
 
     def _check_targets(self, Y_np):  # pylint: disable=R0201
         """
@@ -154,6 +289,87 @@ class Likelihood(Parameterized):
             raise ValueError('use {}, even for discrete variables'.format(settings.float_type))
 
 
+def _standard_normal_samples(num_samples, shape, sampling):
+    """
+    Draws num_samples x shape standard normal samples.
+
+    :param sampling: 'iid' for independent samples, 'antithetic' for pairs of
+        samples eps and -eps, or 'stratified' for Latin hypercube samples,
+        which take one sample from each of the num_samples equiprobable
+        strata of every element, with the strata randomly permuted.
+    """
+    sample_shape = tf.concat([[num_samples], shape], 0)
+    if sampling == 'iid':
+        return tf.random_normal(sample_shape, dtype=settings.float_type)
+    if sampling == 'antithetic':
+        half_shape = tf.concat([[(num_samples + 1) // 2], shape], 0)
+        eps = tf.random_normal(half_shape, dtype=settings.float_type)
+        return tf.concat([eps, -eps], 0)[:num_samples]
+    if sampling == 'stratified':
+        # random permutations of the strata along the last axis, moved to the front
+        u = tf.random_uniform(tf.concat([shape, [num_samples]], 0), dtype=settings.float_type)
+        strata = tf.cast(tf.nn.top_k(u, k=num_samples).indices, settings.float_type)
+        rank = tf.size(shape)
+        strata = tf.transpose(strata, tf.concat([[rank], tf.range(rank)], 0))
+        u = (strata + tf.random_uniform(sample_shape, dtype=settings.float_type)) / num_samples
+        u = tf.clip_by_value(u, 1e-12, 1. - 1e-12)
+        standard_normal = tf.distributions.Normal(tf.zeros([], dtype=settings.float_type),
+                                                  tf.ones([], dtype=settings.float_type))
+        return standard_normal.quantile(u)
+    raise ValueError('Unknown sampling scheme {}.'.format(sampling))
+
+
+class _QuadratureGrid(object):
+    """
+    The grid X = Fmu + sqrt(2 Fvar) x_h, N x H, for expectations under
+    q(f) = N(Fmu, Fvar), of the Gauss-Hermite points x_h, or of the points
+    added by a level of the Genz-Keister rules. The evaluations of the
+    likelihood on the grid are built once and reused by all expectations
+    taken over it. The targets Y, N x 1, are broadcast against the grid
+    rather than tiled.
+    """
+
+    def __init__(self, likelihood, Fmu, Fvar, num_points=None, level=None):
+        if level is None:
+            points, weights = hermgauss_constants(num_points)
+            self.weights = tf.reshape(weights / np.sqrt(np.pi), (-1, 1))
+        else:
+            # The weights of a Genz-Keister level span the points of several
+            # grids and are applied by `_adaptive_quadrature`.
+            points, _ = genz_keister_constants(level)
+            self.weights = None
+        self.likelihood = likelihood
+        self.shape = tf.shape(Fmu)
+        Fmu, Fvar = [tf.reshape(e, (-1, 1)) for e in (Fmu, Fvar)]
+        self.X = points[None, :] * tf.sqrt(2.0 * Fvar) + Fmu
+        self._evaluations = {}
+
+    def _evaluate(self, func_name, *args):
+        func = getattr(self.likelihood, func_name)
+        if not all(isinstance(a, tf.Tensor) for a in args):
+            return func(self.X, *[tf.reshape(a, (-1, 1)) for a in args])
+        key = (func_name,) + args
+        if key not in self._evaluations:
+            self._evaluations[key] = func(self.X, *[tf.reshape(a, (-1, 1)) for a in args])
+        return self._evaluations[key]
+
+    def conditional_mean(self):
+        return self._evaluate('conditional_mean')
+
+    def conditional_variance(self):
+        return self._evaluate('conditional_variance')
+
+    def logp(self, Y):
+        return self._evaluate('logp', Y)
+
+    def expectation(self, values):
+        """
+        :param values: integrand evaluated on the grid, N x H.
+        :return: the expectations in the shape of Fmu.
+        """
+        return tf.reshape(tf.matmul(values, self.weights), self.shape)
+
+
 class Gaussian(Likelihood):
     def __init__(self, var=1.0):
         super().__init__()
@@ -255,6 +471,12 @@ class Exponential(Likelihood):
 
 class StudentT(Likelihood):
     def __init__(self, deg_free=3.0):
+        """
+        :param deg_free: degrees of freedom, larger than 2 for the variance
+            of the noise, scale**2 * deg_free / (deg_free - 2), to be finite.
+        """
+        if not deg_free > 2.:
+            raise ValueError('The degrees of freedom must be larger than 2, got {}.'.format(deg_free))
         Likelihood.__init__(self)
         self.deg_free = deg_free
         self.scale = Parameter(1.0, transform=transforms.positive)
@@ -269,17 +491,49 @@ class StudentT(Likelihood):
 
     @params_as_tensors
     def conditional_variance(self, F):
-        return F * 0.0 + (self.deg_free / (self.deg_free - 2.0))
+        return F * 0.0 + tf.square(self.scale) * (self.deg_free / (self.deg_free - 2.0))
+
+    @params_as_tensors
+    def predict_mean_and_var(self, Fmu, Fvar):
+        return tf.identity(Fmu), Fvar + tf.square(self.scale) * (self.deg_free / (self.deg_free - 2.0))
 
 
 def probit(x):
     return 0.5 * (1.0 + tf.erf(x / np.sqrt(2.0))) * (1 - 2e-3) + 1e-3
 
 
+def logistic(x):
+    return tf.sigmoid(x)
+
+
 class Bernoulli(Likelihood):
-    def __init__(self, invlink=probit):
+    def __init__(self, invlink=probit, logistic_bound=False):
+        """
+        :param invlink: inverse link function, `probit` has closed form
+            predictions.
+        :param logistic_bound: if True, the variational expectations are
+            replaced by the lower bound of
+
+            ::
+
+              @article{jaakkola2000bayesian,
+                title={Bayesian parameter estimation via variational methods},
+                author={Jaakkola, Tommi S and Jordan, Michael I},
+                journal={Statistics and Computing},
+                volume={10},
+                number={1},
+                pages={25--37},
+                year={2000}
+              }
+
+            with the optimal variational parameter xi^2 = Fmu^2 + Fvar. The
+            bound is exact for Fvar = 0. Requires the `logistic` inverse link.
+        """
+        if logistic_bound and invlink is not logistic:
+            raise ValueError('The logistic bound requires the logistic inverse link.')
         Likelihood.__init__(self)
         self.invlink = invlink
+        self.logistic_bound = logistic_bound
 
     def _check_targets(self, Y_np):
         super(Bernoulli, self)._check_targets(Y_np)
@@ -302,6 +556,14 @@ class Bernoulli(Likelihood):
         p = self.predict_mean_and_var(Fmu, Fvar)[0]
         return densities.bernoulli(p, Y)
 
+    def variational_expectations(self, Fmu, Fvar, Y):
+        if self.logistic_bound:
+            # E[log sigmoid(s f)] >= log sigmoid(xi) + (s Fmu - xi) / 2, s = +-1
+            sign = 2. * tf.cast(tf.equal(Y, 1), settings.float_type) - 1.
+            xi = tf.sqrt(tf.square(Fmu) + Fvar)
+            return -tf.nn.softplus(-xi) + 0.5 * (sign * Fmu - xi)
+        return Likelihood.variational_expectations(self, Fmu, Fvar, Y)
+
     def conditional_mean(self, F):
         return self.invlink(F)
 
@@ -403,12 +665,14 @@ class RobustMax(object):
     y_i = (1-eps)  i == argmax(f)
           eps/(k-1)  otherwise.
 
-
+    With many classes, the N x k x H tensors of the quadrature in
+    `prob_is_largest` can be built in chunks of `class_chunk_size` classes.
     """
 
-    def __init__(self, num_classes, epsilon=1e-3):
+    def __init__(self, num_classes, epsilon=1e-3, class_chunk_size=None):
         self.epsilon = epsilon
         self.num_classes = num_classes
+        self.class_chunk_size = class_chunk_size
         self._eps_K1 = self.epsilon / (self.num_classes - 1.)
 
     def __call__(self, F):
@@ -426,6 +690,23 @@ class RobustMax(object):
         X = tf.reshape(mu_selected, (-1, 1)) + gh_x * tf.reshape(
             tf.sqrt(tf.clip_by_value(2. * var_selected, 1e-10, np.inf)), (-1, 1))
 
+        if self.class_chunk_size is None:
+            cdfs = self._prod_cdfs(X, mu, var, oh_on)
+        else:
+            def body(start, cdfs):
+                end = start + self.class_chunk_size
+                chunk = self._prod_cdfs(X, mu[:, start:end], var[:, start:end], oh_on[:, start:end])
+                return end, cdfs * chunk
+
+            _, cdfs = tf.while_loop(lambda start, _: start < self.num_classes, body,
+                                    [tf.constant(0), tf.ones_like(X)],
+                                    parallel_iterations=1, swap_memory=True)
+
+        # take the sum over the GH grid.
+        return tf.matmul(cdfs, tf.reshape(gh_w / np.sqrt(np.pi), (-1, 1)))
+
+    @staticmethod
+    def _prod_cdfs(X, mu, var, oh_on):
         # compute the CDF of the Gaussian between the latent functions and the grid (including the selected function)
         dist = (tf.expand_dims(X, 1) - tf.expand_dims(mu, 2)) / tf.expand_dims(
             tf.sqrt(tf.clip_by_value(var, 1e-10, np.inf)), 2)
@@ -434,11 +715,10 @@ class RobustMax(object):
         cdfs = cdfs * (1 - 2e-4) + 1e-4
 
         # blank out all the distances on the selected latent function
-        oh_off = tf.cast(tf.one_hot(tf.reshape(Y, (-1,)), self.num_classes, 0., 1.), settings.float_type)
-        cdfs = cdfs * tf.expand_dims(oh_off, 2) + tf.expand_dims(oh_on, 2)
+        cdfs = cdfs * tf.expand_dims(1. - oh_on, 2) + tf.expand_dims(oh_on, 2)
 
-        # take the product over the latent functions, and the sum over the GH grid.
-        return tf.matmul(tf.reduce_prod(cdfs, reduction_indices=[1]), tf.reshape(gh_w / np.sqrt(np.pi), (-1, 1)))
+        # take the product over the latent functions
+        return tf.reduce_prod(cdfs, reduction_indices=[1])
 
 
 class MultiClass(Likelihood):
@@ -475,7 +755,7 @@ class MultiClass(Likelihood):
 
     def variational_expectations(self, Fmu, Fvar, Y):
         if isinstance(self.invlink, RobustMax):
-            gh_x, gh_w = hermgauss(self.num_gauss_hermite_points)
+            gh_x, gh_w = hermgauss_constants(self.num_gauss_hermite_points)
             p = self.invlink.prob_is_largest(Y, Fmu, Fvar, gh_x, gh_w)
             return p * np.log(1 - self.invlink.epsilon) + (1. - p) * np.log(self.invlink._eps_K1)
         else:
@@ -497,7 +777,7 @@ class MultiClass(Likelihood):
 
     def _predict_non_logged_density(self, Fmu, Fvar, Y):
         if isinstance(self.invlink, RobustMax):
-            gh_x, gh_w = hermgauss(self.num_gauss_hermite_points)
+            gh_x, gh_w = hermgauss_constants(self.num_gauss_hermite_points)
             p = self.invlink.prob_is_largest(Y, Fmu, Fvar, gh_x, gh_w)
             return p * (1 - self.invlink.epsilon) + (1. - p) * (self.invlink._eps_K1)
         else:
@@ -511,22 +791,117 @@ class MultiClass(Likelihood):
         return p - tf.square(p)
 
 
+class SoftMax(Likelihood):
+    """
+    Multi-way classification with the softmax inverse link,
+
+        p(y = c | f) = exp(f_c) / sum_k exp(f_k),
+
+    with expectations over q(f) estimated from `num_monte_carlo_points`
+    samples drawn with the reparameterisation f = Fmu + sqrt(Fvar) eps.
+
+    If `num_sampled_classes` is given, the normaliser of the variational
+    expectations is estimated from that many classes drawn uniformly with
+    replacement, shared by the data of the batch, so that only their latent
+    functions are sampled. The estimate of the normaliser is unbiased, the
+    estimate of its logarithm is not. The marginals Fmu and Fvar of all
+    classes are still computed by the model, e.g. SVGP evaluates all C
+    latent GPs, only the sampling and the normaliser scale with the number
+    of sampled classes.
+    """
+
+    def __init__(self, num_classes, num_monte_carlo_points=100, num_sampled_classes=None):
+        Likelihood.__init__(self)
+        self.num_classes = num_classes
+        self.num_monte_carlo_points = num_monte_carlo_points
+        self.num_sampled_classes = num_sampled_classes
+
+    def _check_targets(self, Y_np):
+        super(SoftMax, self)._check_targets(Y_np)
+        if not set(Y_np.flatten()).issubset(set(np.arange(self.num_classes))):
+            raise ValueError('softmax likelihood expects inputs to be in {0., 1., 2.,...,k-1}')
+        if Y_np.shape[1] != 1:
+            raise ValueError('only one dimension currently supported for softmax likelihood')
+
+    def logp(self, F, Y):
+        labels = tf.cast(tf.reshape(Y, (-1,)), tf.int64)
+        logp = -tf.nn.sparse_softmax_cross_entropy_with_logits(labels=labels, logits=F)
+        return tf.reshape(logp, (-1, 1))
+
+    def conditional_mean(self, F):
+        return tf.nn.softmax(F)
+
+    def conditional_variance(self, F):
+        p = self.conditional_mean(F)
+        return p - tf.square(p)
+
+    def _sample(self, Fmu, Fvar):
+        # S x N x K samples of q(f)
+        return self._monte_carlo_samples(Fmu, Fvar)[0]
+
+    def variational_expectations(self, Fmu, Fvar, Y):
+        Fmu, Fvar = tf.convert_to_tensor(Fmu), tf.convert_to_tensor(Fvar)
+        if self.num_sampled_classes is None:
+            F = tf.reshape(self._sample(Fmu, Fvar), (-1, self.num_classes))
+            Y = tf.tile(tf.reshape(Y, (1, -1)), [self.num_monte_carlo_points, 1])
+            logp = tf.reshape(self.logp(F, Y), (self.num_monte_carlo_points, -1))
+            return tf.reshape(tf.reduce_mean(logp, 0), (-1, 1))
+
+        # latent function of the observed class
+        Y = tf.cast(tf.reshape(Y, (-1,)), tf.int32)
+        index = tf.range(tf.shape(Fmu)[0]) * self.num_classes + Y
+        Fmu_y, Fvar_y = [tf.gather(tf.reshape(F, (-1,)), index)[:, None] for F in (Fmu, Fvar)]
+        F_y = self._sample(Fmu_y, Fvar_y)[:, :, 0]  # S x N
+
+        # latent functions of the sampled classes, N x K
+        classes = tf.random_uniform([self.num_sampled_classes], maxval=self.num_classes, dtype=tf.int32)
+        Fmu_k, Fvar_k = [tf.transpose(tf.gather(tf.transpose(F), classes)) for F in (Fmu, Fvar)]
+        F_k = self._sample(Fmu_k, Fvar_k)  # S x N x K
+        # the observed class is part of the normaliser already
+        other = tf.cast(tf.not_equal(classes[None, :], Y[:, None]), settings.float_type)
+        scale = self.num_classes / self.num_sampled_classes
+
+        # log sum_k exp(F_k) with the normaliser estimated from the sampled classes
+        F_max = tf.maximum(F_y, tf.reduce_max(F_k, 2))
+        normaliser = tf.exp(F_y - F_max) + \
+            scale * tf.reduce_sum(other[None, :, :] * tf.exp(F_k - F_max[:, :, None]), 2)
+        logp = F_y - F_max - tf.log(normaliser)
+        return tf.reshape(tf.reduce_mean(logp, 0), (-1, 1))
+
+    def predict_mean_and_var(self, Fmu, Fvar):
+        p = tf.reduce_mean(tf.nn.softmax(self._sample(Fmu, Fvar)), 0)
+        return p, p - tf.square(p)
+
+    def predict_density(self, Fmu, Fvar, Y):
+        F = tf.reshape(self._sample(Fmu, Fvar), (-1, self.num_classes))
+        Y = tf.tile(tf.reshape(Y, (1, -1)), [self.num_monte_carlo_points, 1])
+        logp = tf.reshape(self.logp(F, Y), (self.num_monte_carlo_points, -1))
+        log_num_samples = np.log(self.num_monte_carlo_points)
+        return tf.reshape(tf.reduce_logsumexp(logp, 0) - log_num_samples, (-1, 1))
+
+
 class SwitchedLikelihood(Likelihood):
-    def __init__(self, likelihood_list):
+    def __init__(self, likelihood_list, labels_sorted=False):
         """
         In this likelihood, we assume at extra column of Y, which contains
         integers that specify a likelihood from the list of likelihoods.
+
+        If `labels_sorted` is True, the rows of Y must be sorted by this
+        column, and the data are split into contiguous slices.
         """
         Likelihood.__init__(self)
         for l in likelihood_list:
             assert isinstance(l, Likelihood)
         self.likelihood_list = ParamList(likelihood_list)
         self.num_likelihoods = len(self.likelihood_list)
+        self.labels_sorted = labels_sorted
 
     def _check_targets(self, Y_np):
         Likelihood._check_targets(self, Y_np)
         if not set(Y_np[:, -1]).issubset(set(np.arange(self.num_likelihoods))):
             raise ValueError('switched likelihood expects final column values in {0,1,...,k-1}')
+        if self.labels_sorted and np.any(np.diff(Y_np[:, -1]) < 0):
+            raise ValueError('switched likelihood expects final column values to be sorted')
 
     def _partition_and_stitch(self, args, func_name):
         """
@@ -534,18 +909,16 @@ class SwitchedLikelihood(Likelihood):
 
         args[-1] is the 'Y' argument, which contains the indexes to self.likelihoods.
 
-        This function splits up the args using dynamic_partition, calls the
-        relevant function on the likelihoods, and re-combines the result.
+        This function splits up the args by the indexes, calls the relevant
+        function on the likelihoods, and re-combines the result. The partition
+        of a Y tensor is computed once and reused by all functions called
+        with it.
         """
         # get the index from Y
-        Y = args[-1]
-        ind = tf.gather(tf.transpose(Y), tf.shape(Y)[1]-1)  # ind = Y[:,-1]
-        ind = tf.cast(ind, tf.int32)
-        Y = tf.transpose(tf.gather(tf.transpose(Y), tf.range(0, tf.shape(Y)[1]-1)))  # Y = Y[:,:-1]
-        args[-1] = Y
+        args[-1], partition = misc.split_label_column(args[-1], self.num_likelihoods, self.labels_sorted)
 
         # split up the arguments into chunks corresponding to the relevant likelihoods
-        args = zip(*[tf.dynamic_partition(X, ind, self.num_likelihoods) for X in args])
+        args = zip(*[partition.partition(X) for X in args])
 
         # apply the likelihood-function to each section of the data
 
@@ -554,10 +927,7 @@ class SwitchedLikelihood(Likelihood):
         results = [f(*args_i) for f, args_i in zip(funcs, args)]
 
         # stitch the results back together
-        partitions = tf.dynamic_partition(tf.range(0, tf.size(ind)), ind, self.num_likelihoods)
-        results = tf.dynamic_stitch(partitions, results)
-
-        return results
+        return partition.stitch(results)
 
     def logp(self, F, Y):
         return self._partition_and_stitch([F, Y], 'logp')
@@ -639,6 +1009,35 @@ class Ordinal(Likelihood):
         return probit(scaled_bins_left - tf.reshape(F, (-1, 1)) / self.sigma)\
             - probit(scaled_bins_right - tf.reshape(F, (-1, 1)) / self.sigma)
 
+    @params_as_tensors
+    def _make_expected_phi(self, Fmu, Fvar):
+        """
+        The expectation of `_make_phi` under q(f) = N(Fmu, Fvar), which is in
+        closed form since
+
+            E[phi((a - f) / sigma)] = phi((a - Fmu) / sqrt(sigma^2 + Fvar))
+        """
+        bin_edges = np.asarray(self.bin_edges, dtype=settings.float_type)
+        bins_left = tf.concat([bin_edges, np.array([np.inf])], 0)
+        bins_right = tf.concat([np.array([-np.inf]), bin_edges], 0)
+        Fmu = tf.reshape(Fmu, (-1, 1))
+        scale = tf.sqrt(tf.square(self.sigma) + tf.reshape(Fvar, (-1, 1)))
+        return probit((bins_left - Fmu) / scale) - probit((bins_right - Fmu) / scale)
+
+    def predict_density(self, Fmu, Fvar, Y):
+        phi = self._make_expected_phi(Fmu, Fvar)
+        Y = tf.cast(tf.reshape(Y, (-1,)), tf.int64)
+        p = tf.reduce_sum(phi * tf.one_hot(Y, self.num_bins, dtype=settings.float_type), 1)
+        return tf.reshape(tf.log(p + 1e-6), tf.shape(Fmu))
+
+    def predict_mean_and_var(self, Fmu, Fvar):
+        phi = self._make_expected_phi(Fmu, Fvar)
+        Ys = np.arange(self.num_bins, dtype=settings.float_type)
+        E_y = tf.reduce_sum(phi * Ys, 1)
+        E_y2 = tf.reduce_sum(phi * np.square(Ys), 1)
+        shape = tf.shape(Fmu)
+        return tf.reshape(E_y, shape), tf.reshape(E_y2 - tf.square(E_y), shape)
+
     def conditional_mean(self, F):
         phi = self._make_phi(F)
         Ys = tf.reshape(np.arange(self.num_bins, dtype=np.float64), (-1, 1))
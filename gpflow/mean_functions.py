@@ -16,11 +16,13 @@
 import tensorflow as tf
 import numpy as np
 
+from . import misc
 from . import settings
 from .params import Parameter
 from .params import Parameterized
 from .params import ParamList
 from .decors import params_as_tensors
+from .misc import split_label_column
 
 
 class MeanFunction(Parameterized):
@@ -46,7 +48,7 @@ class MeanFunction(Parameterized):
 
 class Zero(MeanFunction):
     def __call__(self, X):
-        return tf.zeros(tf.stack([tf.shape(X)[0], 1]), dtype=settings.float_type)
+        return tf.zeros(tf.stack([misc.num_rows(X), 1]), dtype=settings.float_type)
 
 
 class Linear(MeanFunction):
@@ -83,7 +85,7 @@ class Constant(MeanFunction):
 
     @params_as_tensors
     def __call__(self, X):
-        shape = tf.stack([tf.shape(X)[0], 1])
+        shape = tf.stack([misc.num_rows(X), 1])
         return tf.tile(tf.reshape(self.c, (1, -1)), shape)
 
 
@@ -91,28 +93,28 @@ class SwitchedMeanFunction(MeanFunction):
     """
     This class enables to use different (independent) mean_functions respective
     to the data 'label'.
-    We assume the 'label' is stored in the extra column of X.
+    We assume the 'label' is stored in the extra column of X. If
+    `labels_sorted` is True, the rows of X must be sorted by the label, and
+    the data are split into contiguous slices.
     """
-    def __init__(self, meanfunction_list):
+    def __init__(self, meanfunction_list, labels_sorted=False):
         MeanFunction.__init__(self)
         for m in meanfunction_list:
             assert isinstance(m, MeanFunction)
         self.meanfunction_list = ParamList(meanfunction_list)
         self.num_meanfunctions = len(self.meanfunction_list)
+        self.labels_sorted = labels_sorted
 
     @params_as_tensors
     def __call__(self, X):
-        ind = tf.gather(tf.transpose(X), tf.shape(X)[1]-1)  # ind = X[:,-1]
-        ind = tf.cast(ind, tf.int32)
-        X = tf.transpose(tf.gather(tf.transpose(X), tf.range(0, tf.shape(X)[1]-1)))  # X = X[:,:-1]
+        X, partition = split_label_column(X, self.num_meanfunctions, self.labels_sorted)
 
-        # split up X into chunks corresponding to the relevant likelihoods
-        x_list = tf.dynamic_partition(X, ind, self.num_meanfunctions)
-        # apply the likelihood-function to each section of the data
+        # split up X into chunks corresponding to the relevant mean functions
+        x_list = partition.partition(X)
+        # apply the mean function to each section of the data
         results = [m(x) for x, m in zip(x_list, self.meanfunction_list)]
         # stitch the results back together
-        partitions = tf.dynamic_partition(tf.range(0, tf.size(ind)), ind, self.num_meanfunctions)
-        return tf.dynamic_stitch(partitions, results)
+        return partition.stitch(results)
 
 
 class Additive(MeanFunction):
@@ -13,8 +13,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import contextlib
+from functools import reduce
+
 import tensorflow as tf
 import numpy as np
+import scipy.sparse
 
 from . import settings
 
@@ -49,6 +53,10 @@ def is_tensor(value):
     return isinstance(value, (tf.Tensor, tf.Variable))
 
 
+def is_sparse(value):
+    return scipy.sparse.issparse(value) or isinstance(value, tf.SparseTensorValue)
+
+
 def is_number(value):
     return (not isinstance(value, str)) and np.isscalar(value)
 
@@ -96,6 +104,25 @@ def remove_from_trainables(variable, graph=None):
     trainables.remove(variable)
 
 
+def upcast(tensor):
+    """
+    Casts a tensor, e.g. a kernel matrix computed in
+    `settings.kernel_float_type`, to `settings.float_type`.
+    """
+    if tensor.dtype.base_dtype == tf.as_dtype(settings.float_type):
+        return tensor
+    return tf.cast(tensor, settings.float_type)
+
+
+def num_rows(tensor):
+    """
+    Returns the number of rows of a dense tensor or a `tf.SparseTensor`.
+    """
+    if isinstance(tensor, tf.SparseTensor):
+        return tf.cast(tensor.dense_shape[0], tf.int32)
+    return tf.shape(tensor)[0]
+
+
 def normalize_num_type(num_type):
     """
     Work out what a sensible type for the array is. if the default type
@@ -128,6 +155,52 @@ def get_attribute(obj, name, allow_fail=False, default=None):
         raise error
 
 
+def get_graph_cache(name, graph=None):
+    """
+    Returns the cache dictionary `name` of the graph, default graph when
+    `graph` is None. The caches are stored on the graph itself, so that the
+    cached tensors, which reference their graph, do not keep it alive.
+    """
+    graph = _get_graph(graph)
+    caches = graph.__dict__.setdefault('_gpflow_caches', {})
+    return caches.setdefault(name, {})
+
+
+@contextlib.contextmanager
+def build_cache_scope():
+    """
+    Shares the caches returned by `get_build_cache` between the tensors built
+    within the context, e.g. the objective of a model or an autoflow method.
+    Nested scopes share the cache of the outermost one, which is discarded
+    on its exit.
+    """
+    _build_caches.append(_build_caches[-1] if _build_caches else {})
+    try:
+        yield
+    finally:
+        _build_caches.pop()
+
+
+def get_build_cache(name):
+    """
+    Returns the cache dictionary `name` of the enclosing `build_cache_scope`,
+    or None outside of any scope.
+    """
+    if not _build_caches:
+        return None
+    return _build_caches[-1].setdefault(name, {})
+
+
+def in_control_flow(graph=None):
+    """
+    Checks whether ops of the graph are currently created inside a control
+    flow context, e.g. the body of a while loop. Tensors created there
+    cannot be used outside of the context and must not be cached.
+    """
+    graph = _get_graph(graph)
+    return graph._get_control_flow_context() is not None  # pylint: disable=W0212
+
+
 def vec_to_tri(vectors, N):
     """
     Takes a D x M tensor `vectors' and maps it to a D x matrix_size X matrix_sizetensor
@@ -153,6 +226,295 @@ def vec_to_tri(vectors, N):
     return tf.map_fn(vec_to_tri_vector, vectors)
 
 
+class LabelPartition(object):
+    """
+    Partition of the rows of a batch by integer labels, used to apply
+    different functions to different groups of data and to stitch the results
+    back together. The partition indices are computed once and shared by all
+    tensors partitioned with it. If the labels are known to be sorted, the
+    groups are contiguous slices and no indices are needed at all. The order
+    of sorted labels is asserted when the partition runs, since slices of
+    unsorted labels would silently mix the groups.
+    """
+
+    def __init__(self, labels, num_partitions, labels_sorted=False):
+        self.labels = tf.cast(labels, tf.int32)
+        self.num_partitions = num_partitions
+        self.labels_sorted = labels_sorted
+        if labels_sorted:
+            check = tf.assert_non_negative(self.labels[1:] - self.labels[:-1],
+                                           message='The labels are not sorted.')
+            with tf.control_dependencies([check]):
+                ones = tf.ones_like(self.labels)
+                self.sizes = tf.unsorted_segment_sum(ones, self.labels, num_partitions)
+        else:
+            rows = tf.range(tf.size(self.labels))
+            self.indices = tf.dynamic_partition(rows, self.labels, num_partitions)
+
+    def partition(self, X):
+        if self.labels_sorted:
+            return tf.split(X, self.sizes, num=self.num_partitions)
+        return [tf.gather(X, indices) for indices in self.indices]
+
+    def stitch(self, values):
+        if self.labels_sorted:
+            return tf.concat(values, 0)
+        return tf.dynamic_stitch(self.indices, values)
+
+
+def split_label_column(X, num_partitions, labels_sorted=False):
+    """
+    Splits off the last column of X, which holds integer labels.
+    The result is cached for every X tensor within a graph, so that
+    functions called repeatedly on the same batch partition it only once.
+    Partitions inside control flow contexts are not cached. The partition
+    is not shared between different tensors holding the same labels, e.g.
+    the X and Y of a model with a switched mean function and likelihood.
+
+    :return: X[:, :-1] and the `LabelPartition` of X[:, -1].
+    """
+    cache = None
+    if isinstance(X, tf.Tensor) and not in_control_flow(X.graph):
+        cache = get_graph_cache('label_partitions', X.graph)
+        key = (X, num_partitions, labels_sorted)
+        if key in cache:
+            return cache[key]
+    labels = tf.gather(tf.transpose(X), tf.shape(X)[1] - 1)  # X[:, -1]
+    X_rest = tf.transpose(tf.gather(tf.transpose(X), tf.range(0, tf.shape(X)[1] - 1)))  # X[:, :-1]
+    result = X_rest, LabelPartition(labels, num_partitions, labels_sorted)
+    if cache is not None:
+        cache[key] = result
+    return result
+
+
+def kron(factors):
+    """
+    Dense Kronecker product A_1 ⊗ A_2 ⊗ ... of a list of matrices.
+    """
+    def kron2(A, B):
+        shape = tf.shape(A) * tf.shape(B)
+        return tf.reshape(A[:, None, :, None] * B[None, :, None, :], shape)
+    return reduce(kron2, factors)
+
+
+def khatri_rao(factors):
+    """
+    Column-wise Kronecker product of a list of matrices with the same number
+    of columns N, i.e. column n of the result is the Kronecker product of the
+    n-th columns of the factors.
+    """
+    def khatri_rao2(A, B):
+        return tf.reshape(A[:, None, :] * B[None, :, :], tf.stack([-1, tf.shape(A)[1]]))
+    return reduce(khatri_rao2, factors)
+
+
+def kron_matmul(factors, B):
+    """
+    Computes (A_1 ⊗ A_2 ⊗ ...) B without forming the Kronecker product, in
+    O(sum_d m_d) operations per element of B. The factors may have a leading
+    batch dimension shared with B.
+
+    :param factors: list of matrices A_d, size [K x] m_d x n_d.
+    :param B: matrix, size [K x] (prod_d n_d) x N.
+    """
+    ops = [lambda X, A=A: tf.matmul(A, X) for A in factors]
+    return _kron_apply(ops, [tf.shape(A)[-1] for A in factors], B)
+
+
+def kron_triangular_solve(factors, B, lower=True, adjoint=False):
+    """
+    Solves (L_1 ⊗ L_2 ⊗ ...) X = B for triangular factors L_d, without
+    forming the Kronecker product. See `kron_matmul`.
+    """
+    ops = [lambda X, L=L: tf.matrix_triangular_solve(L, X, lower=lower, adjoint=adjoint)
+           for L in factors]
+    return _kron_apply(ops, [tf.shape(L)[-1] for L in factors], B)
+
+
+def _kron_apply(ops, sizes, B):
+    # Each op acts on the leading Kronecker index; the result is rotated so
+    # that the next index leads, and after all ops the rows are in order again.
+    batch_shape = tf.shape(B)[:-2]
+    N = tf.shape(B)[-1]
+    X = B
+    for op, size in zip(ops, sizes):
+        X = op(tf.reshape(X, tf.concat([batch_shape, [size, -1]], 0)))
+        X = tf.matrix_transpose(X)
+    X = tf.reshape(X, tf.concat([batch_shape, [N, -1]], 0))
+    return tf.matrix_transpose(X)
+
+
+class Precomputation(object):
+    """
+    Variables caching the value of a tensor, which depends only on the
+    `variables`. The cache is used while it is enabled, i.e. none of the
+    variables is trainable, and valid, i.e. written after the last change of
+    the variables. Changes are signalled by `invalidate_precomputations`.
+    """
+
+    def __init__(self, variables, dtype):
+        self.variables = variables
+        local = [tf.GraphKeys.LOCAL_VARIABLES]
+        with tf.control_dependencies(None):
+            self._initial_enabled_tensor = tf.placeholder_with_default(
+                False, shape=[], name='initial_enabled')
+            self.enabled = tf.Variable(self._initial_enabled_tensor, trainable=False,
+                                       collections=local, name='enabled')
+            self.valid = tf.Variable(False, trainable=False, collections=local, name='valid')
+            self.cache = tf.Variable(tf.zeros([0], dtype=dtype), trainable=False,
+                                     validate_shape=False, collections=local, name='cache')
+            cache_vars = [self.enabled, self.valid, self.cache]
+            self.initializables = [(v, tf.is_variable_initialized(v)) for v in cache_vars]
+
+    @property
+    def is_enabled(self):
+        return not any(is_tensor_trainable(v) for v in self.variables)
+
+    @property
+    def initializable_feeds(self):
+        return {self._initial_enabled_tensor: self.is_enabled}
+
+    def build(self, build):
+        # The cache variables may not be initialized when the tensor is
+        # evaluated outside of a model, in that case the value is recomputed.
+        initialized = tf.reduce_all([status for _, status in self.initializables])
+        state = tf.cond(initialized,
+                        lambda: tf.stack([self.enabled.read_value(), self.valid.read_value()]),
+                        lambda: tf.constant([False, False]))
+        enabled, valid = state[0], state[1]
+
+        def compute():
+            # A disabled cache is not written.
+            value = build()
+
+            def write():
+                assigns = [tf.assign(self.cache, value, validate_shape=False),
+                           tf.assign(self.valid, True)]
+                with tf.control_dependencies(assigns):
+                    return tf.identity(value)
+
+            return tf.cond(enabled, write, lambda: tf.identity(value))
+
+        return tf.cond(tf.logical_and(enabled, valid), self.cache.read_value, compute)
+
+
+def precompute(build, name=None):
+    """
+    Builds a tensor, e.g. a kernel matrix or its Cholesky factor, whose value is
+    cached in variables when it depends only on non-trainable variables such as
+    fixed parameters and data holders. The cache is refreshed after any of
+    these variables changes through `Parameter.assign`, and it is bypassed
+    while any of them is trainable. Variables changed in other ways, e.g. by
+    running their assign operations directly, must be followed by
+    `invalidate_precomputations`. The tensor is built without a cache when it
+    depends on placeholders or stateful operations like random numbers and
+    iterators, or when it is built within a control flow context.
+
+    The cache variables are initialized together with the `Parameterized`
+    objects owning the variables, and right after the build of an autoflow
+    method for the caches created by it.
+
+    :param build: function without arguments building the tensor. It is called
+        twice, once for inspecting the dependencies of the tensor and once for
+        building the tensor computed when the cache is not used. The first
+        copy is never run.
+    """
+    with tf.name_scope(name, 'precompute'):
+        tensor = build()
+        graph = tensor.graph
+        if in_control_flow(graph):
+            return tensor
+        variables = _variable_dependencies(tensor)
+        if not variables:
+            return tensor
+        precomputation = Precomputation(variables, tensor.dtype)
+        get_graph_cache('precomputations', graph)[precomputation.cache.op.name] = precomputation
+        result = precomputation.build(build)
+        result.set_shape(tensor.get_shape())
+        return result
+
+
+def get_precomputations(variables=None, graph=None):
+    """
+    Returns precomputations of the graph depending on any of the variables,
+    all precomputations of the graph when `variables` is None.
+    """
+    precomputations = list(get_graph_cache('precomputations', graph).values())
+    if variables is None:
+        return precomputations
+    variables = set(variables)
+    return [p for p in precomputations if any(v in variables for v in p.variables)]
+
+
+def initialize_precomputations(precomputations, session):
+    """
+    Initializes the cache variables of new precomputations, e.g. of tensors
+    built by autoflow methods after their models were initialized.
+    """
+    if not precomputations:
+        return
+    feeds = {}
+    for precomputation in precomputations:
+        feeds.update(precomputation.initializable_feeds)
+    initializables = [v for p in precomputations for v in p.initializables]
+    initialize_variables(initializables, session=session, force=True, feed_dict=feeds)
+
+
+def update_precomputations(variable, session):
+    """
+    Enables or disables the caches depending on the variable, after
+    the variable has been added to or removed from the trainable variables.
+    The caches are invalidated, since the variable may have changed while
+    it was trainable.
+    """
+    for precomputation in get_precomputations([variable], variable.graph):
+        session.run([precomputation.enabled.initializer, precomputation.valid.initializer],
+                    feed_dict=precomputation.initializable_feeds)
+
+
+def invalidate_precomputations(variable, session):
+    """
+    Marks the caches depending on the variable as stale, after the value of
+    the variable has changed. They are written again at their next run.
+    """
+    precomputations = get_precomputations([variable], variable.graph)
+    if precomputations:
+        session.run([precomputation.valid.initializer for precomputation in precomputations])
+
+
+def _variable_dependencies(tensor):
+    # Variables the tensor depends on, or None when the tensor depends on
+    # placeholders or stateful operations other than variables.
+    graph = tensor.graph
+    collections = graph.get_collection(__GLOBAL_VARIABLES) + \
+        graph.get_collection(tf.GraphKeys.LOCAL_VARIABLES)
+    variable_ops = {v.op: v for v in collections}
+    variables = []
+    visited = set()
+    stack = [tensor.op]
+    while stack:
+        op = stack.pop()
+        if op in visited:
+            continue
+        visited.add(op)
+        if op.type in ('Variable', 'VariableV2'):
+            if op not in variable_ops:
+                return None
+            variables.append(variable_ops[op])
+            continue
+        if op.type in _PLACEHOLDER_OPS:
+            return None
+        if op.op_def.is_stateful and op.type not in _STATELESS_OPS:
+            return None
+        stack.extend(t.op for t in op.inputs)
+        stack.extend(op.control_inputs)
+    return sorted(variables, key=lambda v: v.name)
+
+
+_PLACEHOLDER_OPS = ('Placeholder', 'PlaceholderV2', 'PlaceholderWithDefault')
+_STATELESS_OPS = ('Assert', 'Print')
+
+
 def initialize_variables(variables=None, session=None, force=False, **run_kwargs):
     session = tf.get_default_session() if session is None else session
     if variables is None:
@@ -211,6 +573,9 @@ def _find_initializable_tensors(intializables, session):
                 yield status_tensors[i]
 
 
+_build_caches = []
+
+
 def _get_graph(graph=None):
     return tf.get_default_graph() if graph is None else graph
 
@@ -17,14 +17,18 @@
 from .model import Model
 from .model import GPModel
 from .gpr import GPR
+from .gpr import KroneckerGPR
 from .gpmc import GPMC
 from .gplvm import GPLVM
 from .gplvm import BayesianGPLVM
+from .gplvm import StochasticBayesianGPLVM
+from .gplvm import MLPEncoder
 from .gplvm import PCA_reduce
 from .sgpmc import SGPMC
 from .sgpr import SGPRUpperMixin
 from .sgpr import SGPR
 from .sgpr import GPRFITC
+from .ssgp import SSGP
 from .svgp import SVGP
 from .vgp import VGP
 from .vgp import VGP_opper_archambeau
@@ -1,13 +1,22 @@
 import tensorflow as tf
 import numpy as np
 
+from .. import misc
 from .. import settings
 from .. import likelihoods
 from .. import transforms
 from .. import kernels
+from .. import features
+from .. import kullback_leiblers
 
 from ..params import Parameter
+from ..params import DataHolder
+from ..params import Minibatch
+from ..params import ParamList
+from ..params import Parameterized
 from ..decors import params_as_tensors
+from ..decors import params_as_tensors_for
+from ..decors import autoflow
 from ..mean_functions import Zero
 
 from .model import GPModel
@@ -19,7 +28,7 @@ class GPLVM(GPR):
     Standard GPLVM where the likelihood can be optimised with respect to the latent X.
     """
 
-    def __init__(self, Y, latent_dim, X_mean=None, kern=None, mean_function=None, **kwargs):
+    def __init__(self, Y, latent_dim, X_mean=None, kern=None, mean_function=None, encoder=None, **kwargs):
         """
         Initialise GPLVM object. This method only works with a Gaussian likelihood.
 
@@ -28,12 +37,16 @@ class GPLVM(GPR):
         :param X_mean: latent positions (N x Q), for the initialisation of the latent space.
         :param kern: kernel specification, by default RBF
         :param mean_function: mean function, by default None.
+        :param encoder: recognition model mapping Y to the latent positions, e.g. `MLPEncoder`.
+        If given, the latent positions are not free parameters and X_mean is ignored.
         """
         if mean_function is None:
             mean_function = Zero()
         if kern is None:
             kern = kernels.RBF(latent_dim, ARD=True)
-        if X_mean is None:
+        if encoder is not None:
+            X_mean = np.zeros((Y.shape[0], encoder.latent_dim))
+        elif X_mean is None:
             X_mean = PCA_reduce(Y, latent_dim)
         num_latent = X_mean.shape[1]
         if num_latent != latent_dim:
@@ -43,11 +56,21 @@ class GPLVM(GPR):
             raise ValueError('More latent dimensions than observed.')
         GPR.__init__(self, X_mean, Y, kern, mean_function=mean_function, **kwargs)
         del self.X  # in GPLVM this is a Param
-        self.X = Parameter(X_mean)
+        self.encoder = encoder
+        if encoder is None:
+            self.X = Parameter(X_mean)
+
+    @params_as_tensors
+    def _build_inputs(self):
+        if self.encoder is None:
+            return self.X
+        X_mean, _ = self.encoder(self.Y)
+        return X_mean
 
 
 class BayesianGPLVM(GPModel):
-    def __init__(self, X_mean, X_var, Y, kern, M, Z=None, X_prior_mean=None, X_prior_var=None):
+    def __init__(self, X_mean, X_var, Y, kern, M, Z=None, X_prior_mean=None, X_prior_var=None,
+                 encoder=None):
         """
         Initialise Bayesian GPLVM object. This method only works with a Gaussian likelihood.
         :param X_mean: initial latent positions, size N (number of points) x Q (latent dimensions).
@@ -59,24 +82,30 @@ class BayesianGPLVM(GPModel):
         random permutation of X_mean.
         :param X_prior_mean: prior mean used in KL term of bound. By default 0. Same size as X_mean.
         :param X_prior_var: pripor variance used in KL term of bound. By default 1.
+        :param encoder: recognition model mapping Y to the mean and the variance of the latent
+        positions, e.g. `MLPEncoder`. If given, X_mean and X_var are ignored and Z must be passed.
         """
         GPModel.__init__(self, X_mean, Y, kern,
                          likelihood=likelihoods.Gaussian(),
                          mean_function=Zero())
         del self.X  # in GPLVM this is a Param
-        self.X_mean = Parameter(X_mean)
-        # diag_transform = transforms.DiagMatrix(X_var.shape[1])
-        # self.X_var = Parameter(diag_transform.forward(transforms.positive.backward(X_var)) if X_var.ndim == 2 else X_var,
-        #                    diag_transform)
-        assert X_var.ndim == 2
-        self.X_var = Parameter(X_var, transform=transforms.positive)
-        self.num_data = X_mean.shape[0]
+        self.encoder = encoder
+        if encoder is None:
+            self.X_mean = Parameter(X_mean)
+            # diag_transform = transforms.DiagMatrix(X_var.shape[1])
+            # self.X_var = Parameter(diag_transform.forward(transforms.positive.backward(X_var)) if X_var.ndim == 2 else X_var,
+            #                    diag_transform)
+            assert X_var.ndim == 2
+            self.X_var = Parameter(X_var, transform=transforms.positive)
+            assert np.all(X_mean.shape == X_var.shape)
+            assert X_mean.shape[0] == Y.shape[0], 'X mean and Y must be same size.'
+            assert X_var.shape[0] == Y.shape[0], 'X var and Y must be same size.'
+        elif Z is None:
+            raise ValueError('Inducing points must be passed when the latent positions '
+                             'are computed by the encoder.')
+        self.num_data = Y.shape[0]
         self.output_dim = Y.shape[1]
 
-        assert np.all(X_mean.shape == X_var.shape)
-        assert X_mean.shape[0] == Y.shape[0], 'X mean and Y must be same size.'
-        assert X_var.shape[0] == Y.shape[0], 'X var and Y must be same size.'
-
         # inducing points
         if Z is None:
             # By default we initialize by subset of initial latent points
@@ -85,7 +114,10 @@ class BayesianGPLVM(GPModel):
             assert Z.shape[0] == M
         self.Z = Parameter(Z)
         self.num_latent = Z.shape[1]
-        assert X_mean.shape[1] == self.num_latent
+        if encoder is None:
+            assert X_mean.shape[1] == self.num_latent
+        else:
+            assert encoder.latent_dim == self.num_latent
 
         # deal with parameters for the prior mean variance of X
         if X_prior_mean is None:
@@ -101,18 +133,25 @@ class BayesianGPLVM(GPModel):
         assert self.X_prior_var.shape[0] == self.num_data
         assert self.X_prior_var.shape[1] == self.num_latent
 
+    @params_as_tensors
+    def _build_latent(self):
+        if self.encoder is None:
+            return self.X_mean, self.X_var
+        return self.encoder(self.Y)
+
     @params_as_tensors
     def _build_likelihood(self):
         """
         Construct a tensorflow function to compute the bound on the marginal
         likelihood.
         """
+        X_mean, X_var = self._build_latent()
         num_inducing = tf.shape(self.Z)[0]
-        psi0 = tf.reduce_sum(self.kern.eKdiag(self.X_mean, self.X_var), 0)
-        psi1 = self.kern.eKxz(self.Z, self.X_mean, self.X_var)
-        psi2 = tf.reduce_sum(self.kern.eKzxKxz(self.Z, self.X_mean, self.X_var), 0)
-        Kuu = self.kern.K(self.Z) + tf.eye(num_inducing, dtype=settings.float_type) * settings.numerics.jitter_level
-        L = tf.cholesky(Kuu)
+        psi0 = tf.reduce_sum(self.kern.eKdiag(X_mean, X_var), 0)
+        psi1 = self.kern.eKxz(self.Z, X_mean, X_var)
+        psi2 = self.kern.eKzxKxz_sum(self.Z, X_mean, X_var)
+        L = misc.precompute(lambda: tf.cholesky(misc.upcast(self.kern.K(self.Z)) + tf.eye(
+            num_inducing, dtype=settings.float_type) * settings.numerics.jitter_level))
         sigma2 = self.likelihood.variance
         sigma = tf.sqrt(sigma2)
 
@@ -126,13 +165,13 @@ class BayesianGPLVM(GPModel):
         c = tf.matrix_triangular_solve(LB, tf.matmul(A, self.Y), lower=True) / sigma
 
         # KL[q(x) || p(x)]
-        dX_var = self.X_var if len(self.X_var.get_shape()) == 2 else tf.matrix_diag_part(self.X_var)
-        NQ = tf.cast(tf.size(self.X_mean), settings.float_type)
+        dX_var = X_var if len(X_var.get_shape()) == 2 else tf.matrix_diag_part(X_var)
+        NQ = tf.cast(tf.size(X_mean), settings.float_type)
         D = tf.cast(tf.shape(self.Y)[1], settings.float_type)
         KL = -0.5 * tf.reduce_sum(tf.log(dX_var)) \
              + 0.5 * tf.reduce_sum(tf.log(self.X_prior_var)) \
              - 0.5 * NQ \
-             + 0.5 * tf.reduce_sum((tf.square(self.X_mean - self.X_prior_mean) + dX_var) / self.X_prior_var)
+             + 0.5 * tf.reduce_sum((tf.square(X_mean - self.X_prior_mean) + dX_var) / self.X_prior_var)
 
         # compute log marginal bound
         ND = tf.cast(tf.size(self.Y), settings.float_type)
@@ -153,14 +192,15 @@ class BayesianGPLVM(GPModel):
         there are notes in the SGPR notebook.
         :param Xnew: Point to predict at.
         """
+        X_mean, X_var = self._build_latent()
         num_inducing = tf.shape(self.Z)[0]
-        psi1 = self.kern.eKxz(self.Z, self.X_mean, self.X_var)
-        psi2 = tf.reduce_sum(self.kern.eKzxKxz(self.Z, self.X_mean, self.X_var), 0)
-        Kuu = self.kern.K(self.Z) + tf.eye(num_inducing, dtype=settings.float_type) * settings.numerics.jitter_level
-        Kus = self.kern.K(self.Z, Xnew)
+        psi1 = self.kern.eKxz(self.Z, X_mean, X_var)
+        psi2 = self.kern.eKzxKxz_sum(self.Z, X_mean, X_var)
+        Kus = misc.upcast(self.kern.K(self.Z, Xnew))
         sigma2 = self.likelihood.variance
         sigma = tf.sqrt(sigma2)
-        L = tf.cholesky(Kuu)
+        L = misc.precompute(lambda: tf.cholesky(misc.upcast(self.kern.K(self.Z)) + tf.eye(
+            num_inducing, dtype=settings.float_type) * settings.numerics.jitter_level))
 
         A = tf.matrix_triangular_solve(L, tf.transpose(psi1), lower=True) / sigma
         tmp = tf.matrix_triangular_solve(L, psi2, lower=True)
@@ -172,18 +212,236 @@ class BayesianGPLVM(GPModel):
         tmp2 = tf.matrix_triangular_solve(LB, tmp1, lower=True)
         mean = tf.matmul(tmp2, c, transpose_a=True)
         if full_cov:
-            var = self.kern.K(Xnew) + tf.matmul(tmp2, tmp2, transpose_a=True) \
+            var = misc.upcast(self.kern.K(Xnew)) + tf.matmul(tmp2, tmp2, transpose_a=True) \
                   - tf.matmul(tmp1, tmp1, transpose_a=True)
             shape = tf.stack([1, 1, tf.shape(self.Y)[1]])
             var = tf.tile(tf.expand_dims(var, 2), shape)
         else:
-            var = self.kern.Kdiag(Xnew) + tf.reduce_sum(tf.square(tmp2), 0) \
+            var = misc.upcast(self.kern.Kdiag(Xnew)) + tf.reduce_sum(tf.square(tmp2), 0) \
                   - tf.reduce_sum(tf.square(tmp1), 0)
             shape = tf.stack([1, tf.shape(self.Y)[1]])
             var = tf.tile(tf.expand_dims(var, 1), shape)
         return mean + self.mean_function(Xnew), var
 
 
+class StochasticBayesianGPLVM(GPModel):
+    """
+    Bayesian GPLVM with an explicit Gaussian posterior over the (whitened)
+    inducing outputs, q(v) = N(q_mu, q_sqrt q_sqrt^T). Unlike the collapsed
+    bound of `BayesianGPLVM`, this bound is a sum over data points, so rows of
+    Y can be subsampled together with their latent variational parameters in
+    the same way as in `SVGP`. The key reference is
+
+    ::
+
+      @inproceedings{hensman2013gaussian,
+        title={Gaussian Processes for Big Data},
+        author={Hensman, James and Fusi, Nicolo and Lawrence, Neil D},
+        booktitle={Uncertainty in Artificial Intelligence},
+        year={2013}
+      }
+
+    Rows of `X_mean` and `X_var` are gathered from the unconstrained variables
+    before the transforms are applied, hence the gradients with respect to
+    these parameters are sparse and only the rows of the current minibatch
+    are updated by the TensorFlow optimizers.
+    """
+
+    def __init__(self, X_mean, X_var, Y, kern, M, Z=None, X_prior_mean=None, X_prior_var=None,
+                 minibatch_size=None, **kwargs):
+        """
+        Initialise stochastic Bayesian GPLVM object. This method only works with a Gaussian likelihood.
+        :param X_mean: initial latent positions, size N (number of points) x Q (latent dimensions).
+        :param X_var: variance of latent positions (N x Q), for the initialisation of the latent space.
+        :param Y: data matrix, size N (number of points) x D (dimensions)
+        :param kern: kernel specification, by default RBF
+        :param M: number of inducing points
+        :param Z: matrix of inducing points, size M (inducing points) x Q (latent dimensions). By default
+        random permutation of X_mean.
+        :param X_prior_mean: prior mean used in KL term of bound. By default 0. Same size as X_mean.
+        :param X_prior_var: prior variance used in KL term of bound. By default 1.
+        :param minibatch_size: if not None, turns on mini-batching with that size.
+        """
+        assert X_var.ndim == 2
+        assert np.all(X_mean.shape == X_var.shape)
+        assert X_mean.shape[0] == Y.shape[0], 'X mean and Y must be same size.'
+
+        num_data, num_latent = X_mean.shape
+        index = np.arange(num_data, dtype=settings.int_type)
+        if minibatch_size is None:
+            Y = DataHolder(Y)
+            index = DataHolder(index)
+        else:
+            Y = Minibatch(Y, batch_size=minibatch_size, seed=0)
+            index = Minibatch(index, batch_size=minibatch_size, seed=0)
+
+        GPModel.__init__(self, X_mean, Y, kern,
+                         likelihood=likelihoods.Gaussian(),
+                         mean_function=Zero(), **kwargs)
+        del self.X  # in GPLVM this is a Param
+        self.index = index
+        self.X_mean = Parameter(X_mean)
+        self.X_var = Parameter(X_var, transform=transforms.positive)
+        self.num_data = num_data
+        self.num_latent = num_latent
+        self.output_dim = Y.shape[1]
+
+        # inducing points
+        if Z is None:
+            # By default we initialize by subset of initial latent points
+            Z = np.random.permutation(X_mean.copy())[:M]
+        else:
+            assert Z.shape[0] == M
+        assert Z.shape[1] == num_latent
+        self.feature = features.InducingPoints(Z)
+
+        # deal with parameters for the prior mean variance of X
+        if X_prior_mean is None:
+            X_prior_mean = np.zeros((num_data, num_latent))
+        if X_prior_var is None:
+            X_prior_var = np.ones((num_data, num_latent))
+
+        self.X_prior_mean = np.asarray(np.atleast_1d(X_prior_mean), dtype=settings.float_type)
+        self.X_prior_var = np.asarray(np.atleast_1d(X_prior_var), dtype=settings.float_type)
+
+        assert self.X_prior_mean.shape == (num_data, num_latent)
+        assert self.X_prior_var.shape == (num_data, num_latent)
+
+        # whitened variational posterior of the inducing outputs
+        self.q_mu = Parameter(np.zeros((M, self.output_dim), dtype=settings.float_type))
+        q_sqrt = np.array([np.eye(M, dtype=settings.float_type)
+                           for _ in range(self.output_dim)]).swapaxes(0, 2)
+        self.q_sqrt = Parameter(q_sqrt, transform=transforms.LowerTriangular(M, self.output_dim))
+
+    @params_as_tensors
+    def _build_latent_batch(self):
+        """
+        Gather the latent variational parameters and the prior of the rows in
+        the current minibatch.
+        """
+        index = self.index
+        with params_as_tensors_for(self, convert=False):
+            X_mean = _gather_rows(self.X_mean, index)
+            X_var = _gather_rows(self.X_var, index)
+        X_prior_mean = tf.gather(self.X_prior_mean, index)
+        X_prior_var = tf.gather(self.X_prior_var, index)
+        return X_mean, X_var, X_prior_mean, X_prior_var
+
+    @params_as_tensors
+    def _build_likelihood(self):
+        """
+        Construct a tensorflow function to compute the bound on the marginal
+        likelihood, re-scaled for the minibatch size.
+        """
+        X_mean, X_var, X_prior_mean, X_prior_var = self._build_latent_batch()
+        batch_size = tf.cast(tf.shape(self.Y)[0], settings.float_type)
+        D = tf.cast(tf.shape(self.Y)[1], settings.float_type)
+        scale = tf.cast(self.num_data, settings.float_type) / batch_size
+
+        psi0 = tf.reduce_sum(self.kern.eKdiag(X_mean, X_var))
+        psi1 = self.feature.eKfu(self.kern, X_mean, X_var)
+        psi2 = self.feature.eKufKfu_sum(self.kern, X_mean, X_var)
+        L = misc.precompute(lambda: tf.cholesky(
+            self.feature.Kuu(self.kern, jitter=settings.numerics.jitter_level)))
+        sigma2 = self.likelihood.variance
+
+        # Compute intermediate matrices
+        A = tf.matrix_triangular_solve(L, tf.transpose(psi1), lower=True)
+        tmp = tf.matrix_triangular_solve(L, psi2, lower=True)
+        AAT = tf.matrix_triangular_solve(L, tf.transpose(tmp), lower=True)
+        fmean = tf.matmul(A, self.q_mu, transpose_a=True)
+        Lq = tf.matrix_band_part(tf.transpose(self.q_sqrt, (2, 0, 1)), -1, 0)
+        q_moments = tf.matmul(self.q_mu, self.q_mu, transpose_b=True) + \
+                    tf.reduce_sum(tf.matmul(Lq, Lq, transpose_b=True), 0)
+        # sum over rows and outputs of E[f^2] under q(x) q(f)
+        f_square = D * (psi0 - tf.reduce_sum(tf.matrix_diag_part(AAT))) + \
+                   tf.reduce_sum(q_moments * AAT)
+
+        # expected log likelihood of the minibatch
+        var_exp = -0.5 * batch_size * D * tf.log(2 * np.pi * sigma2)
+        var_exp += -0.5 * (tf.reduce_sum(tf.square(self.Y))
+                           - 2. * tf.reduce_sum(self.Y * fmean)
+                           + f_square) / sigma2
+
+        # KL[q(x) || p(x)] of the minibatch
+        NQ = tf.cast(tf.size(X_mean), settings.float_type)
+        KL_X = -0.5 * tf.reduce_sum(tf.log(X_var)) \
+               + 0.5 * tf.reduce_sum(tf.log(X_prior_var)) \
+               - 0.5 * NQ \
+               + 0.5 * tf.reduce_sum((tf.square(X_mean - X_prior_mean) + X_var) / X_prior_var)
+
+        # KL[q(v) || p(v)]
+        KL_U = kullback_leiblers.gauss_kl(self.q_mu, self.q_sqrt)
+
+        return (var_exp - KL_X) * scale - KL_U
+
+    @params_as_tensors
+    def _build_predict(self, Xnew, full_cov=False):
+        mu, var = features.conditional(self.feature, self.kern, Xnew, self.q_mu,
+                                       q_sqrt=self.q_sqrt, full_cov=full_cov, white=True)
+        return mu + self.mean_function(Xnew), var
+
+
+def _gather_rows(param, index):
+    """
+    Gather rows of the unconstrained variable before applying the transform,
+    so that the gradient with respect to the variable is sparse.
+    """
+    rows = tf.gather(param.unconstrained_tensor, index)
+    return param.transform.forward_tensor(rows)
+
+
+class MLPEncoder(Parameterized):
+    """
+    Recognition model, also known as back-constraint, which maps observations Y
+    to the mean and the variance of their latent positions with a multilayer
+    perceptron. When passed to `GPLVM` or `BayesianGPLVM` the number of
+    parameters does not grow with the number of data points, and the latent
+    positions of new observations are obtained by a single forward pass,
+    see `compute_latent`.
+    """
+
+    def __init__(self, input_dim, latent_dim, hidden_sizes=(50,), activation=tf.tanh, name=None):
+        """
+        :param input_dim: number of observed dimensions D.
+        :param latent_dim: number of latent dimensions Q.
+        :param hidden_sizes: sizes of the hidden layers.
+        :param activation: activation function of the hidden layers.
+        """
+        super().__init__(name=name)
+        self.input_dim = input_dim
+        self.latent_dim = latent_dim
+        self.activation = activation
+        sizes = [input_dim] + list(hidden_sizes) + [2 * latent_dim]
+        weights, biases = [], []
+        for n_in, n_out in zip(sizes[:-1], sizes[1:]):
+            scale = np.sqrt(2. / (n_in + n_out))
+            weights.append(np.random.randn(n_in, n_out) * scale)
+            biases.append(np.zeros(n_out))
+        self.weights = ParamList(weights)
+        self.biases = ParamList(biases)
+
+    @params_as_tensors
+    def __call__(self, Y):
+        """
+        :param Y: observations, size N x D.
+        :return: mean and variance of the latent positions, both of size N x Q.
+        """
+        H = Y
+        num_layers = len(self.weights)
+        for i in range(num_layers):
+            H = tf.matmul(H, self.weights[i]) + self.biases[i]
+            if i < num_layers - 1:
+                H = self.activation(H)
+        X_mean = H[:, :self.latent_dim]
+        X_var = transforms.positive.forward_tensor(H[:, self.latent_dim:])
+        return X_mean, X_var
+
+    @autoflow((settings.float_type, [None, None]))
+    def compute_latent(self, Y):
+        return self(Y)
+
+
 def PCA_reduce(X, Q):
     """
     A helpful function for linearly reducing the dimensionality of the data X
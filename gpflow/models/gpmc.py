@@ -16,6 +16,7 @@
 import numpy as np
 import tensorflow as tf
 
+from .. import misc
 from .. import settings
 from ..params import Parameter, DataHolder
 from ..decors import params_as_tensors
@@ -80,12 +81,31 @@ class GPMC(GPModel):
             \log p(Y, V | theta).
 
         """
-        K = self.kern.K(self.X)
+        return self.build_latent_likelihood()(self.V)
+
+    @params_as_tensors
+    def build_latent_likelihood(self):
+        """
+        Construct a function which computes the likelihood for arbitrary values
+        of the whitened latent variables, with the hyperparameters held fixed
+
+            \log p(Y | V, theta).
+
+        The Cholesky factor of the kernel matrix is built once and shared by
+        every call of the returned function, which makes it suitable for
+        samplers that evaluate many proposals of V, e.g. `gpflow.train.ESS`.
+        """
+        K = misc.upcast(self.kern.K(self.X))
         L = tf.cholesky(
             K + tf.eye(tf.shape(self.X)[0], dtype=settings.float_type) * settings.numerics.jitter_level)
-        F = tf.matmul(L, self.V) + self.mean_function(self.X)
+        mean = self.mean_function(self.X)
+        likelihood, Y = self.likelihood, self.Y
+
+        def latent_likelihood(V):
+            F = tf.matmul(L, V) + mean
+            return tf.reduce_sum(likelihood.logp(F, Y))
 
-        return tf.reduce_sum(self.likelihood.logp(F, self.Y))
+        return latent_likelihood
 
     @params_as_tensors
     def _build_predict(self, Xnew, full_cov=False):
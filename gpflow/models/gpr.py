@@ -14,12 +14,16 @@
 
 
 from __future__ import absolute_import
+import numpy as np
 import tensorflow as tf
 
+from .. import kernels
 from .. import likelihoods
+from .. import misc
 from .. import settings
 
 from ..params import DataHolder
+from ..params import SparseDataHolder
 from ..decors import params_as_tensors
 from ..decors import name_scope
 from ..densities import multivariate_normal
@@ -38,18 +42,91 @@ class GPR(GPModel):
     .. math::
 
        \\log p(\\mathbf y \\,|\\, \\mathbf f) = \\mathcal N\\left(\\mathbf y\,|\, 0, \\mathbf K + \\sigma_n \\mathbf I\\right)
+
+    With a Linear kernel, the model is Bayesian linear regression on the
+    features Phi = X sqrt(variance), and for N > D it is computed in the
+    weight space, in O(N D^2) rather than O(N^2 D + N^3). The inputs X may
+    be a `scipy.sparse` matrix for the Linear and Polynomial kernels.
     """
-    def __init__(self, X, Y, kern, mean_function=None, **kwargs):
+    def __init__(self, X, Y, kern, mean_function=None, weight_space=None, **kwargs):
         """
-        X is a data matrix, size N x D
+        X is a data matrix, size N x D, dense or sparse
         Y is a data matrix, size N x R
         kern, mean_function are appropriate GPflow objects
+        weight_space computes the model in the weight space of a Linear
+            kernel. If None, it does so when N is larger than the input_dim
+            of a Linear kernel.
         """
         likelihood = likelihoods.Gaussian()
         X = DataHolder(X)
         Y = DataHolder(Y)
+        if isinstance(X, SparseDataHolder) and not isinstance(kern, kernels.Linear):
+            raise ValueError('Sparse inputs require the Linear or Polynomial kernel, got `%s`.'
+                             % str(type(kern)))
+        linear = isinstance(kern, kernels.Linear) and not isinstance(kern, kernels.Polynomial)
+        if weight_space is None:
+            weight_space = linear and X.shape[0] > kern.input_dim
+        elif weight_space and not linear:
+            raise ValueError('Weight space computations require the Linear kernel.')
         GPModel.__init__(self, X, Y, kern, likelihood, mean_function, **kwargs)
         self.num_latent = Y.shape[1]
+        self._weight_space = weight_space
+
+    @property
+    def weight_space(self):
+        return self._weight_space
+
+    @params_as_tensors
+    def _build_inputs(self):
+        """
+        Returns the inputs X of the regression. Models whose inputs are not
+        data, e.g. the latent positions of the GPLVM, override it.
+        """
+        return self.X
+
+    @params_as_tensors
+    def _build_feature_scale(self):
+        """
+        Returns sqrt(variance) of the Linear kernel as a column, size D x 1
+        or 1 x 1, which scales the inputs X^T to the features Phi^T.
+        """
+        return tf.reshape(tf.sqrt(self.kern.variance), [-1, 1])
+
+    @params_as_tensors
+    def _build_features(self, X):
+        """
+        Computes the transposed features Phi^T = sqrt(variance) X^T of the
+        Linear kernel, size D x N. Sparse inputs are densified, which is as
+        large as the predictions at them.
+        """
+        X, _ = self.kern._slice(X, None)
+        if isinstance(X, tf.SparseTensor):
+            Xt = tf.sparse_tensor_to_dense(tf.sparse_transpose(X), validate_indices=False)
+        else:
+            Xt = tf.transpose(X)
+        return self._build_feature_scale() * Xt
+
+    @params_as_tensors
+    def _build_weight_posterior(self):
+        """
+        Returns the Cholesky factor L of A = Phi^T Phi + noise_variance * I
+        and c = L^{-1} Phi^T (Y - m(X)), which determine the posterior of
+        the weights of the features: N(L^{-T} c, noise_variance * A^{-1}).
+        Sparse inputs are not densified.
+        """
+        X = self._build_inputs()
+        err = self.Y - self.mean_function(X)
+        Xs, _ = self.kern._slice(X, None)
+        if isinstance(Xs, tf.SparseTensor):
+            XtX = _sparse_crossprod(Xs)
+            Xterr = tf.sparse_tensor_dense_matmul(Xs, err, adjoint_a=True)
+        else:
+            XtX = tf.matmul(Xs, Xs, transpose_a=True)
+            Xterr = tf.matmul(Xs, err, transpose_a=True)
+        scale = self._build_feature_scale()
+        L, c = _linear_regression_posterior(scale * XtX * tf.transpose(scale), scale * Xterr,
+                                            self.likelihood.variance)
+        return L, c, err
 
     @name_scope('likelihood')
     @params_as_tensors
@@ -60,12 +137,25 @@ class GPR(GPModel):
             \log p(Y | theta).
 
         """
-        K = self.kern.K(self.X) + tf.eye(tf.shape(self.X)[0], dtype=settings.float_type) * self.likelihood.variance
+        if self.weight_space:
+            return self._build_weight_space_likelihood()
+        X = self._build_inputs()
+        num_data = misc.num_rows(X)
+        K = misc.precompute(lambda: misc.upcast(self.kern.K(X))) + tf.eye(num_data, dtype=settings.float_type) * self.likelihood.variance
         L = tf.cholesky(K)
-        m = self.mean_function(self.X)
+        m = self.mean_function(X)
 
         return multivariate_normal(self.Y, m, L)
 
+    @params_as_tensors
+    def _build_weight_space_likelihood(self):
+        """
+        The likelihood through the matrix determinant lemma and the Woodbury
+        identity in the weight space.
+        """
+        L, c, err = self._build_weight_posterior()
+        return _linear_regression_likelihood(L, c, err, self.likelihood.variance)
+
     @name_scope('predict')
     @params_as_tensors
     def _build_predict(self, Xnew, full_cov=False):
@@ -79,17 +169,301 @@ class GPR(GPModel):
         where F* are points on the GP at Xnew, Y are noisy observations at X.
 
         """
-        Kx = self.kern.K(self.X, Xnew)
-        K = self.kern.K(self.X) + tf.eye(tf.shape(self.X)[0], dtype=settings.float_type) * self.likelihood.variance
+        if self.weight_space:
+            return self._build_weight_space_predict(Xnew, full_cov=full_cov)
+        X = self._build_inputs()
+        Kx = misc.upcast(self.kern.K(X, Xnew))
+        num_data = misc.num_rows(X)
+        K = misc.precompute(lambda: misc.upcast(self.kern.K(X))) + tf.eye(num_data, dtype=settings.float_type) * self.likelihood.variance
         L = tf.cholesky(K)
         A = tf.matrix_triangular_solve(L, Kx, lower=True)
-        V = tf.matrix_triangular_solve(L, self.Y - self.mean_function(self.X))
+        V = tf.matrix_triangular_solve(L, self.Y - self.mean_function(X))
         fmean = tf.matmul(A, V, transpose_a=True) + self.mean_function(Xnew)
         if full_cov:
-            fvar = self.kern.K(Xnew) - tf.matmul(A, A, transpose_a=True)
+            fvar = misc.upcast(self.kern.K(Xnew)) - tf.matmul(A, A, transpose_a=True)
             shape = tf.stack([1, 1, tf.shape(self.Y)[1]])
             fvar = tf.tile(tf.expand_dims(fvar, 2), shape)
         else:
-            fvar = self.kern.Kdiag(Xnew) - tf.reduce_sum(tf.square(A), 0)
+            fvar = misc.upcast(self.kern.Kdiag(Xnew)) - tf.reduce_sum(tf.square(A), 0)
             fvar = tf.tile(tf.reshape(fvar, (-1, 1)), [1, tf.shape(self.Y)[1]])
         return fmean, fvar
+
+    @params_as_tensors
+    def _build_weight_space_predict(self, Xnew, full_cov=False):
+        L, c, _ = self._build_weight_posterior()
+        fmean, fvar = _linear_regression_predict(L, c, self._build_features(Xnew),
+                                                 self.likelihood.variance, full_cov=full_cov)
+        return fmean + self.mean_function(Xnew), fvar
+
+
+def _linear_regression_posterior(PhiTPhi, PhiTerr, noise_variance):
+    """
+    Bayesian linear regression of the residuals err on the features Phi,
+    with unit prior variance of the weights. Returns the Cholesky factor L
+    of A = Phi^T Phi + noise_variance * I and c = L^{-1} Phi^T err, which
+    determine the posterior of the weights: N(L^{-T} c, noise_variance * A^{-1}).
+    """
+    num_features = tf.shape(PhiTPhi)[0]
+    A = PhiTPhi + tf.eye(num_features, dtype=settings.float_type) * noise_variance
+    L = tf.cholesky(A)
+    c = tf.matrix_triangular_solve(L, PhiTerr, lower=True)
+    return L, c
+
+
+def _linear_regression_likelihood(L, c, err, noise_variance):
+    """
+    The marginal likelihood \log N(err | 0, Phi Phi^T + noise_variance * I)
+    of the Bayesian linear regression with the posterior L, c, through the
+    matrix determinant lemma and the Woodbury identity.
+    """
+    N = tf.cast(tf.shape(err)[0], settings.float_type)
+    R = tf.cast(tf.shape(err)[1], settings.float_type)
+    num_features = tf.cast(tf.shape(L)[0], settings.float_type)
+
+    bound = -0.5 * N * R * np.log(2 * np.pi)
+    bound -= 0.5 * R * (N - num_features) * tf.log(noise_variance)
+    bound -= R * tf.reduce_sum(tf.log(tf.matrix_diag_part(L)))
+    bound -= 0.5 * (tf.reduce_sum(tf.square(err)) - tf.reduce_sum(tf.square(c))) / noise_variance
+    return bound
+
+
+def _linear_regression_predict(L, c, PhiT, noise_variance, full_cov=False):
+    """
+    The mean and variance of Phi w at the transposed features Phi^T of new
+    points, size F x N, under the posterior L, c of the weights w.
+    """
+    A = tf.matrix_triangular_solve(L, PhiT, lower=True)
+    fmean = tf.matmul(A, c, transpose_a=True)
+    if full_cov:
+        fvar = noise_variance * tf.matmul(A, A, transpose_a=True)
+        shape = tf.stack([1, 1, tf.shape(c)[1]])
+        fvar = tf.tile(tf.expand_dims(fvar, 2), shape)
+    else:
+        fvar = noise_variance * tf.reduce_sum(tf.square(A), 0)
+        fvar = tf.tile(tf.reshape(fvar, (-1, 1)), [1, tf.shape(c)[1]])
+    return fmean, fvar
+
+
+def _sparse_crossprod(X):
+    """
+    Returns X^T X for a sparse tensor X of size N x D, in O(nnz(X) D). The
+    rows of X are densified in blocks of D rows, so that no more than a
+    D x D block of X is dense at a time.
+    """
+    X = tf.sparse_reorder(X)
+    rows = X.indices[:, 0]
+    num_rows, num_columns = X.dense_shape[0], X.dense_shape[1]
+    # The entries of the rows [start, stop) are offsets[start]:offsets[stop].
+    counts = tf.unsorted_segment_sum(tf.ones_like(rows), rows, num_rows)
+    offsets = tf.concat([tf.zeros([1], dtype=tf.int64), tf.cumsum(counts)], 0)
+    block_size = tf.maximum(num_columns, 1)
+
+    def body(start, gram):
+        stop = tf.minimum(start + block_size, num_rows)
+        entries = tf.range(offsets[start], offsets[stop])
+        indices = tf.gather(X.indices, entries) - tf.stack([start, 0])
+        block = tf.SparseTensor(indices, tf.gather(X.values, entries),
+                                tf.stack([stop - start, num_columns]))
+        dense = tf.sparse_tensor_to_dense(block, validate_indices=False)
+        return stop, gram + tf.sparse_tensor_dense_matmul(block, dense, adjoint_a=True)
+
+    shape = tf.cast(tf.stack([num_columns, num_columns]), tf.int32)
+    gram = tf.zeros(shape, dtype=X.values.dtype)
+    _, gram = tf.while_loop(lambda start, _: start < num_rows, body,
+                            [tf.constant(0, dtype=tf.int64), gram], parallel_iterations=1)
+    return gram
+
+
+class KroneckerGPR(GPModel):
+    """
+    Multi-output Gaussian Process Regression with the intrinsic
+    coregionalization model, for outputs observed at the same inputs.
+
+    The P columns of Y are outputs with the covariance
+
+        cov(f_p(x), f_q(x')) = B[p, q] k(x, x'),
+
+    where B = W W^T + diag(kappa) is the matrix of a Coregion kernel, so that
+    the covariance of the stacked outputs vec(Y) is the Kronecker product
+    kron(B, K_x) + noise_variance * I. The eigendecompositions of K_x and B
+    diagonalize it, and the marginal likelihood and predictions cost
+    O(N^3 + P^3) rather than the O(N^3 P^3) of GPR on inputs augmented by
+    output labels.
+
+    Missing outputs are marked by NaN entries of Y. The Kronecker structure
+    then no longer holds, and the model falls back to the dense covariance of
+    the observed entries, in O((N P)^3). The mode is chosen in the graph
+    from the current Y, so that NaN entries assigned later are handled.
+    """
+    def __init__(self, X, Y, kern, coregion, mean_function=None, **kwargs):
+        """
+        X is a data matrix, size N x D
+        Y is a data matrix, size N x P, with NaN for missing outputs
+        kern is the kernel of the inputs X
+        coregion is a Coregion kernel with output_dim P
+        """
+        if not isinstance(coregion, kernels.Coregion):
+            raise ValueError('Coregion kernel expected, got `%s`.' % str(type(coregion)))
+        if coregion.output_dim != Y.shape[1]:
+            raise ValueError('Coregion kernel of output_dim {0} cannot model {1} outputs.'
+                             .format(coregion.output_dim, Y.shape[1]))
+        likelihood = likelihoods.Gaussian()
+        X = DataHolder(X)
+        Y = DataHolder(Y)
+        GPModel.__init__(self, X, Y, kern, likelihood, mean_function, **kwargs)
+        self.coregion = coregion
+        self.num_latent = Y.shape[1]
+
+    @property
+    def missing(self):
+        """
+        Whether the current Y has missing outputs.
+        """
+        return bool(np.any(np.isnan(self.Y.read_value())))
+
+    @params_as_tensors
+    def _build_missing(self):
+        return tf.reduce_any(tf.is_nan(self.Y))
+
+    @params_as_tensors
+    def _build_coregion(self):
+        W, kappa = self.coregion.W, self.coregion.kappa
+        return tf.matmul(W, W, transpose_b=True) + tf.matrix_diag(kappa)
+
+    @params_as_tensors
+    def _build_covariances(self):
+        """
+        Returns K_x, B and the residuals Y - m(X), shared by both modes.
+        """
+        Kx = misc.precompute(lambda: misc.upcast(self.kern.K(self.X)))
+        return Kx, self._build_coregion(), self.Y - self.mean_function(self.X)
+
+    @staticmethod
+    def _build_eigen(Kx, B):
+        """
+        Returns the eigenvalues and eigenvectors of K_x and B.
+        """
+        return tf.self_adjoint_eig(Kx), tf.self_adjoint_eig(B)
+
+    @staticmethod
+    def _build_observed(err):
+        """
+        Returns the indices of the observed entries of vec(Y), which stacks
+        the columns of Y, and the residuals vec(Y - m(X)) at these entries.
+        """
+        err = tf.reshape(tf.transpose(err), [-1])
+        index = tf.reshape(tf.where(tf.logical_not(tf.is_nan(err))), [-1])
+        return index, tf.gather(err, index)
+
+    @params_as_tensors
+    def _build_observed_cholesky(self, Kx, B, index):
+        K = misc.kron([B, Kx])
+        K = tf.gather(tf.transpose(tf.gather(K, index)), index)
+        K += tf.eye(tf.shape(index)[0], dtype=settings.float_type) * self.likelihood.variance
+        return tf.cholesky(K)
+
+    @name_scope('likelihood')
+    @params_as_tensors
+    def _build_likelihood(self):
+        """
+        Construct a tensorflow function to compute the likelihood.
+
+            \log N(vec(Y) | vec(m(X)), kron(B, K_x) + noise_variance * I).
+
+        """
+        Kx, B, err = self._build_covariances()
+        return tf.cond(self._build_missing(),
+                       lambda: self._build_observed_likelihood(Kx, B, err),
+                       lambda: self._build_kronecker_likelihood(Kx, B, err))
+
+    @params_as_tensors
+    def _build_observed_likelihood(self, Kx, B, err):
+        index, err = self._build_observed(err)
+        L = self._build_observed_cholesky(Kx, B, index)
+        err = tf.expand_dims(err, 1)
+        return multivariate_normal(err, tf.zeros_like(err), L)
+
+    @params_as_tensors
+    def _build_kronecker_likelihood(self, Kx, B, err):
+        # The gradients of tf.self_adjoint_eig are unstable for repeated
+        # eigenvalues, so the eigenvectors are held fixed and the gradients
+        # flow through the eigenvalues U^T K U and the solve below instead.
+        (_, U_x), (_, U_b) = self._build_eigen(Kx, B)
+        U_x, U_b = tf.stop_gradient(U_x), tf.stop_gradient(U_b)
+        s_x = tf.maximum(tf.reduce_sum(U_x * tf.matmul(Kx, U_x), 0), 0)
+        s_b = tf.maximum(tf.reduce_sum(U_b * tf.matmul(B, U_b), 0), 0)
+        Lambda = tf.expand_dims(s_x, 1) * tf.expand_dims(s_b, 0) + self.likelihood.variance
+        Yt = tf.matmul(tf.matmul(U_x, err, transpose_a=True), U_b)
+        # y^T S^{-1} y = 2 a^T y - a^T S a at a = S^{-1} y, with S = kron(B, K_x) + noise_variance * I
+        alpha = tf.stop_gradient(tf.matmul(tf.matmul(U_x, Yt / Lambda), U_b, transpose_b=True))
+        S_alpha = tf.matmul(tf.matmul(Kx, alpha), B) + self.likelihood.variance * alpha
+        maha = 2. * tf.reduce_sum(alpha * err) - tf.reduce_sum(alpha * S_alpha)
+        num_data = tf.cast(tf.size(err), settings.float_type)
+        return -0.5 * (num_data * np.log(2 * np.pi) + tf.reduce_sum(tf.log(Lambda)) + maha)
+
+    @name_scope('predict')
+    @params_as_tensors
+    def _build_predict(self, Xnew, full_cov=False):
+        """
+        Xnew is a data matrix, point at which we want to predict
+
+        This method computes
+
+            p(F* | Y )
+
+        where F* are the P outputs at Xnew. Covariances between different
+        outputs are not returned.
+        """
+        Kx, B, err = self._build_covariances()
+        Kxs = misc.upcast(self.kern.K(self.X, Xnew))
+        if full_cov:
+            Kss = misc.upcast(self.kern.K(Xnew))
+        else:
+            Kss = misc.upcast(self.kern.Kdiag(Xnew))
+        args = Kx, B, err, Kxs, Kss, full_cov
+        fmean, fvar = tf.cond(self._build_missing(),
+                              lambda: self._build_observed_predict(*args),
+                              lambda: self._build_kronecker_predict(*args))
+        return fmean + self.mean_function(Xnew), fvar
+
+    @params_as_tensors
+    def _build_kronecker_predict(self, Kx, B, err, Kxs, Kss, full_cov):
+        (s_x, U_x), (s_b, U_b) = self._build_eigen(Kx, B)
+        s_x, s_b = tf.maximum(s_x, 0), tf.maximum(s_b, 0)
+        Lambda = tf.expand_dims(s_x, 1) * tf.expand_dims(s_b, 0) + self.likelihood.variance
+        Yt = tf.matmul(tf.matmul(U_x, err, transpose_a=True), U_b)
+        Bdiag = tf.matrix_diag_part(B)
+        A = tf.matmul(Kxs, U_x, transpose_a=True)
+        C = U_b * s_b  # B U_b
+        fmean = tf.matmul(tf.matmul(A, Yt / Lambda), C, transpose_b=True)
+        # D[n, p] = sum_q C[p, q]^2 / Lambda[n, q]
+        D = tf.matmul(1. / Lambda, tf.square(C), transpose_b=True)
+        if full_cov:
+            AD = tf.expand_dims(A, 0) * tf.expand_dims(tf.transpose(D), 1)
+            fvar = tf.expand_dims(tf.expand_dims(Bdiag, 1), 2) * Kss - \
+                tf.tensordot(AD, A, [[2], [1]])
+            fvar = tf.transpose(fvar, [1, 2, 0])
+        else:
+            fvar = tf.expand_dims(Kss, 1) * Bdiag - tf.matmul(tf.square(A), D)
+        return fmean, fvar
+
+    @params_as_tensors
+    def _build_observed_predict(self, Kx, B, err, Kxs, Kss, full_cov):
+        index, err = self._build_observed(err)
+        L = self._build_observed_cholesky(Kx, B, index)
+        Bdiag = tf.matrix_diag_part(B)
+        num_outputs, num_new = tf.shape(B)[0], tf.shape(Kxs)[1]
+        A = tf.matrix_triangular_solve(L, tf.gather(misc.kron([B, Kxs]), index), lower=True)
+        V = tf.matrix_triangular_solve(L, tf.expand_dims(err, 1), lower=True)
+        fmean = tf.reshape(tf.matmul(A, V, transpose_a=True), tf.stack([num_outputs, num_new]))
+        fmean = tf.transpose(fmean)
+        A = tf.reshape(A, tf.stack([tf.shape(index)[0], num_outputs, num_new]))
+        A = tf.transpose(A, [1, 0, 2])
+        if full_cov:
+            fvar = tf.expand_dims(tf.expand_dims(Bdiag, 1), 2) * Kss - \
+                tf.matmul(A, A, transpose_a=True)
+            fvar = tf.transpose(fvar, [1, 2, 0])
+        else:
+            fvar = tf.expand_dims(Kss, 1) * Bdiag - tf.transpose(tf.reduce_sum(tf.square(A), 1))
+        return fmean, fvar
+
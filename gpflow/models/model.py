@@ -15,12 +15,16 @@
 from __future__ import print_function, absolute_import
 
 import abc
+import contextlib
 
 import numpy as np
 import tensorflow as tf
 
+from .. import misc
 from .. import settings
 from ..core.compilable import Build
+from ..core.errors import GPflowError
+from ..core.autoflow import AutoFlow
 from ..params import Parameterized, DataHolder
 from ..decors import autoflow
 from ..mean_functions import Zero
@@ -77,10 +81,11 @@ class Model(Parameterized):
         self._objective = None
 
     def _build(self):
-        super(Model, self)._build()
-        likelihood = self._build_likelihood()
-        prior = self.prior_tensor
-        objective = self._build_objective(likelihood, prior)
+        with misc.build_cache_scope():
+            super(Model, self)._build()
+            likelihood = self._build_likelihood()
+            prior = self.prior_tensor
+            objective = self._build_objective(likelihood, prior)
         self._likelihood_tensor = likelihood
         self._objective = objective
 
@@ -191,6 +196,181 @@ class GPModel(Model):
         pred_f_mean, pred_f_var = self._build_predict(Xnew)
         return self.likelihood.predict_density(pred_f_mean, pred_f_var, Ynew)
 
+    @autoflow((settings.float_type, [None, None]), (settings.float_type, [None, None]))
+    def predict_y_and_density(self, Xnew, Ynew):
+        """
+        Compute the mean and variance of held-out data and the (log) density of
+        the data Ynew at the points Xnew, with a single prediction of the
+        latent function(s) and a single pass of the likelihood.
+        """
+        pred_f_mean, pred_f_var = self._build_predict(Xnew)
+        return self.likelihood.predict_mean_var_and_density(pred_f_mean, pred_f_var, Ynew)
+
+    def iter_predict(self, predict, *arrays, chunk_size=None, memory_budget=None, session=None):
+        """
+        Evaluates a pointwise prediction method, e.g. `predict_f`, `predict_y`
+        or `predict_density`, on consecutive chunks of rows of the input
+        arrays, so that predictions at many points never materialize the
+        covariance between all of them and the training or inducing points.
+        Every chunk is evaluated with the same compiled graph of the method.
+
+        :param predict: bound autoflow method of the model.
+        :param arrays: inputs of the method, e.g. Xnew or Xnew and Ynew, which
+            are split along their first dimension.
+        :param chunk_size: number of rows evaluated in one session run.
+        :param memory_budget: alternatively to `chunk_size`, the size in bytes
+            of the covariance between a chunk and the training or inducing
+            points for all latent functions. Intermediate tensors of the
+            prediction take a small multiple of this size.
+        :param session: TensorFlow session. The default session or cached
+            GPflow session will be used if it is None.
+        :return: generator of the first and last (exclusive) rows of each
+            chunk, and the results of `predict` for the chunk.
+        """
+        if predict in (self.predict_f_full_cov, self.predict_f_samples):
+            raise ValueError('Joint predictions cannot be evaluated in chunks.')
+        chunk_size = self._prediction_chunk_size(chunk_size, memory_budget)
+        num_points = arrays[0].shape[0]
+        for start in range(0, max(num_points, 1), chunk_size):
+            stop = min(start + chunk_size, num_points)
+            chunks = [array[start:stop] for array in arrays]
+            yield start, stop, predict(*chunks, session=session)
+
+    def predict_chunked(self, predict, *arrays, chunk_size=None, memory_budget=None,
+                        out=None, session=None):
+        """
+        Evaluates a pointwise prediction method in chunks like `iter_predict`,
+        and writes the results into output arrays.
+
+        :param out: array, or tuple of arrays for methods with several results
+            like `predict_f`, with the full first dimension of the results,
+            e.g. preallocated `numpy.memmap` arrays for predictions which do not
+            fit into memory. New arrays are allocated if it is None.
+        :return: the output arrays, structured like the results of `predict`.
+        """
+        single = None
+        for start, stop, results in self.iter_predict(
+                predict, *arrays, chunk_size=chunk_size, memory_budget=memory_budget,
+                session=session):
+            if single is None:
+                single = not isinstance(results, (tuple, list))
+                if out is None:
+                    num_points = arrays[0].shape[0]
+                    out = [np.empty((num_points,) + r.shape[1:], dtype=r.dtype)
+                           for r in ([results] if single else results)]
+                    out = out[0] if single else tuple(out)
+            if single:
+                out[start:stop] = results
+            else:
+                for array, result in zip(out, results):
+                    array[start:stop] = result
+        return out
+
+    def _prediction_chunk_size(self, chunk_size, memory_budget):
+        if (chunk_size is None) == (memory_budget is None):
+            raise ValueError('Exactly one of `chunk_size` and `memory_budget` must be given.')
+        if chunk_size is None:
+            feature = getattr(self, 'feature', None)
+            num_points = len(feature) if feature is not None else self.X.shape[0]
+            num_latent = getattr(self, 'num_latent', 1)
+            item_size = np.dtype(settings.float_type).itemsize
+            chunk_size = memory_budget // (item_size * num_points * num_latent)
+        return max(int(chunk_size), 1)
+
+    def predict_f_trace(self, Xnew, trace, batch_size=None, mixture=False, session=None):
+        """
+        Compute the mean and variance of the latent function(s) at the points
+        Xnew for every sample of a parameter trace, e.g. the data frame returned
+        by `gpflow.train.HMC.sample`.
+
+        The trace columns are matched against the full names of the model
+        parameters; other columns like `logprobs` are ignored and parameters
+        missing in the trace keep their current values. Samples are stacked
+        along a leading axis and evaluated within the graph, so that the trace
+        costs one session run per `batch_size` samples instead of assigning
+        the parameters and running the session for each sample.
+
+        :param Xnew: points at which to predict, size N x D.
+        :param trace: data frame with constrained parameter values, one row
+            per sample.
+        :param batch_size: number of samples evaluated in one session run.
+            All samples are evaluated at once when it is None.
+        :param mixture: if True, the mean and variance of the equally weighted
+            mixture of the predictive distributions are returned instead of
+            the per sample values.
+        :param session: TensorFlow session. The default session or cached
+            GPflow session will be used if it is None.
+        :return: means and variances of size S x N x K, or N x K if `mixture`
+            is True.
+        """
+        if self.is_built_coherence() is Build.NO:
+            raise GPflowError('Not built with "{graph}".'.format(graph=self.graph))
+
+        params = {param.full_name: param for param in self.parameters}
+        names = [name for name in trace.columns if name in params]
+        if not names:
+            raise ValueError('Trace does not contain any of the model parameters.')
+
+        session = self.enquire_session(session)
+        store = AutoFlow.get_autoflow(self, 'predict_f_trace')
+        key = tuple(names)
+        if key not in store:
+            scope_name = '/'.join(['autoflow', self.name, 'predict_f_trace'])
+            with session.graph.as_default(), tf.name_scope(scope_name):
+                store[key] = self._build_predict_trace([params[name] for name in names])
+        Xnew_tensor, sample_tensors, result = store[key]
+
+        values = [np.stack(trace[name].values) for name in names]
+        num_samples = len(trace)
+        batch_size = batch_size or num_samples
+
+        self.initialize(session=session)
+        means, variances = [], []
+        for start in range(0, num_samples, batch_size):
+            feed_dict = {Xnew_tensor: Xnew}
+            feed_dict.update({tensor: value[start:start + batch_size]
+                              for tensor, value in zip(sample_tensors, values)})
+            feed_dict.update(self.feeds)
+            mean, var = session.run(result, feed_dict=feed_dict)
+            means.append(mean)
+            variances.append(var)
+        means, variances = np.concatenate(means, 0), np.concatenate(variances, 0)
+
+        if mixture:
+            mean = np.mean(means, 0)
+            return mean, np.mean(variances + np.square(means), 0) - np.square(mean)
+        return means, variances
+
+    def _build_predict_trace(self, params):
+        Xnew = tf.placeholder(settings.float_type, [None, None])
+        samples = [tf.placeholder(param.dtype, (None,) + tuple(param.shape))
+                   for param in params]
+
+        def predict(values):
+            with _substitute_constrained_tensors(params, values):
+                return self._build_predict(Xnew)
+
+        dtypes = (settings.float_type, settings.float_type)
+        result = tf.map_fn(predict, samples, dtype=dtypes, back_prop=False)
+        return Xnew, samples, result
+
     @abc.abstractmethod
     def _build_predict(self, *args, **kwargs):
         raise NotImplementedError('') # TODO(@awav): write error message
+
+
+@contextlib.contextmanager
+def _substitute_constrained_tensors(params, tensors):
+    """
+    Temporarily replaces constrained tensors of the parameters, so that
+    methods decorated with `params_as_tensors` are built on top of the passed
+    tensors instead of the parameter variables.
+    """
+    previous = [param.constrained_tensor for param in params]
+    for param, tensor in zip(params, tensors):
+        param._constrained_tensor = tensor  # pylint: disable=W0212
+    try:
+        yield
+    finally:
+        for param, tensor in zip(params, previous):
+            param._constrained_tensor = tensor  # pylint: disable=W0212
@@ -16,6 +16,8 @@
 import numpy as np
 import tensorflow as tf
 
+from .. import misc
+from .. import settings
 from ..models.model import GPModel
 from ..features import inducingpoint_wrapper, conditional
 from ..params import Parameter, DataHolder
@@ -85,6 +87,32 @@ class SGPMC(GPModel):
         fmean, fvar = self._build_predict(self.X, full_cov=False)
         return tf.reduce_sum(self.likelihood.variational_expectations(fmean, fvar, self.Y))
 
+    @params_as_tensors
+    def build_latent_likelihood(self):
+        """
+        Construct a function which computes the same quantity as
+        `_build_likelihood` for arbitrary values of the whitened inducing
+        variables V, with the hyperparameters held fixed.
+
+        The projection onto the data and the marginal variances of q(f) do not
+        depend on V, so they are built once and shared by every call of the
+        returned function, e.g. by the proposals of `gpflow.train.ESS`.
+        """
+        Kuu = self.feature.Kuu(self.kern, jitter=settings.numerics.jitter_level)
+        Kuf = misc.upcast(self.feature.Kuf(self.kern, self.X))
+        L = tf.cholesky(Kuu)
+        A = tf.matrix_triangular_solve(L, Kuf, lower=True)
+        fvar = misc.upcast(self.kern.Kdiag(self.X)) - tf.reduce_sum(tf.square(A), 0)
+        fvar = tf.tile(tf.expand_dims(fvar, 1), tf.stack([1, tf.shape(self.V)[1]]))
+        mean = self.mean_function(self.X)
+        likelihood, Y = self.likelihood, self.Y
+
+        def latent_likelihood(V):
+            fmean = tf.matmul(A, V, transpose_a=True) + mean
+            return tf.reduce_sum(likelihood.variational_expectations(fmean, fvar, Y))
+
+        return latent_likelihood
+
     @params_as_tensors
     def _build_predict(self, Xnew, full_cov=False):
         """
@@ -17,6 +17,7 @@ from __future__ import absolute_import
 import tensorflow as tf
 import numpy as np
 
+from .. import misc
 from .. import settings
 from .. import likelihoods
 from .. import features
@@ -58,11 +59,12 @@ class SGPRUpperMixin(object):
     def compute_upper_bound(self):
         num_data = tf.cast(tf.shape(self.Y)[0], settings.float_type)
 
-        Kdiag = self.kern.Kdiag(self.X)
+        Kdiag = misc.upcast(self.kern.Kdiag(self.X))
         Kuu = self.feature.Kuu(self.kern, jitter=settings.numerics.jitter_level)
-        Kuf = self.feature.Kuf(self.kern, self.X)
+        Kuf = misc.upcast(self.feature.Kuf(self.kern, self.X))
 
-        L = tf.cholesky(Kuu)
+        L = misc.precompute(lambda: tf.cholesky(
+            self.feature.Kuu(self.kern, jitter=settings.numerics.jitter_level)))
         LB = tf.cholesky(Kuu + self.likelihood.variance ** -1.0 * tf.matmul(Kuf, Kuf, transpose_b=True))
 
         LinvKuf = tf.matrix_triangular_solve(L, Kuf, lower=True)
@@ -135,10 +137,10 @@ class SGPR(GPModel, SGPRUpperMixin):
         output_dim = tf.cast(tf.shape(self.Y)[1], settings.float_type)
 
         err = self.Y - self.mean_function(self.X)
-        Kdiag = self.kern.Kdiag(self.X)
-        Kuf = self.feature.Kuf(self.kern, self.X)
-        Kuu = self.feature.Kuu(self.kern, jitter=settings.numerics.jitter_level)
-        L = tf.cholesky(Kuu)
+        Kdiag = misc.upcast(self.kern.Kdiag(self.X))
+        Kuf = misc.upcast(self.feature.Kuf(self.kern, self.X))
+        L = misc.precompute(lambda: tf.cholesky(
+            self.feature.Kuu(self.kern, jitter=settings.numerics.jitter_level)))
         sigma = tf.sqrt(self.likelihood.variance)
 
         # Compute intermediate matrices
@@ -169,11 +171,11 @@ class SGPR(GPModel, SGPRUpperMixin):
         """
         num_inducing = len(self.feature)
         err = self.Y - self.mean_function(self.X)
-        Kuf = self.feature.Kuf(self.kern, self.X)
-        Kuu = self.feature.Kuu(self.kern, jitter=settings.numerics.jitter_level)
-        Kus = self.feature.Kuf(self.kern, Xnew)
+        Kuf = misc.upcast(self.feature.Kuf(self.kern, self.X))
+        Kus = misc.upcast(self.feature.Kuf(self.kern, Xnew))
         sigma = tf.sqrt(self.likelihood.variance)
-        L = tf.cholesky(Kuu)
+        L = misc.precompute(lambda: tf.cholesky(
+            self.feature.Kuu(self.kern, jitter=settings.numerics.jitter_level)))
         A = tf.matrix_triangular_solve(L, Kuf, lower=True) / sigma
         B = tf.matmul(A, A, transpose_b=True) + tf.eye(num_inducing, dtype=settings.float_type)
         LB = tf.cholesky(B)
@@ -183,12 +185,12 @@ class SGPR(GPModel, SGPRUpperMixin):
         tmp2 = tf.matrix_triangular_solve(LB, tmp1, lower=True)
         mean = tf.matmul(tmp2, c, transpose_a=True)
         if full_cov:
-            var = self.kern.K(Xnew) + tf.matmul(tmp2, tmp2, transpose_a=True) \
+            var = misc.upcast(self.kern.K(Xnew)) + tf.matmul(tmp2, tmp2, transpose_a=True) \
                   - tf.matmul(tmp1, tmp1, transpose_a=True)
             shape = tf.stack([1, 1, tf.shape(self.Y)[1]])
             var = tf.tile(tf.expand_dims(var, 2), shape)
         else:
-            var = self.kern.Kdiag(Xnew) + tf.reduce_sum(tf.square(tmp2), 0) \
+            var = misc.upcast(self.kern.Kdiag(Xnew)) + tf.reduce_sum(tf.square(tmp2), 0) \
                   - tf.reduce_sum(tf.square(tmp1), 0)
             shape = tf.stack([1, tf.shape(self.Y)[1]])
             var = tf.tile(tf.expand_dims(var, 1), shape)
@@ -236,11 +238,10 @@ class GPRFITC(GPModel, SGPRUpperMixin):
     def _build_common_terms(self):
         num_inducing = len(self.feature)
         err = self.Y - self.mean_function(self.X)  # size N x R
-        Kdiag = self.kern.Kdiag(self.X)
-        Kuf = self.feature.Kuf(self.kern, self.X)
-        Kuu = self.feature.Kuu(self.kern, jitter=settings.numerics.jitter_level)
-
-        Luu = tf.cholesky(Kuu)  # => Luu Luu^T = Kuu
+        Kdiag = misc.upcast(self.kern.Kdiag(self.X))
+        Kuf = misc.upcast(self.feature.Kuf(self.kern, self.X))
+        Luu = misc.precompute(lambda: tf.cholesky(
+            self.feature.Kuu(self.kern, jitter=settings.numerics.jitter_level)))  # => Luu Luu^T = Kuu
         V = tf.matrix_triangular_solve(Luu, Kuf)  # => V^T V = Qff = Kuf^T Kuu^-1 Kuf
 
         diagQff = tf.reduce_sum(tf.square(V), 0)
@@ -306,7 +307,7 @@ class GPRFITC(GPModel, SGPRUpperMixin):
         Xnew.
         """
         _, _, Luu, L, _, _, gamma = self._build_common_terms()
-        Kus = self.feature.Kuf(self.kern, Xnew)  # size  M x Xnew
+        Kus = misc.upcast(self.feature.Kuf(self.kern, Xnew))  # size  M x Xnew
 
         w = tf.matrix_triangular_solve(Luu, Kus, lower=True)  # size M x Xnew
 
@@ -315,11 +316,11 @@ class GPRFITC(GPModel, SGPRUpperMixin):
         intermediateA = tf.matrix_triangular_solve(L, w, lower=True)
 
         if full_cov:
-            var = self.kern.K(Xnew) - tf.matmul(w, w, transpose_a=True) \
+            var = misc.upcast(self.kern.K(Xnew)) - tf.matmul(w, w, transpose_a=True) \
                   + tf.matmul(intermediateA, intermediateA, transpose_a=True)
             var = tf.tile(tf.expand_dims(var, 2), tf.stack([1, 1, tf.shape(self.Y)[1]]))
         else:
-            var = self.kern.Kdiag(Xnew) - tf.reduce_sum(tf.square(w), 0) \
+            var = misc.upcast(self.kern.Kdiag(Xnew)) - tf.reduce_sum(tf.square(w), 0) \
                   + tf.reduce_sum(tf.square(intermediateA), 0)  # size Xnew,
             var = tf.tile(tf.expand_dims(var, 1), tf.stack([1, tf.shape(self.Y)[1]]))
 
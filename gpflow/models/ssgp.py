@@ -0,0 +1,177 @@
+# Copyright 2017 the GPflow authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import numpy as np
+import tensorflow as tf
+
+from .. import kernels
+from .. import likelihoods
+from .. import settings
+
+from ..params import Parameter
+from ..params import DataHolder
+from ..decors import params_as_tensors
+from ..decors import name_scope
+from ..decors import autoflow
+
+from .model import GPModel
+from .gpr import _linear_regression_posterior
+from .gpr import _linear_regression_likelihood
+from .gpr import _linear_regression_predict
+
+
+class SSGP(GPModel):
+    """
+    Sparse Spectrum Gaussian Process regression. The key reference is
+
+    ::
+
+      @article{lazaro2010sparse,
+        title={Sparse spectrum Gaussian process regression},
+        author={L{\\'a}zaro-Gredilla, Miguel and Qui{\\~n}onero-Candela, Joaquin
+                and Rasmussen, Carl Edward and Figueiras-Vidal, An{\\'\\i}bal R},
+        journal={Journal of Machine Learning Research},
+        volume={11},
+        pages={1865--1881},
+        year={2010}
+      }
+
+    The stationary kernel is approximated by F pairs of trigonometric basis
+    functions
+
+        phi(x) = sqrt(variance / F) [cos(W x / lengthscales), sin(W x / lengthscales)],
+
+    whose unit-lengthscale frequencies W are drawn from the spectral density
+    of the kernel (random Fourier features). The kernel variance and
+    lengthscales keep their meaning, and the frequencies can also be learnt
+    by making `frequencies` trainable. Regression is then Bayesian linear
+    regression on the 2F features, in O(N F^2) for the marginal likelihood
+    and O(F) (mean) or O(F^2) (variance) per prediction.
+    """
+    def __init__(self, X, Y, kern, num_frequencies=None, frequencies=None,
+                 mean_function=None, seed=0, **kwargs):
+        """
+        X is a data matrix, size N x D
+        Y is a data matrix, size N x R
+        kern is an RBF, Matern12, Matern32 or Matern52 kernel
+        num_frequencies is the number F of spectral frequencies to draw
+        frequencies is a matrix of initial unit-lengthscale frequencies,
+            size F x input_dim, drawn from the spectral density of the kernel
+            if None. They are not trainable by default.
+        seed is the seed of the random draw of the frequencies
+        """
+        if frequencies is None:
+            if num_frequencies is None:
+                raise ValueError("Either `num_frequencies` or `frequencies` must be given.")
+            rng = np.random.RandomState(seed)
+            frequencies = _sample_spectral_frequencies(kern, num_frequencies, rng)
+        likelihood = likelihoods.Gaussian()
+        X = DataHolder(X)
+        Y = DataHolder(Y)
+        GPModel.__init__(self, X, Y, kern, likelihood, mean_function, **kwargs)
+        self.num_latent = Y.shape[1]
+        self.frequencies = Parameter(frequencies, trainable=False)
+
+    @property
+    def num_frequencies(self):
+        return self.frequencies.shape[0]
+
+    @params_as_tensors
+    def _build_features(self, X):
+        """
+        Computes the 2F trigonometric features of the inputs X, size N x 2F.
+        """
+        X, _ = self.kern._slice(X, None)
+        XW = tf.matmul(X / self.kern.lengthscales, self.frequencies, transpose_b=True)
+        scale = tf.sqrt(self.kern.variance / tf.cast(tf.shape(XW)[1], settings.float_type))
+        return scale * tf.concat([tf.cos(XW), tf.sin(XW)], 1)
+
+    @params_as_tensors
+    def _build_weight_posterior(self):
+        """
+        Returns the Cholesky factor L of A = Phi^T Phi + noise_variance * I
+        and c = L^{-1} Phi^T (Y - m(X)), which determine the posterior of
+        the feature weights: N(L^{-T} c, noise_variance * A^{-1}).
+        """
+        Phi = self._build_features(self.X)
+        err = self.Y - self.mean_function(self.X)
+        L, c = _linear_regression_posterior(tf.matmul(Phi, Phi, transpose_a=True),
+                                            tf.matmul(Phi, err, transpose_a=True),
+                                            self.likelihood.variance)
+        return L, c, err
+
+    @name_scope('likelihood')
+    @params_as_tensors
+    def _build_likelihood(self):
+        """
+        Construct a tensorflow function to compute the marginal likelihood of
+        the Bayesian linear regression,
+
+            \log N(Y | m(X), Phi Phi^T + noise_variance * I),
+
+        through the matrix determinant lemma and the Woodbury identity.
+        """
+        L, c, err = self._build_weight_posterior()
+        return _linear_regression_likelihood(L, c, err, self.likelihood.variance)
+
+    @name_scope('predict')
+    @params_as_tensors
+    def _build_predict(self, Xnew, full_cov=False):
+        """
+        Compute the mean and variance of the latent function at the points
+        Xnew, from the posterior of the feature weights.
+        """
+        L, c, _ = self._build_weight_posterior()
+        PhiT = tf.transpose(self._build_features(Xnew))
+        fmean, fvar = _linear_regression_predict(L, c, PhiT, self.likelihood.variance,
+                                                 full_cov=full_cov)
+        return fmean + self.mean_function(Xnew), fvar
+
+    @autoflow((settings.float_type, [None, None]), (tf.int32, []))
+    @params_as_tensors
+    def predict_f_samples(self, Xnew, num_samples):
+        """
+        Produce samples from the posterior latent function(s) at the points
+        Xnew. The feature weights are sampled instead of the function values,
+        so the cost is O(N F) per sample and no N x N matrix is formed.
+        """
+        L, c, _ = self._build_weight_posterior()
+        Phi = self._build_features(Xnew)
+        samples = []
+        for i in range(self.num_latent):
+            shape = tf.stack([tf.shape(L)[0], num_samples])
+            V = tf.random_normal(shape, dtype=settings.float_type)
+            V = c[:, i:i + 1] + tf.sqrt(self.likelihood.variance) * V
+            weights = tf.matrix_triangular_solve(tf.transpose(L), V, lower=False)
+            samples.append(tf.matmul(Phi, weights))
+        return tf.transpose(tf.stack(samples)) + self.mean_function(Xnew)
+
+
+def _sample_spectral_frequencies(kern, num_frequencies, rng):
+    """
+    Draws frequencies from the spectral density of a unit-lengthscale kernel:
+    the standard normal for the RBF kernel, and the multivariate Student-t
+    with 2 nu degrees of freedom for the Matern nu kernels.
+    """
+    shape = (num_frequencies, kern.input_dim)
+    if isinstance(kern, kernels.RBF):
+        return rng.randn(*shape)
+    nus = [(kernels.Matern12, 0.5), (kernels.Matern32, 1.5), (kernels.Matern52, 2.5)]
+    for kern_class, nu in nus:
+        if isinstance(kern, kern_class):
+            u = rng.chisquare(2. * nu, size=(num_frequencies, 1))
+            return rng.randn(*shape) / np.sqrt(u / (2. * nu))
+    raise NotImplementedError(
+        "Sparse spectrum approximation not implemented for `%s`." % str(type(kern)))
@@ -17,12 +17,16 @@ from __future__ import absolute_import
 import tensorflow as tf
 import numpy as np
 
+from .. import misc
 from .. import settings
 from .. import transforms
 from .. import conditionals
 from .. import kullback_leiblers, features
+from .. import likelihoods
+from .. import mean_functions
 
 from ..params import Parameter
+from ..params import ParamList
 from ..params import Minibatch
 from ..params import DataHolder
 
@@ -63,13 +67,18 @@ class SVGP(GPModel):
         - num_latent is the number of latent process to use, default to
           Y.shape[1]
         - q_diag is a boolean. If True, the covariance is approximated by a
-          diagonal matrix.
+          diagonal matrix. Otherwise, for `KroneckerInducingPoints` the
+          covariance is a Kronecker product with one lower triangular factor
+          per grid axis.
         - whiten is a boolean. If True, we use the whitened representation of
           the inducing points.
         - minibatch_size, if not None, turns on mini-batching with that size.
         - num_data is the total number of observations, default to X.shape[0]
           (relevant when feeding in external minibatches)
         """
+        if minibatch_size is not None and _sorted_labels(likelihood, mean_function):
+            raise ValueError("Minibatches shuffle the data, their labels cannot be sorted.")
+
         # sort out the X, Y into MiniBatch objects if required.
         if minibatch_size is None:
             X = DataHolder(X)
@@ -91,18 +100,37 @@ class SVGP(GPModel):
         if self.q_diag:
             self.q_sqrt = Parameter(np.ones((num_inducing, self.num_latent), dtype=settings.float_type),
                                 transforms.positive)
+        elif isinstance(self.feature, features.KroneckerInducingPoints):
+            self.q_sqrt = ParamList([self._init_q_sqrt(m) for m in self.feature.grid_shape])
         else:
-            q_sqrt = np.array([np.eye(num_inducing, dtype=settings.float_type)
-                               for _ in range(self.num_latent)]).swapaxes(0, 2)
-            self.q_sqrt = Parameter(q_sqrt, transform=transforms.LowerTriangular(num_inducing, self.num_latent))
+            self.q_sqrt = self._init_q_sqrt(num_inducing)
+
+    def _init_q_sqrt(self, num_inducing):
+        q_sqrt = np.array([np.eye(num_inducing, dtype=settings.float_type)
+                           for _ in range(self.num_latent)]).swapaxes(0, 2)
+        return Parameter(q_sqrt, transform=transforms.LowerTriangular(num_inducing, self.num_latent))
+
+    @params_as_tensors
+    def _build_q_sqrt(self):
+        if isinstance(self.q_sqrt, ParamList):
+            return [self.q_sqrt[d] for d in range(len(self.q_sqrt))]
+        return self.q_sqrt
 
     @params_as_tensors
     def build_prior_KL(self):
-        if self.whiten:
-            K = None
-        else:
-            K = self.feature.Kuu(self.kern, jitter=settings.numerics.jitter_level)
-        return kullback_leiblers.gauss_kl(self.q_mu, self.q_sqrt, K)
+        q_sqrt = self._build_q_sqrt()
+        if self.whiten and not isinstance(q_sqrt, list):
+            return kullback_leiblers.gauss_kl(self.q_mu, q_sqrt, None)
+        if isinstance(self.feature, features.KroneckerInducingPoints):
+            K = None if self.whiten else self.feature.Kuu_factors(
+                self.kern, jitter=settings.numerics.jitter_level)
+            return kullback_leiblers.gauss_kl_kron(self.q_mu, q_sqrt, K)
+        if isinstance(self.feature, features.FourierFeatures1D):
+            d, V = self.feature.Kuu_diag_low_rank(self.kern, jitter=settings.numerics.jitter_level)
+            return kullback_leiblers.gauss_kl_diag_low_rank(self.q_mu, q_sqrt, d, V)
+        K = misc.precompute(
+            lambda: self.feature.Kuu(self.kern, jitter=settings.numerics.jitter_level))
+        return kullback_leiblers.gauss_kl(self.q_mu, q_sqrt, K)
 
     @params_as_tensors
     def _build_likelihood(self):
@@ -127,5 +155,15 @@ class SVGP(GPModel):
     @params_as_tensors
     def _build_predict(self, Xnew, full_cov=False):
         mu, var = features.conditional(self.feature, self.kern, Xnew, self.q_mu,
-                                       q_sqrt=self.q_sqrt, full_cov=full_cov, white=self.whiten)
+                                       q_sqrt=self._build_q_sqrt(), full_cov=full_cov,
+                                       white=self.whiten)
         return mu + self.mean_function(Xnew), var
+
+
+def _sorted_labels(likelihood, mean_function):
+    """
+    Whether a switched likelihood or mean function expects sorted labels.
+    """
+    switched = [(likelihood, likelihoods.SwitchedLikelihood),
+                (mean_function, mean_functions.SwitchedMeanFunction)]
+    return any(isinstance(obj, cls) and obj.labels_sorted for obj, cls in switched)
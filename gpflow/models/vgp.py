@@ -16,6 +16,7 @@ from __future__ import absolute_import
 import tensorflow as tf
 import numpy as np
 
+from .. import misc
 from .. import settings
 from .. import transforms
 
@@ -105,7 +106,7 @@ class VGP(GPModel):
         KL = gauss_kl(self.q_mu, self.q_sqrt)
 
         # Get conditionals
-        K = self.kern.K(self.X) + tf.eye(self.num_data, dtype=settings.float_type) * \
+        K = misc.upcast(self.kern.K(self.X)) + tf.eye(self.num_data, dtype=settings.float_type) * \
             settings.numerics.jitter_level
         L = tf.cholesky(K)
 
@@ -205,7 +206,7 @@ class VGP_opper_archambeau(GPModel):
         with
             q(f) = N(f | K alpha + mean, [K^-1 + diag(square(lambda))]^-1) .
         """
-        K = self.kern.K(self.X)
+        K = misc.upcast(self.kern.K(self.X))
         K_alpha = tf.matmul(K, self.q_alpha)
         f_mean = K_alpha + self.mean_function(self.X)
 
@@ -241,8 +242,8 @@ class VGP_opper_archambeau(GPModel):
         """
 
         # compute kernel things
-        Kx = self.kern.K(self.X, Xnew)
-        K = self.kern.K(self.X)
+        Kx = misc.upcast(self.kern.K(self.X, Xnew))
+        K = misc.upcast(self.kern.K(self.X))
 
         # predictive mean
         f_mean = tf.matmul(Kx, self.q_alpha, transpose_a=True) + self.mean_function(Xnew)
@@ -253,7 +254,7 @@ class VGP_opper_archambeau(GPModel):
         Kx_tiled = tf.tile(tf.expand_dims(Kx, 0), [self.num_latent, 1, 1])
         LiKx = tf.matrix_triangular_solve(L, Kx_tiled)
         if full_cov:
-            f_var = self.kern.K(Xnew) - tf.matmul(LiKx, LiKx, transpose_a=True)
+            f_var = misc.upcast(self.kern.K(Xnew)) - tf.matmul(LiKx, LiKx, transpose_a=True)
         else:
-            f_var = self.kern.Kdiag(Xnew) - tf.reduce_sum(tf.square(LiKx), 1)
+            f_var = misc.upcast(self.kern.Kdiag(Xnew)) - tf.reduce_sum(tf.square(LiKx), 1)
         return f_mean, tf.transpose(f_var)
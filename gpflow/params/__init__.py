@@ -18,6 +18,7 @@ from __future__ import absolute_import
 
 from .parameter import Parameter
 from .dataholders import DataHolder
+from .dataholders import SparseDataHolder
 from .dataholders import Minibatch
 from .parameterized import Parameterized
 from .paramlist import ParamList
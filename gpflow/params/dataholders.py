@@ -17,6 +17,8 @@
 # limitations under the License.
 
 
+import numpy as np
+import scipy.sparse
 import tensorflow as tf
 
 from .. import misc
@@ -36,6 +38,8 @@ class DataHolder(Parameter):
 
     :param value: Data input value. It can be a float, an integer,
         a float or integer like list, numpy array or TensorFlow variable.
+        A `scipy.sparse` matrix or a `tf.SparseTensorValue` makes a
+        `SparseDataHolder`.
     :param dtype: Type of new data holder.
     :param fix_shape: Default value is `False` and indicates that shape
         of internal tensor does not have specific shape, in other words,
@@ -45,6 +49,11 @@ class DataHolder(Parameter):
     :raises: ValueError exception if value is not valid.
     """
 
+    def __new__(cls, value=None, *args, **kwargs):
+        if cls is DataHolder and misc.is_sparse(value):
+            cls = SparseDataHolder
+        return super().__new__(cls)
+
     def __init__(self, value, dtype=None, fix_shape=False, name=None):
         self._dataholder_tensor = None
         super().__init__(value=value, name=name, dtype=dtype, fix_shape=fix_shape)
@@ -110,6 +119,106 @@ class DataHolder(Parameter):
         return self._format_parameter(shape=self.shape)
 
 
+class SparseDataHolder(DataHolder):
+    """
+    SparseDataHolder keeps a sparse data matrix as the indices, values and
+    dense shape of its non-zero entries, in three variables. Its tensor is a
+    `tf.SparseTensor`, which is accepted by the kernels supporting sparse
+    inputs, e.g. `Linear` and `Polynomial`.
+
+    `DataHolder` creates a sparse data holder when the value is sparse, so
+    that models taking data holders of their inputs accept sparse inputs.
+
+    :param value: `scipy.sparse` matrix or `tf.SparseTensorValue`.
+    :param dtype: Type of the values of the new data holder.
+    :param name: Name of the data holder.
+
+    :raises: ValueError exception if value is not a sparse matrix.
+    """
+
+    _SPARSE_PARTS = ('indices', 'values', 'dense_shape')
+
+    def __init__(self, value, dtype=None, fix_shape=False, name=None):
+        if fix_shape:
+            raise ValueError('Sparse data holder cannot have fixed shape.')
+        super().__init__(value, dtype=dtype, fix_shape=False, name=name)
+
+    @property
+    def initializables(self):
+        if self._sparse_variables is None:
+            return None
+        return list(zip(self._sparse_variables, self._sparse_initialized_tensors))
+
+    @property
+    def initializable_feeds(self):
+        if self._sparse_variables is None:
+            return None
+        return dict(zip(self._initial_value_tensor, self._sparse_parts(self._value)))
+
+    def fix_shape(self):
+        raise NotImplementedError('Sparse data holder cannot have fixed shape.')
+
+    def _valid_input(self, value, dtype=None):
+        if not misc.is_sparse(value):
+            raise ValueError('The value must be a sparse matrix.')
+        if hasattr(self, '_value'):
+            if dtype is not None and dtype != self.dtype:
+                msg = 'Overriding parameter\'s type "{0}" with "{1}" is not possible.'
+                raise ValueError(msg.format(self.dtype, dtype))
+            dtype = self.dtype
+        if isinstance(value, tf.SparseTensorValue):
+            indices = np.asarray(value.indices)
+            value = scipy.sparse.coo_matrix(
+                (value.values, (indices[:, 0], indices[:, 1])), shape=tuple(value.dense_shape))
+        dtype = value.dtype if dtype is None else dtype
+        # Row-major order of the entries without duplicates, as some sparse
+        # TensorFlow operations expect.
+        value = scipy.sparse.csr_matrix(value, dtype=dtype)
+        value.sum_duplicates()
+        return value.tocoo()
+
+    def _clear(self):
+        super()._clear()
+        self._sparse_variables = None
+        self._sparse_initialized_tensors = None
+
+    def _build(self):
+        variables, inits = [], []
+        for part, value in zip(self._SPARSE_PARTS, self._sparse_parts(self._value)):
+            init = tf.placeholder(value.dtype, shape=[None] * value.ndim, name='initial_' + part)
+            name = misc.tensor_name(self._parameter_name(), part)
+            if misc.get_variable_by_name(name) is not None:
+                raise GPflowError('Tensor with name "{name}" already exists.'.format(name=name))
+            variables.append(tf.get_variable(name, initializer=init,
+                                             validate_shape=False, trainable=False))
+            inits.append(init)
+        indices, values, dense_shape = variables
+        initialized = [tf.is_variable_initialized(v) for v in variables]
+        self._sparse_variables = variables
+        self._sparse_initialized_tensors = initialized
+        self._initial_value_tensor = inits
+        self._is_initialized_tensor = tf.reduce_all(tf.stack(initialized))
+        self._dataholder_tensor = tf.SparseTensor(indices, values, dense_shape)
+
+    def _init_parameter_defaults(self):
+        super()._init_parameter_defaults()
+        self._sparse_variables = None
+        self._sparse_initialized_tensors = None
+
+    def _read_parameter_tensor(self, session):
+        indices, values, dense_shape = session.run(self._sparse_variables)
+        return scipy.sparse.coo_matrix(
+            (values, (indices[:, 0], indices[:, 1])), shape=tuple(dense_shape))
+
+    def _parameter_name(self):
+        return misc.tensor_name(self.hidden_full_name, 'sparse_dataholder')
+
+    @staticmethod
+    def _sparse_parts(value):
+        indices = np.stack([value.row, value.col], axis=1).astype(np.int64)
+        return indices, value.data, np.array(value.shape, dtype=np.int64)
+
+
 class Minibatch(DataHolder):
     """
     Minibatch is a special case of data holders. As the name implies the minibatch
@@ -263,6 +263,10 @@ class Parameter(Node):
             else:
                 misc.remove_from_trainables(self.parameter_tensor, graph)
 
+            if misc.get_precomputations([self.parameter_tensor], graph):
+                session = self.enquire_session()
+                misc.update_precomputations(self.parameter_tensor, session)
+
         object.__setattr__(self, 'trainable', value)
 
     def assign(self, value, session=None, dtype=None, force=True):
@@ -278,6 +282,7 @@ class Parameter(Node):
         if self.is_built_coherence() is Build.YES:
             session = self.enquire_session(session)
             self.initialize(session=session, force=force)
+            misc.invalidate_precomputations(self.parameter_tensor, session)
 
     def read_value(self, session=None):
         if session is not None and not isinstance(session, tf.Session):
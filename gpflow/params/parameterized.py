@@ -154,6 +154,7 @@ class Parameterized(Node):
         inits = []
         get_initializables(self.parameters, inits)
         get_initializables(self.data_holders, inits)
+        get_initializables(self._precomputations, inits)
         return inits
 
     @property
@@ -166,8 +167,17 @@ class Parameterized(Node):
         feeds = {}
         get_initializable_feeds(self.parameters, feeds)
         get_initializable_feeds(self.data_holders, feeds)
+        get_initializable_feeds(self._precomputations, feeds)
         return feeds
 
+    @property
+    def _precomputations(self):
+        graph = self.graph
+        if graph is None:
+            return []
+        params = list(self.parameters) + list(self.data_holders)
+        return misc.get_precomputations([p.parameter_tensor for p in params], graph)
+
     @property
     def graph(self):
         for param in self.params:
@@ -308,7 +318,8 @@ class Parameterized(Node):
             self._set_param(name, value)
             param.set_parent()
             param.set_name()
-        elif isinstance(param, Parameter) and misc.is_valid_param_value(value):
+        elif isinstance(param, Parameter) and (misc.is_valid_param_value(value) or
+                                               misc.is_sparse(value)):
             param.assign(value)
         else:
             msg = '"{0}" type cannot be assigned to "{1}".'
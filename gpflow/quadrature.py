@@ -1,16 +1,123 @@
 from __future__ import print_function, absolute_import
 import itertools
+from collections import defaultdict
+from math import factorial
 
 import tensorflow as tf
 import numpy as np
+from scipy.special import ndtri
 
+from . import misc
 from . import settings
 
 
+# Process-wide cache of quadrature points and weights. The arrays are
+# read-only, since they are shared between all callers.
+_rule_cache = {}
+
+
+def _cached(key, build):
+    key = key + (np.dtype(settings.float_type),)
+    if key not in _rule_cache:
+        arrays = tuple(np.array(a, dtype=settings.float_type) for a in build())
+        for a in arrays:
+            a.setflags(write=False)
+        _rule_cache[key] = arrays
+    return _rule_cache[key]
+
+
+def _constants(key, arrays):
+    """
+    Returns the `arrays` as constants of the default graph. The constants are
+    created once per graph and `key`, outside of any name scope and control
+    dependencies, so that all quadratures using the same rule share them.
+    Constants requested inside a control flow context, e.g. the body of a
+    while loop, cannot be shared and are created anew.
+    """
+    if misc.in_control_flow():
+        return tuple(tf.constant(a) for a in arrays)
+    constants = misc.get_graph_cache('quadrature')
+    key = key + (np.dtype(settings.float_type),)
+    if key not in constants:
+        with tf.control_dependencies(None), tf.name_scope('quadrature/'):
+            constants[key] = tuple(tf.constant(a) for a in arrays)
+    return constants[key]
+
+
 def hermgauss(n):
-    x, w = np.polynomial.hermite.hermgauss(n)
-    x, w = x.astype(settings.float_type), w.astype(settings.float_type)
-    return x, w
+    """
+    Gauss-Hermite points and weights for int exp(-x**2) f(x) dx. The result
+    is cached and must not be modified.
+    """
+    return _cached(('hermgauss', n), lambda: np.polynomial.hermite.hermgauss(n))
+
+
+def hermgauss_constants(n):
+    """
+    Graph constants of `hermgauss(n)`, shared within the default graph.
+    """
+    return _constants(('hermgauss', n), hermgauss(n))
+
+
+# Nested Genz-Keister rules for int exp(-x**2) f(x) dx / sqrt(pi). Level l
+# keeps the points of level l-1 and adds the nonnegative points
+# _GENZ_KEISTER_NODES[l] and their negatives. _GENZ_KEISTER_WEIGHTS[l] holds
+# the weights of level l for the nonnegative points of all levels up to l, in
+# the order they are added.
+GENZ_KEISTER_NUM_POINTS = (1, 3, 9, 19, 35)
+_GENZ_KEISTER_NODES = [
+    [0.0],
+    [1.224744871391589],
+    [0.5240335474869576, 2.0232301911005157, 2.9592107790638376],
+    [0.8700408953529029, 1.8357079751751868, 2.266513262056788, 3.667774215946338,
+     4.499599398310389],
+    [0.17606414208200893, 1.5794121348467671, 2.5705583765842968, 3.349163953713195,
+     4.029220140504371, 5.036089944473094, 5.643257857885745, 6.375939270982236],
+]
+_GENZ_KEISTER_WEIGHTS = [
+    [1.0],
+    [0.6666666666666666, 0.16666666666666666],
+    [0.25396825396825395, 0.0948509485094851, 0.27007432957793787, 0.007996325470893533,
+     9.426945755651748e-05],
+    [0.3034671998542059, 0.06409605468680758, 0.20832499164960888, -0.0063372247933737354,
+     6.012336945984782e-05, 0.061151730125247675, 0.018085234254798452, 0.002884880436506751,
+     6.094808731468983e-07, 8.629684602229886e-10],
+    [0.0005148945080687843, 0.045273685465150516, 0.148070831155216, 0.00231134524035221,
+     3.57293481989751e-05, 0.09236472671698631, 0.003155446269187564, 0.0008189539275022649,
+     2.4676421345798077e-07, 4.6011760348656186e-10, 0.19176011588804442, 0.01567347375185115,
+     0.0002752421411678516, 2.734220680118783e-06, 2.1394194479561105e-08,
+     3.097222357606316e-12, 5.45004126506369e-15, 1.0541326582333341e-18],
+]
+
+
+def genz_keister(level):
+    """
+    Points and weights of the nested Genz-Keister rule of `level` for
+    int exp(-x**2) f(x) dx / sqrt(pi). The rules of the levels 0 to 4 have
+    1, 3, 9, 19 and 35 points and are exact for polynomials of degree 1, 5,
+    15, 29 and 51. Some of the weights of level 3 are negative.
+
+    :return: the points added by `level`, and the weights of the rule of
+        `level` for the points added by the levels 0 to `level`, concatenated
+        in this order. The result is cached and must not be modified.
+    """
+    def build():
+        nodes = _GENZ_KEISTER_NODES[level]
+        points = nodes if level == 0 else nodes + [-x for x in nodes]
+        weights, start = [], 0
+        for l, nodes in enumerate(_GENZ_KEISTER_NODES[:level + 1]):
+            w = _GENZ_KEISTER_WEIGHTS[level][start:start + len(nodes)]
+            weights += w if l == 0 else w + w
+            start += len(nodes)
+        return points, weights
+    return _cached(('genz_keister', level), build)
+
+
+def genz_keister_constants(level):
+    """
+    Graph constants of `genz_keister(level)`, shared within the default graph.
+    """
+    return _constants(('genz_keister', level), genz_keister(level))
 
 
 def mvhermgauss(H, D):
@@ -25,13 +132,138 @@ def mvhermgauss(H, D):
     :param D: Number of input dimensions. Needs to be known at call-time.
     :return: eval_locations 'x' (H**DxD), weights 'w' (H**D)
     """
-    gh_x, gh_w = hermgauss(H)
-    x = np.array(list(itertools.product(*(gh_x,) * D)))  # H**DxD
-    w = np.prod(np.array(list(itertools.product(*(gh_w,) * D))), 1)  # H**D
-    return x, w
+    def build():
+        gh_x, gh_w = hermgauss(H)
+        x = np.array(list(itertools.product(*(gh_x,) * D)))  # H**DxD
+        w = np.prod(np.array(list(itertools.product(*(gh_w,) * D))), 1)  # H**D
+        return x, w
+    return _cached(('mvhermgauss', H, D), build)
+
+
+class QuadratureRule(object):
+    """
+    Base class for rules approximating expectations under the standard
+    multivariate normal distribution,
+
+        E[f(x)] ~ sum_i w[i] * f(x[i, :]),    x ~ N(0, I).
+
+    Rules may be passed to `mvnquad` in place of the Gauss-Hermite grid.
+    Subclasses implement `_points_and_weights`; the results are cached for
+    every combination of rule parameters, D and float type.
+    """
+
+    def points_and_weights(self, D):
+        """
+        :param D: Number of input dimensions.
+        :return: eval_locations 'x' (PxD), weights 'w' (P). The arrays are
+            cached and must not be modified.
+        """
+        return _cached(self._key(D), lambda: self._points_and_weights(D))
+
+    def constants(self, D):
+        """
+        Graph constants of `points_and_weights(D)`, shared within the default
+        graph.
+        """
+        return _constants(self._key(D), self.points_and_weights(D))
+
+    def _key(self, D):
+        return (type(self), tuple(sorted(vars(self).items())), D)
+
+    def _points_and_weights(self, D):
+        raise NotImplementedError  # pragma: no cover
+
+
+class GaussHermite(QuadratureRule):
+    """
+    Tensor product Gauss-Hermite rule with H points per dimension, H**D points
+    in total.
+    """
+
+    def __init__(self, H):
+        self.H = H
+
+    def _points_and_weights(self, D):
+        x, w = mvhermgauss(self.H, D)
+        return 2.0 ** 0.5 * x, w * np.pi ** (-D * 0.5)
+
+
+class SmolyakGaussHermite(QuadratureRule):
+    """
+    Smolyak sparse grid built from Gauss-Hermite rules with 2l-1 points at
+    level l. The rule is exact for polynomials of total degree 2*level-1 and
+    the number of points grows polynomially with D. Some of the weights are
+    negative.
+    """
+
+    def __init__(self, level):
+        self.level = level
+
+    def _points_and_weights(self, D):
+        q = self.level + D - 1
+        grid = defaultdict(float)
+        for index in _compositions(D, self.level, q):
+            coeff = (-1) ** (q - sum(index)) * _binomial(D - 1, q - sum(index))
+            rules = [GaussHermite(2 * l - 1).points_and_weights(1) for l in index]
+            for point in itertools.product(*[zip(x[:, 0], w) for x, w in rules]):
+                x = tuple(np.round([p[0] for p in point], 12))
+                grid[x] += coeff * np.prod([p[1] for p in point])
+        x = np.array(list(grid.keys()), dtype=settings.float_type)
+        w = np.array(list(grid.values()), dtype=settings.float_type)
+        return x, w
 
 
-def mvnquad(func, means, covs, H, Din, Dout=()):
+class Unscented(QuadratureRule):
+    """
+    Unscented transform with 2D+1 sigma points, exact for polynomials of
+    degree 3.
+    """
+
+    def __init__(self, kappa=1.):
+        self.kappa = kappa
+
+    def _points_and_weights(self, D):
+        scale = np.sqrt(D + self.kappa)
+        eye = np.eye(D, dtype=settings.float_type)
+        x = np.concatenate([np.zeros((1, D), dtype=settings.float_type), scale * eye, -scale * eye])
+        w = np.full(2 * D + 1, 0.5 / (D + self.kappa), dtype=settings.float_type)
+        w[0] = self.kappa / (D + self.kappa)
+        return x, w
+
+
+class SphericalRadial(QuadratureRule):
+    """
+    Third degree spherical-radial cubature with 2D points.
+    """
+
+    def _points_and_weights(self, D):
+        eye = np.eye(D, dtype=settings.float_type)
+        x = np.sqrt(D) * np.concatenate([eye, -eye])
+        w = np.full(2 * D, 0.5 / D, dtype=settings.float_type)
+        return x, w
+
+
+class QuasiMonteCarlo(QuadratureRule):
+    """
+    Randomised quasi-Monte Carlo rule with equal weights: the Halton sequence
+    shifted by a uniform random vector modulo one (Cranley-Patterson
+    rotation) and mapped through the normal inverse CDF. The shift is drawn
+    from a generator seeded with `seed`, so the rule is deterministic.
+    """
+
+    def __init__(self, num_points, seed=0):
+        self.num_points = num_points
+        self.seed = seed
+
+    def _points_and_weights(self, D):
+        shift = np.random.RandomState(self.seed).rand(D)
+        u = np.mod(_halton(self.num_points, D) + shift, 1.)
+        x = ndtri(u).astype(settings.float_type)
+        w = np.full(self.num_points, 1. / self.num_points, dtype=settings.float_type)
+        return x, w
+
+
+def mvnquad(func, means, covs, H, Din, Dout=(), rule=None):
     """
     Computes N Gaussian expectation integrals of a single function 'f'
     using Gauss-Hermite quadrature.
@@ -42,19 +274,63 @@ def mvnquad(func, means, covs, H, Din, Dout=()):
     :param Din: Number of input dimensions. Needs to be known at call-time.
     :param Dout: Number of output dimensions. Defaults to (). Dout is assumed
     to leave out the item index, i.e. f actually maps (?xD)->(?x*Dout).
+    :param rule: `QuadratureRule` used instead of the Gauss-Hermite grid with
+    H points per dimension.
     :return: quadratures (N,*Dout)
     """
-    xn, wn = mvhermgauss(H, Din)
+    rule = GaussHermite(H) if rule is None else rule
+    P = len(rule.points_and_weights(Din)[1])
+    xn, wn = rule.constants(Din)
     N = tf.shape(means)[0]
 
     # transform points based on Gaussian parameters
     cholXcov = tf.cholesky(covs)  # NxDxD
-    Xt = tf.matmul(cholXcov, tf.tile(xn[None, :, :], (N, 1, 1)), transpose_b=True)  # NxDxH**D
-    X = 2.0 ** 0.5 * Xt + tf.expand_dims(means, 2)  # NxDxH**D
-    Xr = tf.reshape(tf.transpose(X, [2, 0, 1]), (-1, Din))  # (H**D*N)xD
+    Xt = tf.matmul(cholXcov, tf.tile(xn[None, :, :], (N, 1, 1)), transpose_b=True)  # NxDxP
+    X = Xt + tf.expand_dims(means, 2)  # NxDxP
+    Xr = tf.reshape(tf.transpose(X, [2, 0, 1]), (-1, Din))  # (P*N)xD
 
     # perform quadrature
-    fX = tf.reshape(func(Xr), (H ** Din, N,) + Dout)
-    wr = np.reshape(wn * np.pi ** (-Din * 0.5),
-                    (-1,) + (1,) * (1 + len(Dout)))
+    fX = tf.reshape(func(Xr), (P, N,) + Dout)
+    wr = tf.reshape(wn, (-1,) + (1,) * (1 + len(Dout)))
     return tf.reduce_sum(fX * wr, 0)
+
+
+def _compositions(D, low, high):
+    """
+    Multi-indices of D positive integers with sum between low and high.
+    """
+    if D == 1:
+        for l in range(max(low, 1), high + 1):
+            yield (l,)
+        return
+    for l in range(1, high - D + 2):
+        for rest in _compositions(D - 1, low - l, high - l):
+            yield (l,) + rest
+
+
+def _binomial(n, k):
+    return factorial(n) // (factorial(k) * factorial(n - k))
+
+
+def _halton(num_points, D):
+    primes = _primes(D)
+    points = np.empty((num_points, D))
+    for d, base in enumerate(primes):
+        for i in range(num_points):
+            n, f, value = i + 1, 1., 0.
+            while n > 0:
+                f /= base
+                value += f * (n % base)
+                n //= base
+            points[i, d] = value
+    return points
+
+
+def _primes(num):
+    primes = []
+    candidate = 2
+    while len(primes) < num:
+        if all(candidate % p for p in primes):
+            primes.append(candidate)
+        candidate += 1
+    return primes
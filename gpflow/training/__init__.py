@@ -2,4 +2,5 @@
 
 from .scipy_optimizer import ScipyOptimizer
 from .hmc import HMC
+from .ess import ESS
 from .tensorflow_optimizer import *
@@ -0,0 +1,192 @@
+# Copyright 2017 the GPflow authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import tensorflow as tf
+import pandas as pd
+
+from .. import priors
+from .. import transforms
+from ..decors import name_scope
+
+from .optimizer import Optimizer
+from .hmc import _thinning, _while_loop
+
+
+class ESS(Optimizer):
+    def sample(self, model, num_samples, thin=1, burn=0, hmc_options=None,
+               session=None, initialize=True, anchor=True, logprobs=True):
+        """
+        Elliptical slice sampling of the whitened latent variables `V` of
+        models such as GPMC and SGPMC. The key reference is
+
+        ::
+
+          @inproceedings{murray2010elliptical,
+            title={Elliptical slice sampling},
+            author={Murray, Iain and Adams, Ryan Prescott and MacKay, David JC},
+            booktitle={Proceedings of AISTATS},
+            year={2010}
+          }
+
+        The latent variables must have the standard normal prior N(0, I), which
+        is what makes the sampler free of tuning parameters: every update
+        proposes points on the ellipse
+
+            V' = V cos(theta) + nu sin(theta),    nu ~ N(0, I)
+
+        and shrinks the bracket of `theta` until the proposal is accepted.
+        Only the likelihood term is evaluated and no gradients are needed.
+
+        The gpflow model must implement `build_latent_likelihood` method, which
+        returns a function that computes log p(Y | V, theta) for a given tensor
+        V. The hyperparameters are held at their current values within one
+        elliptical slice update.
+
+        When `hmc_options` is passed, the elliptical slice updates of `V` are
+        alternated with HMC updates of the remaining trainable parameters
+        (Gibbs sampling). The dictionary holds `epsilon`, `lmin` and `lmax`
+        options with the same meaning as in `HMC.sample`.
+
+        The total number of iterations is given by:
+
+            burn + thin * num_samples
+
+        :param model: gpflow model with `build_latent_likelihood` method and
+            latent parameter `V`.
+        :param num_samples: number of samples to generate.
+        :param thin: an integer which specifies the thinning interval.
+        :param burn: an integer which specifies how many initial samples to discard.
+        :param hmc_options: dictionary with HMC options for sampling of the
+            other trainable parameters. If it is None, only `V` is sampled.
+        :param session: TensorFlow session. The default session or cached GPflow session
+            will be used if it is none.
+        :param initialize: indication either TensorFlow initialization is required or not.
+        :param anchor: dump live trainable values computed within specified TensorFlow
+            session to actual parameters (in python scope).
+        :param logprobs: indicates either logprob values shall be included in output or not.
+
+        :return: data frame with `num_samples` traces, where columns are full names of
+            sampled parameters except last column, which is `logprobs`.
+            Parameters are represented as constrained values in output.
+
+        :raises: ValueError exception in case when wrong parameter ranges were passed
+            or the latent parameter does not have the standard normal prior.
+        """
+
+        if thin <= 0:
+            raise ValueError('The thin parameter must be greater zero.')
+        if burn < 0:
+            raise ValueError('The burn parameter must be equal or greater zero.')
+
+        latent = model.V
+        _check_latent(latent)
+
+        session = model.enquire_session(session)
+        model.initialize(session=session, force=initialize)
+
+        with session.graph.as_default(), tf.name_scope('ess'):
+            params = [latent]
+            loglik_fn = model.build_latent_likelihood()
+            step_ops = [_elliptical_slice(latent.parameter_tensor, loglik_fn)]
+
+            if hmc_options is not None:
+                hypers = [p for p in model.trainable_parameters if p is not latent]
+                params += hypers
+                if hypers:
+                    step_ops.append(_hmc_step(model, hypers, **hmc_options))
+
+            trace_tensors = [param.constrained_tensor for param in params]
+            logprob_tensor = tf.negative(model.objective)
+
+        feed_dict = model.feeds
+
+        def step():
+            for op in step_ops:
+                session.run(op, feed_dict=feed_dict)
+
+        for _ in range(burn):
+            step()
+
+        samples = []
+        for _ in range(num_samples):
+            for _ in range(thin):
+                step()
+            samples.append(session.run(trace_tensors + [logprob_tensor],
+                                       feed_dict=feed_dict))
+
+        if anchor:
+            model.anchor(session)
+
+        names = [param.full_name for param in params]
+        raw_traces = [list(trace) for trace in zip(*samples)]
+        traces = dict(zip(names, raw_traces[:-1]))
+        if logprobs:
+            traces.update({'logprobs': raw_traces[-1]})
+        return pd.DataFrame(traces)
+
+    def minimize(self, model, **kwargs):
+        raise NotImplementedError("ESS doesn't provide minimize method, use `sample` instead.")
+
+
+def _check_latent(latent):
+    prior = latent.prior
+    is_standard_normal = (isinstance(prior, priors.Gaussian)
+                          and np.all(prior.mu == 0.)
+                          and np.all(prior.var == 1.))
+    if not is_standard_normal or not isinstance(latent.transform, transforms.Identity):
+        raise ValueError('Elliptical slice sampling requires the latent parameter '
+                         'to have N(0, 1) prior and no transform.')
+    if not latent.trainable:
+        raise ValueError('The latent parameter must be trainable.')
+
+
+@name_scope("elliptical_slice")
+def _elliptical_slice(variable, loglik_fn):
+    dtype = variable.dtype.base_dtype
+    xs = tf.identity(variable)
+    nu = tf.random_normal(tf.shape(xs), dtype=dtype)
+    log_y = loglik_fn(xs) + tf.log(tf.random_uniform((), dtype=dtype))
+    theta = tf.random_uniform((), maxval=2. * np.pi, dtype=dtype)
+
+    def cond(accepted, _theta, _theta_min, _theta_max, _xs):
+        return tf.logical_not(accepted)
+
+    def body(_accepted, theta, theta_min, theta_max, _xs):
+        xs_new = xs * tf.cos(theta) + nu * tf.sin(theta)
+        accepted = loglik_fn(xs_new) > log_y
+        shrink_min = theta < 0.
+        theta_min = tf.where(shrink_min, theta, theta_min)
+        theta_max = tf.where(shrink_min, theta_max, theta)
+        theta_new = tf.random_uniform((), minval=theta_min, maxval=theta_max, dtype=dtype)
+        return accepted, theta_new, theta_min, theta_max, xs_new
+
+    init = [tf.constant(False), theta, theta - 2. * np.pi, theta, xs]
+    _, _, _, _, xs_accepted = _while_loop(cond, body, init)
+    return variable.assign(xs_accepted)
+
+
+@name_scope("gibbs_hmc")
+def _hmc_step(model, params, epsilon, lmin=1, lmax=1):
+    if lmax <= 0 or lmin <= 0:
+        raise ValueError('The lmin and lmax parameters must be greater zero.')
+    xs = [param.parameter_tensor for param in params]
+
+    def logprob_grads():
+        logprob = tf.negative(model.build_objective())
+        grads = tf.gradients(logprob, xs)
+        return logprob, grads
+
+    xs_new, _logprob = _thinning(logprob_grads, xs, 1, epsilon, lmin, lmax + 1)
+    return tf.group(*xs_new)
@@ -167,5 +167,98 @@ class TestEquivalence(GPflowTestCase):
             self.cvgp.predict_f_full_cov(X_augumented1)
 
 
+class TestKroneckerGPR(GPflowTestCase):
+    """
+    The Kronecker model is equivalent to GPR on inputs augmented by the
+    output labels, with the product of the input and Coregion kernels.
+    """
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.X = rng.rand(12, 2) * 5
+        self.Y = np.hstack([np.sin(self.X[:, :1]), np.cos(self.X[:, 1:]), self.X[:, :1]]) + \
+            0.2 * rng.randn(12, 3)
+        self.Xtest = rng.rand(5, 2) * 5
+        self.W = rng.randn(3, 2)
+        self.kappa = rng.rand(3) + 0.1
+
+    def kernels(self, active_dims=None):
+        kern = gpflow.kernels.RBF(2, lengthscales=1.3, active_dims=[0, 1])
+        coreg = gpflow.kernels.Coregion(1, output_dim=3, rank=2, active_dims=active_dims)
+        coreg.W = self.W
+        coreg.kappa = self.kappa
+        return kern, coreg
+
+    def models(self, Y):
+        kern, coreg = self.kernels()
+        m = gpflow.models.KroneckerGPR(self.X, Y, kern, coreg)
+        m.likelihood.variance = 0.1
+        kern, coreg = self.kernels(active_dims=[2])
+        observed = ~np.isnan(Y.T.flatten())
+        labels = np.repeat(np.arange(3), self.X.shape[0])[:, None]
+        X_augmented = np.hstack([np.tile(self.X, [3, 1]), labels])[observed]
+        Y_augmented = Y.T.flatten()[observed, None]
+        gpr = gpflow.models.GPR(X_augmented, Y_augmented, kern * coreg)
+        gpr.likelihood.variance = 0.1
+        return m, gpr
+
+    def check(self, Y):
+        m, gpr = self.models(Y)
+        assert_allclose(m.compute_log_likelihood(), gpr.compute_log_likelihood())
+        mu, var = m.predict_f(self.Xtest)
+        _, cov = m.predict_f_full_cov(self.Xtest)
+        self.assertEqual(mu.shape, (5, 3))
+        self.assertEqual(cov.shape, (5, 5, 3))
+        for p in range(3):
+            Xtest_augmented = np.hstack([self.Xtest, np.full((5, 1), p)])
+            expected_mu, expected_var = gpr.predict_f(Xtest_augmented)
+            assert_allclose(mu[:, p:p + 1], expected_mu)
+            assert_allclose(var[:, p:p + 1], expected_var)
+            _, expected_cov = gpr.predict_f_full_cov(Xtest_augmented)
+            assert_allclose(cov[:, :, p], expected_cov[:, :, 0])
+
+    def test_complete(self):
+        with self.test_context():
+            self.check(self.Y)
+
+    def test_missing(self):
+        with self.test_context():
+            Y = self.Y.copy()
+            Y[[0, 3, 4], [1, 2, 0]] = np.nan
+            m, _ = self.models(Y)
+            self.assertTrue(m.missing)
+            self.check(Y)
+
+    def test_assign_missing(self):
+        # The mode follows the current Y, not the one given at construction.
+        with self.test_context():
+            Y = self.Y.copy()
+            Y[[0, 3, 4], [1, 2, 0]] = np.nan
+            m, _ = self.models(self.Y)
+            _, gpr = self.models(Y)
+            self.assertFalse(m.missing)
+            m.Y = Y
+            self.assertTrue(m.missing)
+            assert_allclose(m.compute_log_likelihood(), gpr.compute_log_likelihood())
+            mu, _ = m.predict_f(self.Xtest)
+            self.assertTrue(np.all(np.isfinite(mu)))
+
+    def test_optimize(self):
+        # The repeated eigenvalues of B at W = 0, kappa = 1 must not spoil the gradients.
+        with self.test_context():
+            m = gpflow.models.KroneckerGPR(self.X, self.Y, gpflow.kernels.RBF(2),
+                                           gpflow.kernels.Coregion(1, output_dim=3, rank=1))
+            gpflow.train.ScipyOptimizer().minimize(m, maxiter=10)
+            self.assertTrue(np.isfinite(m.compute_log_likelihood()))
+
+    def test_errors(self):
+        with self.test_context():
+            with self.assertRaises(ValueError):
+                gpflow.models.KroneckerGPR(self.X, self.Y, gpflow.kernels.RBF(2),
+                                           gpflow.kernels.Coregion(1, output_dim=2, rank=1))
+            with self.assertRaises(ValueError):
+                gpflow.models.KroneckerGPR(self.X, self.Y, gpflow.kernels.RBF(2),
+                                           gpflow.kernels.RBF(1))
+
+
 if __name__ == '__main__':
     tf.test.main()
@@ -15,6 +15,7 @@
 import tensorflow as tf
 import numpy as np
 import pandas as pd
+import scipy.sparse
 
 import gpflow
 from gpflow import settings
@@ -137,6 +138,43 @@ class TestDataholder(GPflowTestCase):
             assert_allclose(p.read_value(), value)
 
 
+class TestSparseDataholder(GPflowTestCase):
+    def setUp(self):
+        self.value = scipy.sparse.random(10, 50, density=0.1, format='csr', random_state=0)
+
+    def test_create(self):
+        with self.test_context():
+            d = gpflow.DataHolder(self.value)
+            self.assertIsInstance(d, gpflow.SparseDataHolder)
+            self.assertEqual(d.shape, (10, 50))
+            self.assertEqual(d.dtype, np.float64)
+            self.assertFalse(d.trainable)
+            value = self.value.tocoo()
+            d = gpflow.DataHolder(tf.SparseTensorValue(
+                np.stack([value.row, value.col], 1), value.data, value.shape))
+            self.assertIsInstance(d, gpflow.SparseDataHolder)
+            assert_allclose(d.read_value().toarray(), self.value.toarray())
+            with self.assertRaises(ValueError):
+                gpflow.SparseDataHolder(self.value.toarray())
+            with self.assertRaises(NotImplementedError):
+                d.fix_shape()
+
+    def test_read_and_assign(self):
+        with self.test_context() as session:
+            d = gpflow.DataHolder(self.value)
+            d.compile()
+            self.assertIsInstance(d.parameter_tensor, tf.SparseTensor)
+            dense = session.run(tf.sparse_tensor_to_dense(d.parameter_tensor))
+            assert_allclose(dense, self.value.toarray())
+            assert_allclose(d.read_value(session).toarray(), self.value.toarray())
+
+            value = scipy.sparse.random(20, 50, density=0.2, format='csc', random_state=1)
+            d.assign(value)
+            assert_allclose(d.read_value(session).toarray(), value.toarray())
+            dense = session.run(tf.sparse_tensor_to_dense(d.parameter_tensor))
+            assert_allclose(dense, value.toarray())
+
+
 class TestMinibatch(GPflowTestCase):
     def test_create(self):
         with self.test_context():
@@ -479,6 +479,20 @@ def test_exp_diag_eKzxKxz(module, create_kernel):
     assert_allclose(a, b, rtol=DataExp.threshold)
 
 
+@pytest.mark.parametrize('module', kernel_modules)
+@pytest.mark.parametrize('create_kernel', create_exp_diag_kernels)
+@session_context()
+def test_exp_eKzxKxz_sum(module, create_kernel):
+    k = create_kernel(module)
+    a = k.compute_eKzxKxz(DataExp.Z, DataExp.Xmu, DataExp.Xcov)
+    custom_config = gpflow.settings.get_settings()
+    custom_config.numerics.ekern_chunk_size = 3  # does not divide N
+    with gpflow.settings.temp_settings(custom_config):
+        b = k.compute_eKzxKxz_sum(DataExp.Z, DataExp.Xmu, DataExp.Xcov)
+        c = k.compute_eKzxKxz_sum(DataExp.Z, DataExp.Xmu, DataExp.Xcov_diag)
+    assert_allclose(a.sum(0), b, rtol=DataExp.threshold)
+    assert_allclose(b, c, rtol=DataExp.threshold)
+
 
 class DataExpQuadrature(DataExp):
     threshold = 1e-3
@@ -583,6 +597,116 @@ def test_exp_quadrature_switch(create_kernel):
         k.compute_eKzxKxz(Z, Xmu, Xcov)
 
 
+class DataExpAnalytic(DataExp):
+    threshold = 1e-3
+    mixture_threshold = 1e-2  # the quadrature converges slowly at the kink of the Matern kernels
+    num_gauss_hermite_points = 50
+
+    rng = np.random.RandomState(1)
+    matern_args = (DataExp.D, 0.3 + rng.rand(), rng.rand(2) + [0.5, 1.5], None, True)
+    periodic_args = (DataExp.D, 0.5 + rng.rand(), 0.3 + rng.rand(), 0.5 + rng.rand())
+    product_args = ((DataExp.D, 0.3 + rng.rand(), rng.rand(2) + [0.5, 1.5], None, True),
+                    (1, 0.3 + rng.rand(), 0.5 + rng.rand(), [1]))
+
+    @classmethod
+    def create_matern32_kernel(cls, module):
+        return module.Matern32(*cls.matern_args)
+
+    @classmethod
+    def create_matern52_kernel(cls, module):
+        return module.Matern52(*cls.matern_args)
+
+    @classmethod
+    def create_periodic_kernel(cls, module):
+        return module.Periodic(*cls.periodic_args)
+
+    @classmethod
+    def create_rbf_product_kernel(cls, module):
+        return module.Product([module.RBF(*args) for args in cls.product_args])
+
+
+create_exp_analytic_kernels = [
+    (DataExpAnalytic.create_matern32_kernel, DataExpAnalytic.mixture_threshold),
+    (DataExpAnalytic.create_matern52_kernel, DataExpAnalytic.mixture_threshold),
+    (DataExpAnalytic.create_periodic_kernel, DataExpAnalytic.threshold),
+    (DataExpAnalytic.create_rbf_product_kernel, DataExpAnalytic.threshold),
+]
+
+
+def _compute_expectations(kern, Z, Xmu, Xcov):
+    # Static rank of Xcov selects the diagonal covariance path.
+    session = tf.get_default_session()
+    kern.compile()
+    Z, Xmu, Xcov = [tf.constant(a) for a in (Z, Xmu, Xcov)]
+    return session.run([kern.eKdiag(Xmu, Xcov), kern.eKxz(Z, Xmu, Xcov), kern.eKzxKxz(Z, Xmu, Xcov)])
+
+
+@pytest.mark.parametrize('create_kernel, threshold', create_exp_analytic_kernels)
+def test_exp_analytic_diag(create_kernel, threshold):
+    Z = DataExpAnalytic.Z
+    Xmu = DataExpAnalytic.Xmu
+    Xcov = DataExpAnalytic.Xcov_diag
+    with session_context():
+        k = create_kernel(kernels)
+        k.num_gauss_hermite_points = DataExpAnalytic.num_gauss_hermite_points
+        expected = _compute_expectations(k, Z, Xmu, Xcov)
+    with session_context():
+        ek = create_kernel(ekernels)
+        ek.num_gauss_hermite_points = 0  # quadrature must not be used
+        actual = _compute_expectations(ek, Z, Xmu, Xcov)
+    for a, b in zip(expected, actual):
+        assert_allclose(a, b, rtol=threshold, atol=threshold)
+
+
+class DataExpExact:
+    """
+    Without input variance the expectations are kernel evaluations, which
+    checks the Matern mixtures and the Fourier series of the periodic kernel
+    without the error of a quadrature reference.
+    """
+    threshold = 1e-6
+    rng = np.random.RandomState(2)
+    Xmu = 3. * rng.rand(10, DataExp.D)
+    Z = 3. * rng.rand(5, DataExp.D)
+    Xcov_diag = np.zeros_like(Xmu)
+
+    matern_args = (DataExp.D, 1., [0.2, 0.7], None, True)
+    periodic_args = (DataExp.D, 0.7, 1., 0.1)
+
+    @classmethod
+    def create_matern32_kernel(cls):
+        return ekernels.Matern32(*cls.matern_args)
+
+    @classmethod
+    def create_matern52_kernel(cls):
+        return ekernels.Matern52(*cls.matern_args)
+
+    @classmethod
+    def create_periodic_kernel(cls):
+        return ekernels.Periodic(*cls.periodic_args)
+
+
+@pytest.mark.parametrize('create_kernel', [
+    DataExpExact.create_matern32_kernel,
+    DataExpExact.create_matern52_kernel,
+    DataExpExact.create_periodic_kernel])
+def test_exp_analytic_exact(create_kernel):
+    Z, Xmu, Xcov = DataExpExact.Z, DataExpExact.Xmu, DataExpExact.Xcov_diag
+    with session_context() as session:
+        k = create_kernel()
+        eKdiag, eKxz, eKzxKxz = _compute_expectations(k, Z, Xmu, Xcov)
+        Kdiag, Kxz = session.run([k.Kdiag(tf.constant(Xmu)), k.K(tf.constant(Xmu), tf.constant(Z))])
+    assert_allclose(eKdiag, Kdiag, atol=DataExpExact.threshold)
+    assert_allclose(eKxz, Kxz, atol=DataExpExact.threshold)
+    assert_allclose(eKzxKxz, Kxz[:, :, None] * Kxz[:, None, :], atol=DataExpExact.threshold)
+
+
+def test_exp_matern_num_mixture_points():
+    with session_context():
+        k = ekernels.Matern32(DataExp.D, num_mixture_points=12)
+    assert k.num_mixture_points == 12
+
+
 class TestAddCrossCalcs(GPflowTestCase):
     _threshold = 0.5
 
@@ -0,0 +1,94 @@
+# Copyright 2017 the GPflow authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import tensorflow as tf
+
+import numpy as np
+from numpy.testing import assert_almost_equal, assert_allclose
+
+import gpflow
+from gpflow.test_util import GPflowTestCase
+
+
+class TestESS(GPflowTestCase):
+    def setUp(self):
+        self.rng = np.random.RandomState(0)
+        self.X = self.rng.randn(10, 1)
+        self.Y = np.sin(self.X) + 0.1 * self.rng.randn(10, 1)
+        self.Z = self.X[::2].copy()
+
+    def gpmc(self):
+        return gpflow.models.GPMC(
+            self.X, self.Y,
+            kern=gpflow.kernels.Matern32(1),
+            likelihood=gpflow.likelihoods.StudentT())
+
+    def sgpmc(self):
+        return gpflow.models.SGPMC(
+            self.X, self.Y,
+            kern=gpflow.kernels.Matern32(1),
+            likelihood=gpflow.likelihoods.StudentT(),
+            Z=self.Z)
+
+    def test_latent_likelihood(self):
+        for make_model in (self.gpmc, self.sgpmc):
+            with self.test_context() as session:
+                m = make_model()
+                m.V = self.rng.randn(*m.V.shape)
+                V = tf.placeholder(gpflow.settings.float_type, m.V.shape)
+                loglik = m.build_latent_likelihood()(V)
+                expected = m.compute_log_likelihood()
+                actual = session.run(loglik, feed_dict={V: m.V.read_value()})
+                assert_allclose(actual, expected)
+
+    def test_sample_latent(self):
+        for make_model in (self.gpmc, self.sgpmc):
+            with self.test_context():
+                tf.set_random_seed(1)
+                m = make_model()
+                samples = gpflow.train.ESS().sample(m, num_samples=20, thin=2, burn=5)
+                self.assertEqual(samples.shape, (20, 2))
+                self.assertEqual(set(samples.columns), {m.V.full_name, 'logprobs'})
+                vs = np.stack(samples[m.V.full_name].values)
+                self.assertEqual(vs.shape, (20,) + m.V.shape)
+                self.assertFalse(np.all(vs[0] == vs[-1]))
+                assert_almost_equal(vs[-1], m.V.read_value())
+
+    def test_gibbs(self):
+        with self.test_context():
+            m = self.gpmc()
+            m.kern.lengthscales.trainable = False
+            ess = gpflow.train.ESS()
+            samples = ess.sample(m, num_samples=10,
+                                 hmc_options=dict(epsilon=0.05, lmax=5))
+            names = {p.full_name for p in m.trainable_parameters}
+            names.add('logprobs')
+            self.assertEqual(set(samples.columns), names)
+            last = samples.drop('logprobs', axis=1).iloc[-1]
+            params = {p.full_name: p for p in m.trainable_parameters}
+            for col in last.index:
+                assert_almost_equal(last[col], params[col].read_value())
+
+    def test_wrong_latent_prior(self):
+        with self.test_context():
+            m = self.gpmc()
+            m.clear()
+            m.V.prior = gpflow.priors.Gaussian(0., 2.)
+            m.compile()
+            with self.assertRaises(ValueError):
+                gpflow.train.ESS().sample(m, num_samples=1)
+
+
+if __name__ == '__main__':
+    tf.test.main()
@@ -94,5 +94,166 @@ class TestFeaturesPsdSchur(GPflowTestCase):
             self.assertTrue(np.all(np.linalg.eig(Kff - Qff)[0] > 0.0))
 
 
+class TestFourierFeatures(GPflowTestCase):
+    def setUp(self):
+        self.rng = np.random.RandomState(0)
+        self.X = np.concatenate([self.rng.rand(15, 1) * 3. - 1., [[-1.4], [2.3]]])
+        self.kern_classes = [gpflow.kernels.Matern12, gpflow.kernels.Matern32, gpflow.kernels.Matern52]
+
+    def test_feature_len(self):
+        with self.test_context():
+            self.assertEqual(len(gpflow.features.FourierFeatures1D(-1., 2., 10)), 19)
+
+    def test_matrix_psd(self):
+        # The Nystrom approximation must be bounded by the kernel, also outside [a, b].
+        for kern_class in self.kern_classes:
+            with self.test_context() as session:
+                kern = kern_class(1, 1.3, lengthscales=0.6)
+                feature = gpflow.features.FourierFeatures1D(-1., 2., 30)
+                Kuf, Kuu = session.run([feature.Kuf(kern, self.X), feature.Kuu(kern)])
+                Kff = kern.compute_K_symm(self.X)
+            Qff = Kuf.T @ np.linalg.solve(Kuu, Kuf)
+            self.assertTrue(np.all(np.linalg.eigvalsh(Kff - Qff) > -1e-8))
+            # shrinking Kuu must break the bound
+            Qff = Kuf.T @ np.linalg.solve(0.8 * Kuu, Kuf)
+            self.assertTrue(np.any(np.linalg.eigvalsh(Kff - Qff) < 0.))
+
+    def test_Kuu_solve(self):
+        for kern_class in self.kern_classes:
+            with self.test_context() as session:
+                kern = kern_class(1, 1.3, lengthscales=0.6)
+                feature = gpflow.features.FourierFeatures1D(-1., 2., 8)
+                B = self.rng.randn(15, 3)
+                Kuu, KuuiB = session.run([feature.Kuu(kern, jitter=1e-3),
+                                          feature.Kuu_solve(kern, B, jitter=1e-3)])
+            np.testing.assert_allclose(KuuiB, np.linalg.solve(Kuu, B))
+
+    def test_conditional(self):
+        # The structured conditional must match the generic code path.
+        for kern_class in self.kern_classes:
+            for full_cov in [False, True]:
+                with self.test_context() as session:
+                    kern = kern_class(1, 1.3, lengthscales=0.6)
+                    feature = gpflow.features.FourierFeatures1D(-1., 2., 6)
+                    f = self.rng.randn(11, 2)
+                    q_sqrt = np.array([np.tril(self.rng.randn(11, 11)) for _ in range(2)])
+                    q_sqrt = tf.constant(q_sqrt.transpose(1, 2, 0))
+                    structured = gpflow.features.conditional(
+                        feature, kern, self.X, f, full_cov=full_cov, q_sqrt=q_sqrt)
+                    default = gpflow.features.default_feature_conditional(
+                        feature, kern, self.X, f, full_cov=full_cov, q_sqrt=q_sqrt)
+                    structured, default = session.run([structured, default])
+                np.testing.assert_allclose(structured[0], default[0], rtol=1e-5, atol=1e-8)
+                np.testing.assert_allclose(structured[1], default[1], rtol=1e-5, atol=1e-8)
+
+    def test_svgp(self):
+        with self.test_context():
+            Y = np.sin(3. * self.X) + 0.1 * self.rng.randn(*self.X.shape)
+            feature = gpflow.features.FourierFeatures1D(-1.5, 2.5, 10)
+            m = gpflow.models.SVGP(self.X, Y, gpflow.kernels.Matern32(1),
+                                   gpflow.likelihoods.Gaussian(), feat=feature, whiten=False)
+            self.assertTrue(np.isfinite(m.compute_log_likelihood()))
+            mu, var = m.predict_f(self.X)
+            self.assertEqual(mu.shape, (17, 1))
+            self.assertTrue(np.all(var > 0.))
+            # the structured KL divergence matches the dense one
+            m.q_sqrt = np.tril(self.rng.randn(19, 19))[:, :, None]
+            session = m.enquire_session()
+            with gpflow.params_as_tensors_for(m):
+                Kuu = feature.Kuu(m.kern, jitter=gpflow.settings.numerics.jitter_level)
+                kl_dense = gpflow.kullback_leiblers.gauss_kl(m.q_mu, m.q_sqrt, Kuu)
+            np.testing.assert_allclose(*session.run([m.build_prior_KL(), kl_dense]))
+            m = gpflow.models.SVGP(self.X, Y, gpflow.kernels.Matern32(1),
+                                   gpflow.likelihoods.Gaussian(), feat=feature)
+            self.assertTrue(np.isfinite(m.compute_log_likelihood()))
+
+    def test_unsupported_kernel(self):
+        with self.test_context():
+            feature = gpflow.features.FourierFeatures1D(-1., 2., 4)
+            with self.assertRaises(NotImplementedError):
+                feature.Kuu(gpflow.kernels.RBF(1))
+            with self.assertRaises(ValueError):
+                feature.Kuu(gpflow.kernels.Matern32(2))
+
+
+class TestKroneckerInducingPoints(GPflowTestCase):
+    def setUp(self):
+        self.rng = np.random.RandomState(0)
+        self.Z_list = [np.linspace(-1., 1., 4), np.linspace(-2., 2., 3)]
+        self.Z = np.array([[z1, z2] for z1 in self.Z_list[0] for z2 in self.Z_list[1]])
+        self.X = self.rng.randn(9, 2)
+
+    def kernels(self):
+        return [gpflow.kernels.RBF(2, 1.3, lengthscales=[0.7, 1.6], ARD=True),
+                gpflow.kernels.RBF(2, 0.8, lengthscales=1.1),
+                gpflow.kernels.Product([gpflow.kernels.Matern32(1, 1.2, active_dims=[0]),
+                                        gpflow.kernels.Matern12(1, 0.7, active_dims=[1])])]
+
+    def test_feature_len(self):
+        with self.test_context():
+            feature = gpflow.features.KroneckerInducingPoints(self.Z_list)
+            self.assertEqual(len(feature), 12)
+            self.assertEqual(feature.grid_shape, [4, 3])
+
+    def test_inducing_points_equivalence(self):
+        for kern in self.kernels():
+            with self.test_context() as session:
+                feature = gpflow.features.KroneckerInducingPoints(self.Z_list)
+                points = gpflow.features.InducingPoints(self.Z)
+                result = session.run([feature.Kuu(kern), points.Kuu(kern),
+                                      feature.Kuf(kern, self.X), points.Kuf(kern, self.X)])
+            np.testing.assert_allclose(result[0], result[1])
+            np.testing.assert_allclose(result[2], result[3])
+
+    def test_conditional(self):
+        for white in [True, False]:
+            for full_cov in [True, False]:
+                with self.test_context() as session:
+                    kern = self.kernels()[0]
+                    feature = gpflow.features.KroneckerInducingPoints(self.Z_list)
+                    f = self.rng.randn(12, 2)
+                    factors = [np.array([np.tril(self.rng.randn(m, m)) for _ in range(2)]).transpose(1, 2, 0)
+                               for m in [4, 3]]
+                    q_sqrt = np.array([np.kron(factors[0][:, :, i], factors[1][:, :, i])
+                                       for i in range(2)]).transpose(1, 2, 0)
+                    options = dict(full_cov=full_cov, white=white)
+                    result = session.run([
+                        gpflow.features.conditional(feature, kern, self.X, f,
+                                                    q_sqrt=[tf.constant(L) for L in factors], **options),
+                        gpflow.features.conditional(feature, kern, self.X, f,
+                                                    q_sqrt=tf.constant(q_sqrt), **options),
+                        gpflow.features.default_feature_conditional(feature, kern, self.X, f,
+                                                                    q_sqrt=tf.constant(q_sqrt), **options)])
+                for mean, var in result[1:]:
+                    np.testing.assert_allclose(result[0][0], mean, atol=1e-8)
+                    np.testing.assert_allclose(result[0][1], var, atol=1e-8)
+
+    def test_svgp(self):
+        with self.test_context():
+            Y = np.sin(self.X[:, :1]) + 0.1 * self.rng.randn(9, 1)
+            for whiten in [True, False]:
+                feature = gpflow.features.KroneckerInducingPoints(self.Z_list)
+                m = gpflow.models.SVGP(self.X, Y, gpflow.kernels.RBF(2, ARD=True),
+                                       gpflow.likelihoods.Gaussian(), feat=feature, whiten=whiten)
+                self.assertEqual(len(m.q_sqrt), 2)
+                self.assertTrue(np.isfinite(m.compute_log_likelihood()))
+            # a diagonal q_sqrt keeps the Kronecker structure of the prior
+            feature = gpflow.features.KroneckerInducingPoints(self.Z_list)
+            m = gpflow.models.SVGP(self.X, Y, gpflow.kernels.RBF(2, ARD=True),
+                                   gpflow.likelihoods.Gaussian(), feat=feature, whiten=False, q_diag=True)
+            with gpflow.params_as_tensors_for(m):
+                Kuu = feature.Kuu(m.kern, jitter=gpflow.settings.numerics.jitter_level)
+                kl_dense = gpflow.kullback_leiblers.gauss_kl(m.q_mu, m.q_sqrt, Kuu)
+            np.testing.assert_allclose(*m.enquire_session().run([m.build_prior_KL(), kl_dense]))
+
+    def test_unsupported_kernel(self):
+        with self.test_context():
+            feature = gpflow.features.KroneckerInducingPoints(self.Z_list)
+            with self.assertRaises(NotImplementedError):
+                feature.Kuu(gpflow.kernels.Matern32(2))
+            with self.assertRaises(ValueError):
+                feature.Kuu(gpflow.kernels.RBF(3))
+
+
 if __name__ == "__main__":
     tf.test.main()
@@ -14,6 +14,7 @@
 
 import tensorflow as tf
 import numpy as np
+from numpy.testing import assert_allclose
 
 import gpflow
 from gpflow.test_util import GPflowTestCase
@@ -52,6 +53,33 @@ class TestGPLVM(GPflowTestCase):
             opt.minimize(m, maxiter=2)
             self.assertTrue(m.compute_log_likelihood() > linit)
 
+    def test_gpr(self):
+        # The GPLVM is GPR on its latent positions.
+        with self.test_context():
+            XInit = self.rng.rand(self.N, self.Q)
+            m = gpflow.models.GPLVM(self.Y, self.Q, XInit, kernels.RBF(self.Q))
+            gpr = gpflow.models.GPR(XInit, self.Y, kernels.RBF(self.Q))
+            assert_allclose(m.compute_log_likelihood(), gpr.compute_log_likelihood())
+            Xnew = self.rng.rand(4, self.Q)
+            for value, expected in zip(m.predict_f(Xnew), gpr.predict_f(Xnew)):
+                assert_allclose(value, expected)
+
+    def test_encoder(self):
+        with self.test_context():
+            D = self.Y.shape[1]
+            encoder = gpflow.models.MLPEncoder(D, self.Q, hidden_sizes=(10,))
+            m = gpflow.models.GPLVM(self.Y, self.Q, encoder=encoder)
+            self.assertFalse(hasattr(m, 'X'))
+            linit = m.compute_log_likelihood()
+            opt = gpflow.train.ScipyOptimizer()
+            opt.minimize(m, maxiter=2)
+            self.assertTrue(m.compute_log_likelihood() > linit)
+
+            Ynew = self.rng.randn(3, D)
+            X_mean, X_var = m.encoder.compute_latent(Ynew)
+            self.assertEqual(X_mean.shape, (3, self.Q))
+            self.assertTrue(np.all(X_var > 0))
+
 
 class TestBayesianGPLVM(GPflowTestCase):
     def setUp(self):
@@ -107,6 +135,45 @@ class TestBayesianGPLVM(GPflowTestCase):
             for i in range(self.D):
                 self.assertTrue(np.allclose(var_f[:, i], np.diag(var_fFull[:, :, i])))
 
+    def test_encoder(self):
+        Q = 2  # latent dimensions
+        Z = self.rng.randn(self.M, Q)
+        with self.test_context():
+            encoder = gpflow.models.MLPEncoder(self.D, Q, hidden_sizes=(10,))
+            m = gpflow.models.BayesianGPLVM(
+                X_mean=None,
+                X_var=None,
+                Y=self.Y,
+                kern=ekernels.RBF(Q),
+                M=self.M,
+                Z=Z,
+                encoder=encoder)
+            encoded = m.compute_log_likelihood()
+            X_mean, X_var = m.encoder.compute_latent(self.Y)
+        with self.test_context():
+            m = gpflow.models.BayesianGPLVM(
+                X_mean=X_mean,
+                X_var=X_var,
+                Y=self.Y,
+                kern=ekernels.RBF(Q),
+                M=self.M,
+                Z=Z)
+            self.assertTrue(np.allclose(m.compute_log_likelihood(), encoded))
+
+        with self.test_context():
+            m = gpflow.models.BayesianGPLVM(
+                X_mean=None,
+                X_var=None,
+                Y=self.Y,
+                kern=ekernels.RBF(Q),
+                M=self.M,
+                Z=Z,
+                encoder=gpflow.models.MLPEncoder(self.D, Q))
+            linit = m.compute_log_likelihood()
+            opt = gpflow.train.ScipyOptimizer()
+            opt.minimize(m, maxiter=2)
+            self.assertTrue(m.compute_log_likelihood() > linit)
+
     def test_kernelsActiveDims(self):
         ''' Test sum and product compositional kernels '''
         with self.test_context():
@@ -175,5 +242,61 @@ class TestBayesianGPLVM(GPflowTestCase):
                                 ('Posterior vars different', var_f_a-var_f_q))
 
 
+class TestStochasticBayesianGPLVM(GPflowTestCase):
+    def setUp(self):
+        self.N = 20  # number of data points
+        self.D = 5  # data dimension
+        self.Q = 2  # latent dimensions
+        self.M = 10  # inducing points
+        self.rng = np.random.RandomState(1)
+        self.Y = self.rng.randn(self.N, self.D)
+        self.X_mean = gpflow.models.PCA_reduce(self.Y, self.Q)
+        self.Z = self.rng.permutation(self.X_mean.copy())[:self.M]
+
+    def model(self, minibatch_size=None):
+        return gpflow.models.StochasticBayesianGPLVM(
+            X_mean=self.X_mean,
+            X_var=np.ones((self.N, self.Q)),
+            Y=self.Y,
+            kern=ekernels.RBF(self.Q),
+            M=self.M,
+            Z=self.Z,
+            minibatch_size=minibatch_size)
+
+    def test_collapsed_bound(self):
+        with self.test_context():
+            m = gpflow.models.BayesianGPLVM(
+                X_mean=self.X_mean,
+                X_var=np.ones((self.N, self.Q)),
+                Y=self.Y,
+                kern=ekernels.RBF(self.Q),
+                M=self.M,
+                Z=self.Z)
+            collapsed = m.compute_log_likelihood()
+        with self.test_context():
+            m = self.model()
+            self.assertTrue(m.compute_log_likelihood() <= collapsed)
+
+    def test_optimise(self):
+        with self.test_context():
+            m = self.model(minibatch_size=5)
+            opt = gpflow.train.AdamOptimizer(0.01)
+            opt.minimize(m, maxiter=10)
+            self.assertTrue(np.isfinite(m.compute_log_likelihood()))
+
+            # test prediction
+            Xtest = self.rng.randn(10, self.Q)
+            mu_f, var_f = m.predict_f(Xtest)
+            self.assertEqual(mu_f.shape, (10, self.D))
+            self.assertEqual(var_f.shape, (10, self.D))
+
+    def test_sparse_gradients(self):
+        with self.test_context():
+            m = self.model(minibatch_size=5)
+            for param in (m.X_mean, m.X_var):
+                grad = tf.gradients(m.likelihood_tensor, param.unconstrained_tensor)[0]
+                self.assertIsInstance(grad, tf.IndexedSlices)
+
+
 if __name__ == "__main__":
     tf.test.main()
@@ -15,6 +15,7 @@
 import tensorflow as tf
 
 import numpy as np
+import scipy.sparse
 from numpy.testing import assert_allclose
 
 import copy
@@ -223,6 +224,127 @@ class TestCoregion(GPflowTestCase):
             self.assertTrue(np.allclose(K1, K2))
 
 
+class TestDistanceCache(GPflowTestCase):
+    def setUp(self):
+        self.test_graph = tf.Graph()
+        self.rng = np.random.RandomState(0)
+        self.X_data = self.rng.randn(6, 2)
+        self.Z_data = self.rng.randn(4, 2)
+
+    def count_matmuls(self):
+        return len([op for op in tf.get_default_graph().get_operations() if op.type == 'MatMul'])
+
+    def test_shared_distances(self):
+        # isotropic kernels on the same inputs share one distance matrix
+        with self.test_context() as session:
+            X = tf.placeholder(gpflow.settings.float_type, [None, 2])
+            k = gpflow.kernels.RBF(2, lengthscales=0.7) + gpflow.kernels.Matern32(2, lengthscales=1.3)
+            k.compile()
+            before = self.count_matmuls()
+            with gpflow.misc.build_cache_scope():
+                K = k.K(X)
+                self.assertEqual(self.count_matmuls() - before, 1)
+                K_sum = k.kern_list[0].K(X) + k.kern_list[1].K(X)
+                self.assertEqual(self.count_matmuls() - before, 1)
+            K, K_sum = session.run([K, K_sum], feed_dict={X: self.X_data})
+        assert_allclose(K, K_sum)
+        assert_allclose(K, k.compute_K_symm(self.X_data))
+
+    def test_ard_distances(self):
+        with self.test_context() as session:
+            X = tf.placeholder(gpflow.settings.float_type, [None, 2])
+            Z = tf.placeholder(gpflow.settings.float_type, [None, 2])
+            k = gpflow.kernels.RBF(2, lengthscales=[0.7, 1.3], ARD=True)
+            k.compile()
+            with gpflow.params_as_tensors_for(k), gpflow.misc.build_cache_scope():
+                self.assertIs(k.square_dist(X, Z), k.square_dist(X, Z))
+            Kzx, Kzz = session.run([k.K(Z, X), k.K(Z)], feed_dict={X: self.X_data, Z: self.Z_data})
+        lengthscales = np.array([0.7, 1.3])
+        Zl, Xl = self.Z_data / lengthscales, self.X_data / lengthscales
+        assert_allclose(Kzx, np.exp(-0.5 * np.sum(np.square(Zl[:, None] - Xl[None]), 2)))
+        assert_allclose(Kzz, np.exp(-0.5 * np.sum(np.square(Zl[:, None] - Zl[None]), 2)))
+
+    def test_active_dims(self):
+        with self.test_context() as session:
+            X = tf.placeholder(gpflow.settings.float_type, [None, 2])
+            k1 = gpflow.kernels.RBF(1, active_dims=[0])
+            k2 = gpflow.kernels.RBF(1, active_dims=[1])
+            k1.compile()
+            k2.compile()
+            K1, K2 = session.run([k1.K(X), k2.K(X)], feed_dict={X: self.X_data})
+        self.assertFalse(np.allclose(K1, K2))
+        assert_allclose(K1, k1.compute_K_symm(self.X_data[:, :1]))
+        assert_allclose(K2, k2.compute_K_symm(self.X_data[:, 1:]))
+
+    def test_while_loop(self):
+        # distances built inside a loop are not reused outside of it
+        with self.test_context() as session:
+            X = tf.placeholder(gpflow.settings.float_type, [None, 2])
+            k = gpflow.kernels.RBF(2)
+            k.compile()
+            with gpflow.misc.build_cache_scope():
+                _, loop_sum = tf.while_loop(lambda i, _: i < 2,
+                                            lambda i, acc: (i + 1, acc + tf.reduce_sum(k.K(X))),
+                                            [tf.constant(0), tf.constant(0., gpflow.settings.float_type)])
+                outside = tf.reduce_sum(k.K(X))
+            loop_sum, outside = session.run([loop_sum, outside], feed_dict={X: self.X_data})
+        assert_allclose(loop_sum, 2 * outside)
+
+
+    def test_build_scope(self):
+        # distances are only shared within a build scope
+        with self.test_context():
+            X = tf.placeholder(gpflow.settings.float_type, [None, 2])
+            k = gpflow.kernels.RBF(2, lengthscales=[0.7, 1.3], ARD=True)
+            k.compile()
+            with gpflow.params_as_tensors_for(k):
+                self.assertIsNot(k.square_dist(X, None), k.square_dist(X, None))
+                with gpflow.misc.build_cache_scope():
+                    r2 = k.square_dist(X, None)
+                    with gpflow.misc.build_cache_scope():
+                        self.assertIs(k.square_dist(X, None), r2)
+                with gpflow.misc.build_cache_scope():
+                    self.assertIsNot(k.square_dist(X, None), r2)
+
+
+class TestAdditive(GPflowTestCase):
+    def setUp(self):
+        self.test_graph = tf.Graph()
+        self.rng = np.random.RandomState(0)
+        self.X = self.rng.randn(6, 4)
+        self.X2 = self.rng.randn(5, 4)
+        self.variance = np.array([0.5, 1.3, 0.8, 2.1])
+        self.lengthscales = np.array([0.7, 1.4, 0.3, 2.2])
+
+    def test_sum_equivalence(self):
+        kernel_classes = [gpflow.kernels.RBF, gpflow.kernels.Exponential, gpflow.kernels.Matern12,
+                          gpflow.kernels.Matern32, gpflow.kernels.Matern52]
+        for kernel_class in kernel_classes:
+            with self.test_context():
+                k = gpflow.kernels.Additive(4, kernel_class, self.variance, self.lengthscales)
+                k_sum = gpflow.kernels.Sum([
+                    kernel_class(1, variance=v, lengthscales=l, active_dims=[d])
+                    for d, (v, l) in enumerate(zip(self.variance, self.lengthscales))])
+                k.compile()
+                k_sum.compile()
+                assert_allclose(k.compute_K_symm(self.X), k_sum.compute_K_symm(self.X))
+                assert_allclose(k.compute_K(self.X, self.X2), k_sum.compute_K(self.X, self.X2))
+                assert_allclose(k.compute_Kdiag(self.X), k_sum.compute_Kdiag(self.X))
+
+    def test_active_dims(self):
+        with self.test_context():
+            k = gpflow.kernels.Additive(2, gpflow.kernels.Matern32, active_dims=[1, 3])
+            k_full = gpflow.kernels.Additive(2, gpflow.kernels.Matern32)
+            k.compile()
+            k_full.compile()
+            assert_allclose(k.compute_K_symm(self.X), k_full.compute_K_symm(self.X[:, [1, 3]]))
+
+    def test_unsupported(self):
+        with self.test_context():
+            with self.assertRaises(ValueError):
+                gpflow.kernels.Additive(2, gpflow.kernels.Linear)
+
+
 class TestKernSymmetry(GPflowTestCase):
     def setUp(self):
         self.test_graph = tf.Graph()
@@ -581,5 +703,77 @@ class TestARDInit(GPflowTestCase):
             self.assertTrue(np.all(k1_variances == k2_variances))
 
 
+class TestSparseLinear(GPflowTestCase):
+    def setUp(self):
+        self.X = scipy.sparse.random(8, 30, density=0.2, format='coo', random_state=0)
+        self.X2 = scipy.sparse.random(5, 30, density=0.2, format='coo', random_state=1)
+
+    def sparse_tensor(self, X):
+        return tf.SparseTensor(np.stack([X.row, X.col], 1).astype(np.int64), X.data, X.shape)
+
+    def kernels(self):
+        rng = np.random.RandomState(0)
+        dims = [0, 3, 7, 8, 12, 20, 21, 29]
+        return [gpflow.kernels.Linear(30, variance=0.7),
+                gpflow.kernels.Linear(30, variance=rng.rand(30) + 0.1, ARD=True),
+                gpflow.kernels.Linear(8, variance=rng.rand(8) + 0.1, ARD=True, active_dims=dims),
+                gpflow.kernels.Linear(10, active_dims=slice(5, 15)),
+                gpflow.kernels.Polynomial(30, degree=2.0, variance=0.3)]
+
+    def test_gram(self):
+        for k in self.kernels():
+            with self.test_context() as session:
+                X, X2 = self.sparse_tensor(self.X), self.sparse_tensor(self.X2)
+                Xd, X2d = self.X.toarray(), self.X2.toarray()
+                k.compile()
+                sparse = session.run([k.K(X), k.K(X, X2), k.K(X, X2d), k.K(Xd, X2), k.Kdiag(X)])
+                dense = session.run([k.K(Xd), k.K(Xd, X2d), k.K(Xd, X2d), k.K(Xd, X2d), k.Kdiag(Xd)])
+                for value, expected in zip(sparse, dense):
+                    assert_allclose(value, expected)
+
+
+class TestMixedPrecision(GPflowTestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.X = rng.randn(20, 2)
+        self.Y = rng.randn(20, 1)
+        self.settings = gpflow.settings.get_settings()
+        self.settings.dtypes.kernel_float_type = np.float32
+
+    def kernel(self):
+        return gpflow.kernels.Matern32(2, lengthscales=[0.8, 1.2], ARD=True) + \
+            gpflow.kernels.Linear(2)
+
+    def test_kernel(self):
+        with self.test_context():
+            expected = self.kernel().compute_K_symm(self.X)
+        with gpflow.settings.temp_settings(self.settings), self.test_context():
+            k = self.kernel()
+            K = k.compute_K_symm(self.X)
+            self.assertEqual(K.dtype, np.float32)
+            self.assertEqual(k.compute_Kdiag(self.X).dtype, np.float32)
+            assert_allclose(K, expected, rtol=1e-5, atol=1e-5)
+            # the parameters are restored after the evaluation
+            self.assertIsInstance(k.kern_list[0].lengthscales, gpflow.params.Parameter)
+            self.assertIsInstance(k.kern_list[1].variance, gpflow.params.Parameter)
+
+    def test_model(self):
+        def model():
+            return gpflow.models.SGPR(self.X, self.Y, self.kernel(), Z=self.X[:8].copy())
+
+        with self.test_context():
+            m = model()
+            expected = m.compute_log_likelihood()
+            expected_mu, expected_var = m.predict_f(self.X)
+        with gpflow.settings.temp_settings(self.settings), self.test_context():
+            m = model()
+            likelihood = m.compute_log_likelihood()
+            mu, var = m.predict_f(self.X)
+            self.assertEqual(mu.dtype, np.float64)
+            assert_allclose(likelihood, expected, rtol=1e-5)
+            assert_allclose(mu, expected_mu, atol=1e-4)
+            assert_allclose(var, expected_var, atol=1e-4)
+
+
 if __name__ == "__main__":
     tf.test.main()
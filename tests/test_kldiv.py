@@ -239,5 +239,82 @@ class OneDTest(GPflowTestCase):
             np.testing.assert_allclose(res, np_kl)
 
 
+class KroneckerTest(GPflowTestCase):
+    """
+    Check that the Kronecker structured KL divergence matches the dense one.
+    """
+
+    def setUp(self):
+        self.rng = np.random.RandomState(0)
+        sizes, N = [3, 4], 2
+        self.mu_data = self.rng.randn(12, N)
+        self.sqrt_data = [np.array([np.tril(self.rng.randn(m, m)) for _ in range(N)]).transpose(1, 2, 0)
+                          for m in sizes]
+        self.K_data = [squareT(self.rng.randn(m, m)) + np.eye(m) for m in sizes]
+
+    def dense(self):
+        chol = np.array([np.kron(np.tril(self.sqrt_data[0][:, :, i]), np.tril(self.sqrt_data[1][:, :, i]))
+                         for i in range(self.mu_data.shape[1])])
+        return chol.transpose(1, 2, 0), np.kron(*self.K_data)
+
+    def test_white(self):
+        with self.test_session() as sess:
+            chol, _ = self.dense()
+            kl_kron = gpflow.kullback_leiblers.gauss_kl_kron(self.mu_data, self.sqrt_data)
+            kl_dense = gpflow.kullback_leiblers.gauss_kl(self.mu_data, tf.constant(chol))
+            res_kron, res_dense = sess.run([kl_kron, kl_dense])
+            np.testing.assert_allclose(res_kron, res_dense)
+
+    def test_nonwhite(self):
+        with self.test_session() as sess:
+            chol, K = self.dense()
+            kl_kron = gpflow.kullback_leiblers.gauss_kl_kron(self.mu_data, self.sqrt_data, self.K_data)
+            kl_dense = gpflow.kullback_leiblers.gauss_kl(self.mu_data, tf.constant(chol), K)
+            res_kron, res_dense = sess.run([kl_kron, kl_dense])
+            np.testing.assert_allclose(res_kron, res_dense)
+
+    def test_diag(self):
+        sqrt_diag = self.rng.randn(12, 2)
+        _, K = self.dense()
+        with self.test_session() as sess:
+            for K_kron, K_dense in [(None, None), (self.K_data, K)]:
+                kl_kron = gpflow.kullback_leiblers.gauss_kl_kron(self.mu_data, sqrt_diag, K_kron)
+                kl_dense = gpflow.kullback_leiblers.gauss_kl(self.mu_data, tf.constant(sqrt_diag), K_dense)
+                res_kron, res_dense = sess.run([kl_kron, kl_dense])
+                np.testing.assert_allclose(res_kron, res_dense)
+
+
+class DiagLowRankTest(GPflowTestCase):
+    """
+    Check that the KL divergence for a diagonal plus low rank prior matches
+    the dense one.
+    """
+
+    def setUp(self):
+        self.rng = np.random.RandomState(0)
+        M, R, N = 7, 2, 3
+        self.mu_data = self.rng.randn(M, N)
+        self.sqrt_data = np.array([np.tril(self.rng.randn(M, M)) for _ in range(N)]).transpose(1, 2, 0)
+        self.sqrt_diag_data = self.rng.rand(M, N)
+        self.d_data = 0.5 + self.rng.rand(M)
+        self.V_data = self.rng.randn(M, R)
+        self.K_data = np.diag(self.d_data) + self.V_data @ self.V_data.T
+
+    def test_diag(self):
+        with self.test_session() as sess:
+            q_sqrt = tf.constant(self.sqrt_diag_data)
+            kl = gpflow.kullback_leiblers.gauss_kl_diag_low_rank(
+                self.mu_data, q_sqrt, self.d_data, self.V_data)
+            kl_dense = gpflow.kullback_leiblers.gauss_kl(self.mu_data, q_sqrt, self.K_data)
+            np.testing.assert_allclose(*sess.run([kl, kl_dense]))
+
+    def test_dense(self):
+        with self.test_session() as sess:
+            q_sqrt = tf.constant(self.sqrt_data)
+            kl = gpflow.kullback_leiblers.gauss_kl_diag_low_rank(
+                self.mu_data, q_sqrt, self.d_data, self.V_data)
+            kl_dense = gpflow.kullback_leiblers.gauss_kl(self.mu_data, q_sqrt, self.K_data)
+            np.testing.assert_allclose(*sess.run([kl, kl_dense]))
+
 if __name__ == "__main__":
     unittest.main()
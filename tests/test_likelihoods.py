@@ -50,6 +50,12 @@ def getLikelihoodSetups(includeMultiClass=True, addNonStandardLinks=False):
                 test_setups.append(
                     LikelihoodSetup(likelihoodClass(2),
                               np.argmax(sample, 1).reshape(-1, 1), tolerance))
+        elif likelihoodClass == gpflow.likelihoods.SoftMax:
+            if includeMultiClass:
+                sample = rng.randn(10, 2)
+                test_setups.append(
+                    LikelihoodSetup(likelihoodClass(2),
+                              np.argmax(sample, 1).reshape(-1, 1), 1e-6))
         else:
             # most likelihoods follow this standard:
             test_setups.append(
@@ -177,6 +183,191 @@ class TestQuadrature(GPflowTestCase):
                 self.assertTrue(np.allclose(F1, F2, test_setup.tolerance, test_setup.tolerance))
 
 
+class TestClosedForms(GPflowTestCase):
+    """
+    Closed forms compared to quadrature for latent functions with large
+    uncertainty.
+    """
+    def setUp(self):
+        self.test_graph = tf.Graph()
+        self.rng = np.random.RandomState(0)
+        self.Fmu = self.rng.randn(10, 2)
+        self.Fvar = self.rng.rand(10, 2) * 2.
+
+    def test_predictions(self):
+        base = gpflow.likelihoods.Likelihood
+        setups = [(gpflow.likelihoods.Ordinal(np.array([-1, 1])), self.rng.randint(0, 3, (10, 2))),
+                  (gpflow.likelihoods.StudentT(), self.rng.randn(10, 2))]
+        with self.test_context() as session:
+            for l, Y in setups:
+                l.compile()
+                l.num_gauss_hermite_points = 50
+                actual = l.predict_mean_and_var(self.Fmu, self.Fvar) + \
+                    (l.predict_density(self.Fmu, self.Fvar, Y),)
+                expected = base.predict_mean_and_var(l, self.Fmu, self.Fvar) + \
+                    (base.predict_density(l, self.Fmu, self.Fvar, Y),)
+                for a, e in zip(session.run(actual), session.run(expected)):
+                    assert_allclose(a, e, rtol=1e-6, atol=1e-8)
+
+    def test_logistic_bound(self):
+        Y = self.rng.randint(0, 2, (10, 2)).astype(settings.float_type)
+        with self.test_context() as session:
+            l = gpflow.likelihoods.Bernoulli(invlink=gpflow.likelihoods.logistic, logistic_bound=True)
+            l.compile()
+            bound = l.variational_expectations(self.Fmu, self.Fvar, Y)
+            exact = gpflow.likelihoods.Likelihood.variational_expectations(l, self.Fmu, self.Fvar, Y)
+            bound, exact = session.run([bound, exact])
+            self.assertTrue(np.all(bound <= exact + 1e-10))
+            zero = np.zeros_like(self.Fvar)
+            bound = l.variational_expectations(self.Fmu, zero, Y)
+            logp = l.logp(self.Fmu, Y)
+            assert_allclose(*session.run([bound, logp]))
+        with self.assertRaises(ValueError):
+            gpflow.likelihoods.Bernoulli(logistic_bound=True)
+
+    def test_student_t_scale(self):
+        with self.test_context() as session:
+            l = gpflow.likelihoods.StudentT(deg_free=6.)
+            l.scale = 2.5
+            l.compile()
+            l.num_gauss_hermite_points = 50
+            _, var = session.run(l.predict_mean_and_var(self.Fmu, self.Fvar))
+            assert_allclose(var, self.Fvar + 2.5 ** 2 * 1.5)
+            # E[y^2] = E[f^2] + E[var(y|f)], from the quadrature of the density
+            y = np.linspace(-200., 200., 200001)
+            F = tf.placeholder(settings.float_type)
+            density = np.exp(session.run(l.logp(F, y[None, :]), {F: np.zeros((1, 1))}))
+            noise_variance = np.trapz(density * y ** 2, y)
+            assert_allclose(session.run(l.conditional_variance(F), {F: np.zeros((1, 1))}),
+                            [[noise_variance]], rtol=1e-3)
+        for deg_free in (1., 2.):
+            with self.assertRaises(ValueError):
+                gpflow.likelihoods.StudentT(deg_free)
+
+
+class TestMonteCarlo(GPflowTestCase):
+    def setUp(self):
+        self.test_graph = tf.Graph()
+        self.rng = np.random.RandomState(0)
+        self.Fmu = self.rng.randn(10, 2)
+        self.Fvar = 0.1 * self.rng.rand(10, 2)
+
+    def test_control_variates(self):
+        # the Gaussian log density is quadratic in f, so that the control
+        # variates remove all of the Monte Carlo error
+        Y = self.rng.randn(10, 2)
+        for sampling in ('iid', 'antithetic', 'stratified'):
+            with self.test_context() as session:
+                l = gpflow.likelihoods.Gaussian(0.3)
+                l.compile()
+                l.num_monte_carlo_points = 5
+                l.monte_carlo_sampling = sampling
+                l.monte_carlo_control_variates = True
+                mc = gpflow.likelihoods.Likelihood.variational_expectations(l, self.Fmu, self.Fvar, Y)
+                exact = l.variational_expectations(self.Fmu, self.Fvar, Y)
+                assert_allclose(*session.run([mc, exact]))
+
+    def test_monte_carlo(self):
+        base = gpflow.likelihoods.Likelihood
+        for sampling in ('iid', 'antithetic', 'stratified'):
+            for test_setup in getLikelihoodSetups(includeMultiClass=False):
+                with self.test_context() as session:
+                    tf.set_random_seed(1)
+                    l = test_setup.likelihood
+                    l.compile()
+                    quad = base.variational_expectations(l, self.Fmu, self.Fvar, test_setup.Y)
+                    l.num_monte_carlo_points = 5000
+                    l.monte_carlo_sampling = sampling
+                    mc = base.variational_expectations(l, self.Fmu, self.Fvar, test_setup.Y)
+                    l.num_monte_carlo_points = None
+                    quad, mc = session.run([quad, mc])
+                    self.assertEqual(mc.shape, quad.shape)
+                    assert_allclose(mc, quad, rtol=1e-2, atol=1e-2)
+
+    def test_unknown_sampling(self):
+        with self.test_context():
+            l = gpflow.likelihoods.Beta()
+            l.num_monte_carlo_points = 10
+            l.monte_carlo_sampling = 'sobol'
+            with self.assertRaises(ValueError):
+                l.variational_expectations(self.Fmu, self.Fvar, 0.5 * np.ones((10, 2)))
+
+
+class TestSharedQuadrature(GPflowTestCase):
+    def setUp(self):
+        self.test_graph = tf.Graph()
+        self.rng = np.random.RandomState(0)
+        self.Fmu, self.Fvar = self.rng.randn(2, 10, 2).astype(settings.float_type)
+        self.Fvar = self.Fvar ** 2
+
+    def test_predict_mean_var_and_density(self):
+        with self.test_context() as session:
+            for test_setup in getLikelihoodSetups(includeMultiClass=False):
+                l = test_setup.likelihood
+                l.compile()
+                Fmu, Fvar = tf.constant(self.Fmu), tf.constant(self.Fvar)
+                expected = l.predict_mean_and_var(Fmu, Fvar) + \
+                    (l.predict_density(Fmu, Fvar, test_setup.Y),)
+                Fmu, Fvar = tf.constant(self.Fmu), tf.constant(self.Fvar)
+                actual = l.predict_mean_var_and_density(Fmu, Fvar, test_setup.Y)
+                for a, e in zip(session.run(actual), session.run(expected)):
+                    assert_allclose(a, e)
+
+    def test_shared_grid(self):
+        with self.test_context():
+            l = gpflow.likelihoods.Beta()
+            l.compile()
+            Fmu, Fvar = tf.constant(self.Fmu), tf.constant(self.Fvar)
+            Y = tf.constant(self.rng.rand(10, 2))
+            grid = l._quadrature_grid(Fmu, Fvar)
+            self.assertIs(l._quadrature_grid(Fmu, Fvar), grid)
+            self.assertIsNot(l._quadrature_grid(Fmu, Fvar + 1.), grid)
+            with gpflow.params_as_tensors_for(l):
+                l.variational_expectations(Fmu, Fvar, Y)
+                num_ops = len(tf.get_default_graph().get_operations())
+                l.variational_expectations(Fmu, Fvar, Y)
+                l.predict_density(Fmu, Fvar, Y)
+            lgamma = [op for op in tf.get_default_graph().get_operations()[num_ops:]
+                      if op.type == 'Lgamma']
+            self.assertEqual(lgamma, [])
+
+
+class TestAdaptiveQuadrature(GPflowTestCase):
+    def setUp(self):
+        self.test_graph = tf.Graph()
+        self.rng = np.random.RandomState(0)
+        self.Fmu = self.rng.randn(10, 2)
+        # a mix of nearly certain and very uncertain latent values
+        self.Fvar = np.exp(self.rng.randn(10, 2) * 4. - 6.)
+
+    def quadratures(self, l, Y):
+        base = gpflow.likelihoods.Likelihood
+        Fmu, Fvar = tf.constant(self.Fmu), tf.constant(self.Fvar)
+        return (base.variational_expectations(l, Fmu, Fvar, Y),
+                base.predict_density(l, Fmu, Fvar, Y)) + \
+            base.predict_mean_and_var(l, Fmu, Fvar)
+
+    def test_adaptive(self):
+        with self.test_context() as session:
+            for test_setup in getLikelihoodSetups(includeMultiClass=False):
+                l = test_setup.likelihood
+                l.compile()
+                expected = session.run(self.quadratures(l, test_setup.Y))
+                l.quadrature_tolerance = 1e-10
+                actual = session.run(self.quadratures(l, test_setup.Y))
+                for a, e in zip(actual, expected):
+                    self.assertEqual(a.shape, e.shape)
+                    assert_allclose(a, e, rtol=1e-6, atol=1e-8)
+
+    def test_tolerance(self):
+        with self.test_context():
+            l = gpflow.likelihoods.Poisson()
+            l.compile()
+            l.quadrature_tolerance = 0.
+            with self.assertRaises(ValueError):
+                self.quadratures(l, tf.constant(np.ones((10, 2))))
+
+
 class TestRobustMaxMulticlass(GPflowTestCase):
     """
     Some specialized tests to the multiclass likelihood with RobustMax inverse link function.
@@ -253,6 +444,58 @@ class TestRobustMaxMulticlass(GPflowTestCase):
             self.assertTrue(np.allclose(pred, expected_prediction, tol, tol))
 
 
+class TestMulticlassChunks(GPflowTestCase):
+    def test_class_chunks(self):
+        rng = np.random.RandomState(0)
+        num_classes = 7
+        Fmu = rng.randn(20, num_classes)
+        Fvar = rng.rand(20, num_classes)
+        Y = rng.randint(num_classes, size=(20, 1)).astype(settings.float_type)
+        with self.test_context() as session:
+            l = gpflow.likelihoods.MultiClass(num_classes)
+            l_chunks = gpflow.likelihoods.MultiClass(
+                num_classes, invlink=gpflow.likelihoods.RobustMax(num_classes, class_chunk_size=3))
+            ve, ve_chunks = session.run([l.variational_expectations(Fmu, Fvar, Y),
+                                         l_chunks.variational_expectations(Fmu, Fvar, Y)])
+            assert_allclose(ve, ve_chunks)
+
+
+class TestSoftMax(GPflowTestCase):
+    def setUp(self):
+        self.test_graph = tf.Graph()
+        rng = np.random.RandomState(0)
+        self.num_classes = 5
+        self.Fmu = rng.randn(30, self.num_classes)
+        self.Fvar = 0.5 * rng.rand(30, self.num_classes)
+        self.Y = rng.randint(self.num_classes, size=(30, 1)).astype(settings.float_type)
+
+    def test_monte_carlo(self):
+        with self.test_context() as session:
+            tf.set_random_seed(1)
+            l = gpflow.likelihoods.SoftMax(self.num_classes, num_monte_carlo_points=20000)
+            ve = l.variational_expectations(self.Fmu, self.Fvar, self.Y)
+            density = l.predict_density(self.Fmu, self.Fvar, self.Y)
+            mean, _ = l.predict_mean_and_var(self.Fmu, self.Fvar)
+            ve, density, mean = session.run([ve, density, mean])
+            self.assertEqual(ve.shape, (30, 1))
+            assert_allclose(np.sum(mean, 1), 1.)
+            self.assertLess(np.mean(ve), np.mean(density))
+            assert_allclose(ve, density, atol=0.5)
+
+    def test_sampled_classes(self):
+        with self.test_context() as session:
+            tf.set_random_seed(1)
+            l = gpflow.likelihoods.SoftMax(self.num_classes, num_monte_carlo_points=1000)
+            l_sampled = gpflow.likelihoods.SoftMax(self.num_classes, num_monte_carlo_points=1000,
+                                                  num_sampled_classes=4 * self.num_classes)
+            ve = l.variational_expectations(self.Fmu, self.Fvar, self.Y)
+            ve_sampled = tf.add_n([l_sampled.variational_expectations(self.Fmu, self.Fvar, self.Y)
+                                   for _ in range(50)]) / 50.
+            ve, ve_sampled = session.run([ve, ve_sampled])
+            self.assertEqual(ve_sampled.shape, ve.shape)
+            assert_allclose(np.mean(ve_sampled), np.mean(ve), rtol=0.1)
+
+
 class TestMulticlassIndexFix(GPflowTestCase):
     """
     A regression test for a bug in multiclass likelihood.
@@ -339,6 +582,65 @@ class TestSwitchedLikelihood(GPflowTestCase):
             self.assertTrue(np.allclose(switched_rslt, np.concatenate(rslts)[self.Y_perm, :]))
 
 
+class TestSwitchedLikelihoodPartition(GPflowTestCase):
+    def setUp(self):
+        self.test_graph = tf.Graph()
+        rng = np.random.RandomState(1)
+        labels = np.sort(rng.randint(0, 3, 12)).reshape(-1, 1)
+        self.Y = np.hstack([rng.randn(12, 2), labels])
+        self.F = rng.randn(12, 2)
+        self.Fvar = np.exp(rng.randn(12, 2))
+
+    def likelihoods(self):
+        return [gpflow.likelihoods.Gaussian(var) for var in (0.5, 1., 2.)]
+
+    def test_sorted_labels(self):
+        with self.test_context() as session:
+            lik = gpflow.likelihoods.SwitchedLikelihood(self.likelihoods())
+            lik_sorted = gpflow.likelihoods.SwitchedLikelihood(self.likelihoods(), labels_sorted=True)
+            lik.compile()
+            lik_sorted.compile()
+            for name in ('variational_expectations', 'predict_density'):
+                r1 = getattr(lik, name)(self.F, self.Fvar, self.Y)
+                r2 = getattr(lik_sorted, name)(self.F, self.Fvar, self.Y)
+                assert_allclose(*session.run([r1, r2]))
+
+    def test_partition_once(self):
+        with self.test_context():
+            lik = gpflow.likelihoods.SwitchedLikelihood(self.likelihoods())
+            lik.compile()
+            Y = tf.constant(self.Y)
+            lik.variational_expectations(self.F, self.Fvar, Y)
+            num_partitions = len([op for op in tf.get_default_graph().get_operations()
+                                  if op.type == 'DynamicPartition'])
+            lik.predict_density(self.F, self.Fvar, Y)
+            lik.logp(self.F, Y)
+            self.assertEqual(num_partitions, 1)
+            self.assertEqual(num_partitions,
+                             len([op for op in tf.get_default_graph().get_operations()
+                                  if op.type == 'DynamicPartition']))
+
+    def test_unsorted_labels_check(self):
+        lik = gpflow.likelihoods.SwitchedLikelihood(self.likelihoods(), labels_sorted=True)
+        with self.assertRaises(ValueError):
+            lik._check_targets(self.Y[::-1])
+
+    def test_unsorted_labels_assert(self):
+        with self.test_context() as session:
+            lik = gpflow.likelihoods.SwitchedLikelihood(self.likelihoods(), labels_sorted=True)
+            lik.compile()
+            ve = lik.variational_expectations(self.F, self.Fvar, self.Y[::-1])
+            with self.assertRaises(tf.errors.InvalidArgumentError):
+                session.run(ve)
+
+    def test_sorted_labels_minibatch(self):
+        with self.test_context():
+            lik = gpflow.likelihoods.SwitchedLikelihood(self.likelihoods(), labels_sorted=True)
+            with self.assertRaises(ValueError):
+                gpflow.models.SVGP(self.F, self.Y, gpflow.kernels.RBF(2), lik,
+                                   Z=self.F[:3], minibatch_size=4)
+
+
 def _run_models(create_likelihood, Y):
     likelihood = create_likelihood()
     X = np.random.randn(Y.shape[0], 1)
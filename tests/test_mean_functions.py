@@ -379,6 +379,23 @@ class TestSwitchedMeanFunction(GPflowTestCase):
             result_ref = (np_list[X[:, 3].astype(np.int)]).reshape(-1, 1)
             assert_allclose(result, result_ref)
 
+    def test_sorted_labels(self):
+        with self.test_context() as sess:
+            rng = np.random.RandomState(0)
+            labels = np.sort(rng.randint(0, 3, 10)).reshape(-1, 1)
+            X = np.hstack([rng.randn(10, 3), 1.0 * labels])
+            A, b = rng.randn(3, 3, 1), rng.randn(3, 1)
+
+            def means():
+                return [gpflow.mean_functions.Linear(A[i], b[i]) for i in range(3)]
+
+            switched_mean = gpflow.mean_functions.SwitchedMeanFunction(means())
+            sorted_mean = gpflow.mean_functions.SwitchedMeanFunction(means(), labels_sorted=True)
+            switched_mean.compile()
+            sorted_mean.compile()
+            result, result_sorted = sess.run([switched_mean(X), sorted_mean(X)])
+            assert_allclose(result, result_sorted)
+
 
 class TestBug277Regression(GPflowTestCase):
     """
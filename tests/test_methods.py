@@ -15,6 +15,7 @@
 import tensorflow as tf
 
 import numpy as np
+import scipy.sparse
 from numpy.testing import assert_array_equal, assert_array_less, assert_allclose
 
 import gpflow
@@ -299,5 +300,59 @@ class TestSparseMCMC(GPflowTestCase):
             # self.assertTrue(np.allclose(g1, g2, 1e-4))
 
 
+class TestLinearGPR(GPflowTestCase):
+    """
+    GPR with the Linear kernel is the same model in the weight space and in
+    the function space, for dense and sparse inputs.
+    """
+    def setUp(self):
+        self.X = scipy.sparse.random(30, 6, density=0.4, format='csr', random_state=0)
+        rng = np.random.RandomState(0)
+        self.Y = rng.randn(30, 2)
+        self.Xtest = rng.randn(4, 6)
+
+    def model(self, X, weight_space=None):
+        kern = gpflow.kernels.Linear(6, variance=np.linspace(0.5, 1.5, 6), ARD=True)
+        m = gpflow.models.GPR(X, self.Y, kern, weight_space=weight_space)
+        m.likelihood.variance = 0.3
+        return m
+
+    def test_equivalence(self):
+        models = [(self.X.toarray(), False), (self.X.toarray(), True), (self.X, False), (self.X, True)]
+        results = []
+        for X, weight_space in models:
+            with self.test_context():
+                m = self.model(X, weight_space)
+                self.assertEqual(m.weight_space, weight_space)
+                results.append([m.compute_log_likelihood(),
+                                *m.predict_f(self.Xtest),
+                                m.predict_f_full_cov(self.Xtest)[1]])
+        for result in results[1:]:
+            for value, expected in zip(result, results[0]):
+                assert_allclose(value, expected)
+
+    def test_switch(self):
+        with self.test_context():
+            self.assertTrue(self.model(self.X).weight_space)
+            kern = gpflow.kernels.Linear(6)
+            self.assertFalse(gpflow.models.GPR(self.X[:5], self.Y[:5], kern).weight_space)
+            kern = gpflow.kernels.Polynomial(6)
+            self.assertFalse(gpflow.models.GPR(self.X, self.Y, kern).weight_space)
+            with self.assertRaises(ValueError):
+                gpflow.models.GPR(self.X, self.Y, kern, weight_space=True)
+
+    def test_sparse_kernel(self):
+        with self.test_context():
+            with self.assertRaises(ValueError):
+                gpflow.models.GPR(self.X, self.Y, gpflow.kernels.RBF(6))
+
+    def test_sparse_crossprod(self):
+        X = scipy.sparse.random(23, 4, density=0.3, format='coo', random_state=1)
+        with self.test_context() as session:
+            Xs = tf.SparseTensor(np.stack([X.row, X.col], 1).astype(np.int64), X.data, X.shape)
+            gram = session.run(gpflow.models.gpr._sparse_crossprod(Xs))
+        assert_allclose(gram, X.T.dot(X).toarray())
+
+
 if __name__ == "__main__":
     tf.test.main()
@@ -137,3 +137,101 @@ class TestPublicMethods(GPflowTestCase):
 
             with self.assertRaises(ValueError):
                 gpflow.misc.remove_from_trainables(var2)
+
+
+class TestPrecompute(GPflowTestCase):
+    def test_cache(self):
+        with self.test_context() as session:
+            var = tf.Variable(2.0, dtype=tf.float64, trainable=False)
+            session.run(var.initializer)
+            tensor = gpflow.misc.precompute(lambda: tf.square(var))
+            precomputation, = gpflow.misc.get_precomputations([var])
+            # built once for the dependencies and once for the cache
+            squares = [op for op in tf.get_default_graph().get_operations() if op.type == 'Square']
+            self.assertEqual(len(squares), 2)
+            gpflow.misc.initialize_variables(
+                precomputation.initializables, session=session, force=True,
+                feed_dict=precomputation.initializable_feeds)
+            self.assertEqual(session.run(tensor), 4.0)
+
+            # The cached value is returned until the variable is invalidated.
+            session.run(tf.assign(precomputation.cache, np.float64(-1.0), validate_shape=False))
+            self.assertEqual(session.run(tensor), -1.0)
+            var.load(3.0, session)
+            self.assertEqual(session.run(tensor), -1.0)
+            gpflow.misc.invalidate_precomputations(var, session)
+            self.assertEqual(session.run(tensor), 9.0)
+
+            # The cache is bypassed when the variable becomes trainable.
+            session.run(tf.assign(precomputation.cache, np.float64(-1.0), validate_shape=False))
+            gpflow.misc.add_to_trainables(var)
+            gpflow.misc.update_precomputations(var, session)
+            self.assertEqual(session.run(tensor), 9.0)
+            # and it is not written
+            self.assertEqual(session.run(precomputation.cache), -1.0)
+
+    def test_uncachable(self):
+        with self.test_context() as session:
+            var = tf.Variable(2.0, dtype=tf.float64, trainable=False)
+            placeholder = tf.placeholder(tf.float64, [])
+            gpflow.misc.precompute(lambda: var * placeholder)
+            gpflow.misc.precompute(lambda: var * tf.random_normal([], dtype=tf.float64))
+            gpflow.misc.precompute(lambda: tf.constant(2.0))
+            self.assertEqual(gpflow.misc.get_precomputations([var]), [])
+
+            # Without initialized cache variables the value is recomputed.
+            tensor = gpflow.misc.precompute(lambda: tf.square(var))
+            session.run(var.initializer)
+            self.assertEqual(session.run(tensor), 4.0)
+
+    def test_model(self):
+        rng = np.random.RandomState(0)
+        X, Y = rng.randn(10, 2), rng.randn(10, 1)
+
+        def model(lengthscales, trainable):
+            m = gpflow.models.GPR(X, Y, gpflow.kernels.RBF(2, lengthscales=lengthscales))
+            m.kern.trainable = trainable
+            m.compile()
+            return m
+
+        def gradient(m):
+            tensor = m.kern.lengthscales.unconstrained_tensor
+            return m.enquire_session().run(tf.gradients(m.objective, tensor)[0])
+
+        with self.test_context():
+            m = model(1.0, False)
+            self.assertTrue(m._precomputations)
+            self.assertTrue(all(p.is_enabled for p in m._precomputations))
+            np.testing.assert_allclose(m.compute_log_likelihood(),
+                                       model(1.0, True).compute_log_likelihood())
+            m.kern.lengthscales = 0.5
+            np.testing.assert_allclose(m.compute_log_likelihood(),
+                                       model(0.5, True).compute_log_likelihood())
+            m.kern.trainable = True
+            self.assertFalse(any(p.is_enabled for p in m._precomputations))
+            np.testing.assert_allclose(gradient(m), gradient(model(0.5, True)))
+
+    def test_predict(self):
+        # caches built by autoflow methods are initialized and used
+        rng = np.random.RandomState(0)
+        X, Y, Xnew = rng.randn(10, 2), rng.randn(10, 1), rng.randn(5, 2)
+
+        def model(lengthscales, trainable):
+            m = gpflow.models.GPR(X, Y, gpflow.kernels.RBF(2, lengthscales=lengthscales))
+            m.kern.trainable = trainable
+            m.likelihood.trainable = trainable
+            m.compile()
+            return m
+
+        with self.test_context():
+            m = model(1.0, False)
+            session = m.enquire_session()
+            num_built = len(m._precomputations)
+            np.testing.assert_allclose(m.predict_f(Xnew), model(1.0, True).predict_f(Xnew))
+            created = m._precomputations[num_built:]
+            self.assertTrue(created)
+            for p in created:
+                self.assertTrue(session.run(p.enabled))
+                self.assertGreater(session.run(tf.size(p.cache)), 0)
+            m.kern.lengthscales = 0.5
+            np.testing.assert_allclose(m.predict_f(Xnew), model(0.5, True).predict_f(Xnew))
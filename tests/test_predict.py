@@ -180,5 +180,89 @@ class TestFullCovSGPMC(TestFullCov):
             Z=self.Z)
 
 
+class TestPredictTrace(GPflowTestCase):
+    def prepare(self):
+        rng = np.random.RandomState(0)
+        self.X = rng.randn(20, 1)
+        self.Y = np.sin(self.X) + 0.1 * rng.randn(20, 1)
+        self.Xtest = rng.randn(7, 1)
+        return gpflow.models.GPMC(
+            self.X, self.Y, kern=gpflow.kernels.Matern32(1),
+            likelihood=gpflow.likelihoods.Gaussian())
+
+    def test_trace(self):
+        with self.test_context():
+            m = self.prepare()
+            trace = gpflow.train.HMC().sample(
+                m, num_samples=5, epsilon=0.05, lmax=5)
+            means, variances = m.predict_f_trace(self.Xtest, trace)
+            batched = m.predict_f_trace(self.Xtest, trace, batch_size=2)
+            mix_mean, mix_var = m.predict_f_trace(self.Xtest, trace, mixture=True)
+            self.assertEqual(means.shape, (5, 7, 1))
+            self.assertEqual(variances.shape, (5, 7, 1))
+
+            params = trace.drop('logprobs', axis=1)
+            for i, (_, sample) in enumerate(params.iterrows()):
+                m.assign(sample)
+                mean, var = m.predict_f(self.Xtest)
+                np.testing.assert_allclose(means[i], mean)
+                np.testing.assert_allclose(variances[i], var)
+                np.testing.assert_allclose(batched[0][i], mean)
+                np.testing.assert_allclose(batched[1][i], var)
+
+            np.testing.assert_allclose(mix_mean, means.mean(0))
+            expected_var = (variances + means ** 2).mean(0) - means.mean(0) ** 2
+            np.testing.assert_allclose(mix_var, expected_var)
+
+
+class TestPredictChunked(GPflowTestCase):
+    def prepare(self):
+        rng = np.random.RandomState(0)
+        X = rng.randn(30, 2)
+        Y = rng.randn(30, 2)
+        self.Xtest = rng.randn(25, 2)
+        self.Ytest = rng.randn(25, 2)
+        return gpflow.models.SGPR(X, Y, gpflow.kernels.RBF(2), Z=X[:5].copy())
+
+    def test_chunks(self):
+        with self.test_context():
+            m = self.prepare()
+            mu, var = m.predict_f(self.Xtest)
+            chunks = list(m.iter_predict(m.predict_f, self.Xtest, chunk_size=10))
+            self.assertEqual([(start, stop) for start, stop, _ in chunks],
+                             [(0, 10), (10, 20), (20, 25)])
+            for start, stop, (mu_chunk, var_chunk) in chunks:
+                np.testing.assert_allclose(mu_chunk, mu[start:stop])
+                np.testing.assert_allclose(var_chunk, var[start:stop])
+            # A budget for 3 rows of the 5 x 25 x 2 cross covariance.
+            chunks = m.iter_predict(m.predict_f, self.Xtest, memory_budget=3 * 5 * 2 * 8)
+            self.assertEqual(next(chunks)[:2], (0, 3))
+
+    def test_output(self):
+        with self.test_context():
+            m = self.prepare()
+            mu, var = m.predict_y(self.Xtest)
+            chunked_mu, chunked_var = m.predict_chunked(m.predict_y, self.Xtest, chunk_size=7)
+            np.testing.assert_allclose(chunked_mu, mu)
+            np.testing.assert_allclose(chunked_var, var)
+
+            density = m.predict_density(self.Xtest, self.Ytest)
+            out = np.zeros_like(density)
+            result = m.predict_chunked(m.predict_density, self.Xtest, self.Ytest,
+                                       chunk_size=4, out=out)
+            self.assertIs(result, out)
+            np.testing.assert_allclose(out, density)
+
+    def test_errors(self):
+        with self.test_context():
+            m = self.prepare()
+            with self.assertRaises(ValueError):
+                next(m.iter_predict(m.predict_f, self.Xtest))
+            with self.assertRaises(ValueError):
+                next(m.iter_predict(m.predict_f, self.Xtest, chunk_size=2, memory_budget=100))
+            with self.assertRaises(ValueError):
+                next(m.iter_predict(m.predict_f_full_cov, self.Xtest, chunk_size=2))
+
+
 if __name__ == "__main__":
     tf.test.main()
@@ -0,0 +1,152 @@
+# Copyright 2017 the GPflow authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gc
+import weakref
+
+import numpy as np
+import tensorflow as tf
+
+import pytest
+from numpy.testing import assert_allclose
+
+import gpflow
+from gpflow import kernels
+from gpflow import ekernels
+from gpflow import quadrature
+from gpflow.test_util import session_context
+
+
+# rules with the polynomial degree they are exact for
+exact_rules = [
+    (quadrature.GaussHermite(3), 5),
+    (quadrature.SmolyakGaussHermite(3), 5),
+    (quadrature.Unscented(), 3),
+    (quadrature.SphericalRadial(), 3),
+]
+
+
+@pytest.mark.parametrize('rule, degree', exact_rules)
+@pytest.mark.parametrize('D', [1, 2, 4])
+def test_rule_moments(rule, degree, D):
+    x, w = rule.points_and_weights(D)
+    assert x.shape == (len(w), D)
+    assert_allclose(np.sum(w), 1.)
+    assert_allclose(np.sum(w[:, None] * x, 0), np.zeros(D), atol=1e-12)
+    assert_allclose(np.einsum('n,ni,nj->ij', w, x, x), np.eye(D), atol=1e-12)
+    if degree >= 5 and D >= 2:
+        assert_allclose(np.sum(w * x[:, 0] ** 4), 3.)
+        assert_allclose(np.sum(w * x[:, 0] ** 2 * x[:, 1] ** 2), 1.)
+
+
+@pytest.mark.parametrize('level, degree', enumerate([1, 5, 15, 29, 51]))
+def test_genz_keister(level, degree):
+    x = np.concatenate([quadrature.genz_keister(l)[0] for l in range(level + 1)])
+    w = quadrature.genz_keister(level)[1]
+    assert len(x) == len(w) == quadrature.GENZ_KEISTER_NUM_POINTS[level]
+    moments = [np.sum(w * x ** k) for k in range(degree + 1)]
+    expected = [0. if k % 2 else np.prod(np.arange(1., k, 2.)) / 2. ** (k // 2)
+                for k in range(degree + 1)]
+    assert_allclose(moments, expected, rtol=1e-9, atol=1e-12)
+
+
+def test_sparse_grid_size():
+    x, _ = quadrature.SmolyakGaussHermite(3).points_and_weights(5)
+    assert len(x) < 5 ** 5
+
+
+def test_quasi_monte_carlo():
+    rule = quadrature.QuasiMonteCarlo(2000)
+    x, w = rule.points_and_weights(3)
+    assert x.shape == (2000, 3)
+    assert_allclose(np.sum(w[:, None] * x, 0), np.zeros(3), atol=1e-2)
+    assert_allclose(np.sum(w[:, None] * x ** 2, 0), np.ones(3), atol=5e-2)
+    x2, _ = rule.points_and_weights(3)
+    assert_allclose(x, x2)
+
+
+def test_rule_cache():
+    x, w = quadrature.SmolyakGaussHermite(3).points_and_weights(2)
+    x2, w2 = quadrature.SmolyakGaussHermite(3).points_and_weights(2)
+    assert x is x2 and w is w2
+    assert quadrature.SmolyakGaussHermite(2).points_and_weights(2)[0] is not x
+    assert quadrature.hermgauss(5)[0] is quadrature.hermgauss(5)[0]
+    with pytest.raises(ValueError):
+        w[0] = 0.
+
+
+def test_shared_constants():
+    with session_context() as session:
+        rule = quadrature.Unscented()
+        x, w = rule.constants(2)
+        assert rule.constants(2)[0] is x
+        assert quadrature.Unscented().constants(2)[1] is w
+        assert quadrature.Unscented().constants(3)[0] is not x
+        assert quadrature.hermgauss_constants(5)[0] is quadrature.hermgauss_constants(5)[0]
+        assert_allclose(session.run(w), rule.points_and_weights(2)[1])
+    with session_context():
+        assert quadrature.Unscented().constants(2)[0] is not x
+
+
+def test_graph_caches_release_graph():
+    tf.reset_default_graph()
+    quadrature.hermgauss_constants(5)
+    quadrature.Unscented().constants(2)
+    F = tf.zeros((3, 1), dtype=gpflow.settings.float_type)
+    gpflow.likelihoods.Bernoulli(autobuild=False)._quadrature_grid(F, F + 1.)
+    gpflow.misc.split_label_column(F, 2)
+    graph = weakref.ref(tf.get_default_graph())
+    tf.reset_default_graph()
+    gc.collect()
+    assert graph() is None
+
+
+def test_likelihood_constants():
+    with session_context() as session:
+        lik = gpflow.likelihoods.Beta()
+        H = lik.num_gauss_hermite_points
+        F = tf.zeros((3, 1), dtype=gpflow.settings.float_type)
+        Y = 0.5 * tf.ones((3, 1), dtype=gpflow.settings.float_type)
+        lik.compile()
+        with gpflow.params_as_tensors_for(lik):
+            lik.variational_expectations(F, F + 1., Y)
+            lik.predict_density(F, F + 1., Y)
+            lik.predict_mean_and_var(F, F + 1.)
+        grids = [op for op in session.graph.get_operations()
+                 if op.type == 'Const' and op.outputs[0].get_shape().as_list() == [H]]
+        assert len(grids) == 2
+
+
+@pytest.mark.parametrize('rule', [
+    quadrature.SmolyakGaussHermite(4),
+    quadrature.QuasiMonteCarlo(5000),
+])
+def test_kernel_expectation_rule(rule):
+    rng = np.random.RandomState(0)
+    D = 3
+    Z = rng.rand(4, D)
+    Xmu = rng.rand(5, D)
+    Xcov = 0.05 + 0.1 * rng.rand(5, D)
+    with session_context():
+        k = kernels.RBF(D, lengthscales=1.5)
+        k.quadrature_rule = rule
+        a = k.compute_eKxz(Z, Xmu, Xcov)
+    with session_context():
+        ek = ekernels.RBF(D, lengthscales=1.5)
+        b = ek.compute_eKxz(Z, Xmu, Xcov)
+    assert_allclose(a, b, rtol=1e-2)
+
+
+if __name__ == '__main__':
+    tf.test.main()
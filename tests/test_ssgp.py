@@ -0,0 +1,101 @@
+# Copyright 2017 the GPflow authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import tensorflow as tf
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+import gpflow
+from gpflow.test_util import GPflowTestCase
+
+
+class TestSSGP(GPflowTestCase):
+    def setUp(self):
+        self.rng = np.random.RandomState(0)
+        self.X = self.rng.randn(20, 2)
+        self.Y = np.hstack([np.sin(self.X[:, :1]), np.cos(self.X[:, 1:])]) + \
+            0.1 * self.rng.randn(20, 2)
+        self.Xnew = self.rng.randn(7, 2)
+
+    def features(self, m, X):
+        kern = m.kern
+        XW = (X / kern.lengthscales.read_value()) @ m.frequencies.read_value().T
+        scale = np.sqrt(kern.variance.read_value() / m.num_frequencies)
+        return scale * np.hstack([np.cos(XW), np.sin(XW)])
+
+    def model(self, num_frequencies=10, kern=None):
+        kern = kern or gpflow.kernels.RBF(2, variance=1.3, lengthscales=[0.8, 1.4], ARD=True)
+        m = gpflow.models.SSGP(self.X, self.Y, kern, num_frequencies=num_frequencies)
+        m.likelihood.variance = 0.1
+        return m
+
+    def test_likelihood(self):
+        with self.test_context():
+            m = self.model()
+            Phi = self.features(m, self.X)
+            C = Phi @ Phi.T + 0.1 * np.eye(20)
+            L = np.linalg.cholesky(C)
+            alpha = np.linalg.solve(L, self.Y)
+            expected = -0.5 * (2 * 20 * np.log(2 * np.pi) + 4 * np.sum(np.log(np.diag(L))) +
+                               np.sum(np.square(alpha)))
+            assert_allclose(m.compute_log_likelihood(), expected)
+
+    def test_predict(self):
+        with self.test_context():
+            m = self.model()
+            Phi, Phi_new = self.features(m, self.X), self.features(m, self.Xnew)
+            A = Phi.T @ Phi + 0.1 * np.eye(Phi.shape[1])
+            mean = Phi_new @ np.linalg.solve(A, Phi.T @ self.Y)
+            cov = 0.1 * Phi_new @ np.linalg.solve(A, Phi_new.T)
+            mu, var = m.predict_f(self.Xnew)
+            assert_allclose(mu, mean)
+            assert_allclose(var, np.tile(np.diag(cov)[:, None], [1, 2]))
+            _, var = m.predict_f_full_cov(self.Xnew)
+            assert_allclose(var[:, :, 0], cov)
+
+    def test_samples(self):
+        with self.test_context():
+            tf.set_random_seed(1)
+            m = self.model()
+            samples = m.predict_f_samples(self.Xnew, 5000)
+            self.assertEqual(samples.shape, (5000, 7, 2))
+            mu, var = m.predict_f(self.Xnew)
+            assert_allclose(samples.mean(0), mu, atol=0.1)
+            assert_allclose(samples.var(0), var, rtol=0.1, atol=1e-3)
+
+    def test_kernel_approximation(self):
+        # The features approximate the kernel when many frequencies are drawn.
+        kernels = [gpflow.kernels.RBF, gpflow.kernels.Matern12,
+                   gpflow.kernels.Matern32, gpflow.kernels.Matern52]
+        for kern_class in kernels:
+            with self.test_context():
+                m = self.model(num_frequencies=5000,
+                               kern=kern_class(2, variance=1.3, lengthscales=[0.8, 1.4], ARD=True))
+                Phi = self.features(m, self.X)
+                assert_allclose(Phi @ Phi.T, m.kern.compute_K_symm(self.X), atol=0.1)
+
+    def test_frequencies(self):
+        with self.test_context():
+            m = self.model()
+            self.assertFalse(m.frequencies.trainable)
+            self.assertEqual(m.frequencies.shape, (10, 2))
+            with self.assertRaises(ValueError):
+                gpflow.models.SSGP(self.X, self.Y, gpflow.kernels.RBF(2))
+            with self.assertRaises(NotImplementedError):
+                gpflow.models.SSGP(self.X, self.Y, gpflow.kernels.Linear(2), num_frequencies=10)
+
+
+if __name__ == '__main__':
+    tf.test.main()
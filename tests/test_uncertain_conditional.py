@@ -219,5 +219,24 @@ def test_quadrature_white(white):
         assert_almost_equal(var_quad, var_analytic, decimal=6)
 
 
+@pytest.mark.parametrize('white', [True, False])
+@pytest.mark.parametrize('full_cov_output', [True, False])
+def test_chunks(white, full_cov_output):
+    with session_context() as session:
+        c = DataQuadrature
+        d = c.tensors(white)
+        args = d.Xmu, d.Xvar, d.feat, d.kern, d.q_mu, d.q_sqrt
+        mean, var = uncertain_conditional(
+            *args, full_cov_output=full_cov_output, white=white)
+        mean_chunks, var_chunks = uncertain_conditional(
+            *args, full_cov_output=full_cov_output, white=white, chunk_size=3)
+        mean, var, mean_chunks, var_chunks = session.run(
+            [mean, var, mean_chunks, var_chunks], feed_dict=d.feed_dict)
+
+        assert var_chunks.shape == var.shape
+        assert_almost_equal(mean, mean_chunks)
+        assert_almost_equal(var, var_chunks)
+
+
 if __name__ == "__main__":
     tf.test.main()